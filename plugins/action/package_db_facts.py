@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+
+# SPDX-FileCopyrightText: 2023 swjmj1 <swjmj1@tuta.io>
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import os
+
+from ansible.plugins.action import ActionBase
+from ansible.module_utils.parsing.convert_bool import boolean
+
+from ansible_collections.swjmj1.package_utils.plugins.plugin_utils.result_cache import ResultCache, cache_key
+
+
+MODULE_NAME = 'swjmj1.package_utils.package_db_facts'
+
+# Bump whenever the module's results change shape, to ignore stale entries.
+CACHE_FORMAT = 1
+
+# options that don't affect the search results (timeouts only cut them
+# short, with a warning, and results with warnings aren't cached)
+UNCACHED_OPTIONS = frozenset([
+    'cache', 'search_terms', 'fingerprint_only', 'timeout', 'manager_timeout',
+    'daemon', 'daemon_idle_timeout',
+])
+
+# options whose results depend on more than the repo indices, so that they
+# must never be cached
+BYPASS_OPTIONS = ('fingerprint_only', 'timings', 'annotate_installed')
+
+
+class ActionModule(ActionBase):
+    """Serve package_db_facts results from a cache on the controller, if
+    the "cache" option is true.
+
+    Searching identical local repo indices gives identical results, so
+    first run the module with "fingerprint_only" to fingerprint the
+    target's indices, and only run the actual search if the cache has
+    nothing for those fingerprints and the given options.
+
+    The cache lives in the directory given by the environment variable
+    PACKAGE_UTILS_CACHE_DIR (by default,
+    ~/.ansible/swjmj1.package_utils/package_db_facts), and keeps at most
+    PACKAGE_UTILS_CACHE_MAX_ENTRIES (by default, 256) results.
+    """
+
+    TRANSFERS_FILES = False
+
+    def run(self, tmp=None, task_vars=None):
+        result = super(ActionModule, self).run(tmp, task_vars)
+        del tmp     # tmp no longer has any effect
+
+        module_args = self._task.args.copy()
+        if not boolean(module_args.get('cache', False), strict=False) \
+                or any(boolean(module_args.get(option, False), strict=False)
+                       for option in BYPASS_OPTIONS):
+            result.update(self._execute_module(
+                module_name=MODULE_NAME, module_args=module_args, task_vars=task_vars,
+            ))
+            return result
+
+        probe_args = dict(module_args, fingerprint_only=True)
+        probe = self._execute_module(
+            module_name=MODULE_NAME, module_args=probe_args, task_vars=task_vars,
+        )
+        fingerprints = probe.get('repo_fingerprints')
+        if probe.get('failed') or not fingerprints \
+                or None in fingerprints.values():
+            # can't tell whether the indices are identical to any others
+            result.update(self._execute_module(
+                module_name=MODULE_NAME, module_args=module_args, task_vars=task_vars,
+            ))
+            return result
+
+        key = cache_key(
+            CACHE_FORMAT,
+            fingerprints,
+            sorted(set(module_args.get('search_terms') or [])),
+            dict((k, v) for k, v in module_args.items() if k not in UNCACHED_OPTIONS),
+        )
+        cache = ResultCache(
+            os.environ.get(
+                'PACKAGE_UTILS_CACHE_DIR',
+                '~/.ansible/swjmj1.package_utils/package_db_facts',
+            ),
+            max_entries=int(os.environ.get('PACKAGE_UTILS_CACHE_MAX_ENTRIES', 256)),
+        )
+
+        cached = cache.get(key)
+        if cached is not None:
+            result.update(cached)
+            result['cached'] = True
+            return result
+
+        module_result = self._execute_module(
+            module_name=MODULE_NAME, module_args=module_args, task_vars=task_vars,
+        )
+        result.update(module_result)
+        # Only cache complete, successful results.
+        if not module_result.get('failed') and not module_result.get('warnings'):
+            cache.put(key, {'ansible_facts': module_result.get('ansible_facts', {})})
+        result['cached'] = False
+        return result
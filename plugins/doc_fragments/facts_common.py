@@ -36,6 +36,24 @@ class ModuleDocFragment(object):
         choices: ['first', 'all']
         default: 'first'
         type: str
+      timeout:
+        description:
+          - The most time, in seconds, that the module may spend on all
+            the package managers together.
+          - Once it has passed, any command still running is killed,
+            any package manager still working is given up on, with the
+            results it had completed by then, and no more package
+            managers are tried. See the C(timed_out) return value.
+          - Work done inside a package manager's Python library (e.g.
+            C(python-apt) loading its cache) can't be interrupted, so it
+            is abandoned in the background instead.
+        type: float
+      manager_timeout:
+        description:
+          - Like I(timeout), but for each package manager in turn.
+          - Both may be given, in which case whichever passes first
+            applies.
+        type: float
     requirements:
         - For 'portage' support it requires the C(qlist) utility, which
           is part of 'app-portage/portage-utils'.
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+
+# SPDX-FileCopyrightText: 2023 swjmj1 <swjmj1@tuta.io>
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+
+DOCUMENTATION = """
+name: from_columnar
+short_description: Expand columnar package details into a list of dicts
+description:
+    - Expand package details returned with I(output_format=columnar) by
+      M(swjmj1.package_utils.package_db_facts) back into the usual list
+      of dicts, one dict per package.
+    - Given a dict of such tables (e.g. all of
+      C(ansible_facts.package_search_results)), expand each of them,
+      keeping the keys.
+    - Playbooks that only need the number of packages or their names
+      don't need to expand anything, since each table has a C(count),
+      and the first of its C(columns) is always the packages' names.
+author: swjmj1 @swjmj1
+positional: _input
+options:
+    _input:
+        description: A table of package details, or a dict of tables.
+        type: dict
+        required: true
+"""
+
+EXAMPLES = """
+- name: Search for packages, returning the results in columnar format
+  swjmj1.package_utils.package_db_facts:
+    search_terms: ["python"]
+    output_format: columnar
+
+- name: Print the package details as usual
+  ansible.builtin.debug:
+    msg: "{{ ansible_facts.package_search_results.python | swjmj1.package_utils.from_columnar }}"
+
+- name: Print just the names, without expanding anything
+  ansible.builtin.debug:
+    msg: "{{ ansible_facts.package_search_results.python.columns[0] }}"
+"""
+
+RETURN = """
+_value:
+    description:
+        - A list of dicts of package details, or a dict of such lists if
+          given a dict of tables.
+    type: raw
+"""
+
+
+from ansible.errors import AnsibleFilterError
+from ansible.module_utils.common.text.converters import to_native
+
+from ansible_collections.swjmj1.package_utils.plugins.module_utils.facts.columnar \
+    import from_columnar as _from_columnar
+
+
+def from_columnar(data):
+    try:
+        if isinstance(data, dict) and 'columns' not in data:
+            return dict((key, _from_columnar(table)) for key, table in data.items())
+        return _from_columnar(data)
+    except ValueError as e:
+        raise AnsibleFilterError('from_columnar: %s' % to_native(e))
+
+
+class FilterModule(object):
+
+    def filters(self):
+        return {
+            'from_columnar': from_columnar,
+        }
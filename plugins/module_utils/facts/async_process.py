@@ -0,0 +1,116 @@
+# SPDX-FileCopyrightText: 2023 swjmj1 <swjmj1@tuta.io>
+# SPDX-License-Identifier: BSD-2-Clause
+
+
+# This file needs Python 3.8 or later, for asyncio subprocesses outside of
+# the main thread. Import it like so, falling back to running commands one
+# by one if it's unusable:
+#
+#   try:
+#       from ...facts.async_process import run_commands
+#       HAS_ASYNC_PROCESS = True
+#   except (ImportError, SyntaxError):
+#       HAS_ASYNC_PROCESS = False
+
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import sys
+
+if sys.version_info < (3, 8):
+    raise ImportError("async_process needs Python 3.8 or later")
+
+import asyncio
+import os
+import signal
+from subprocess import DEVNULL, PIPE
+
+from ansible.module_utils.common.text.converters import to_bytes, to_text
+
+from ansible_collections.swjmj1.package_utils.plugins.module_utils.facts.deadline import DeadlineExceeded
+
+
+async def _acquire(slots):
+    # Poll, rather than block the event loop (or leave a thread waiting
+    # for a slot after a timeout).
+    while not slots.acquire(False):
+        await asyncio.sleep(0.01)
+
+
+async def _run_command(semaphore, slots, args, env):
+    async with semaphore:
+        if slots is not None:
+            await _acquire(slots)
+        try:
+            # Each command leads a process group of its own, so that any
+            # processes it starts (e.g. a shell's pipeline) can be killed
+            # along with it.
+            proc = await asyncio.create_subprocess_exec(
+                *[to_bytes(arg, errors='surrogate_or_strict') for arg in args],
+                stdin=DEVNULL, stdout=PIPE, stderr=PIPE, env=env, start_new_session=True
+            )
+            try:
+                out, err = await proc.communicate()
+            except asyncio.CancelledError:
+                # Don't leave any process running after a timeout.
+                try:
+                    os.killpg(proc.pid, signal.SIGKILL)
+                except OSError:
+                    pass    # already gone
+                await proc.wait()
+                raise
+        finally:
+            if slots is not None:
+                slots.release()
+    return (
+        proc.returncode,
+        to_text(out, errors='surrogate_or_strict'),
+        to_text(err, errors='surrogate_or_strict'),
+    )
+
+
+async def _run_commands(commands, limit, slots, env):
+    # The semaphore must be made inside the running loop.
+    semaphore = asyncio.Semaphore(limit)
+    return await asyncio.gather(
+        *[_run_command(semaphore, slots, args, env) for args in commands]
+    )
+
+
+def run_commands(commands, limit=4, env=None, timeout=None, slots=None):
+    """Run the given commands concurrently, at most "limit" at a time.
+
+    Like AnsibleModule's "run_command", return an (rc, out, err) tuple
+    for each command, leaving it to the caller to check "rc" and "err";
+    the tuples are in the same order as "commands".
+
+    A fresh event loop is used (and closed) for each call, so this may
+    be called from any thread.
+
+    Arguments:
+      commands -- sequence of commands, each a list of arguments whose
+                  first item is the path to the executable
+      limit -- maximum number of commands running at once
+      env -- dict of the whole environment to run the commands in,
+             instead of this process's environment
+      timeout -- seconds to wait for all of the commands to finish, if
+                 given, after which any still running are killed, along
+                 with any processes they started
+      slots -- threading semaphore, if given, one of whose slots each
+               command takes up while running, so as to bound the
+               commands run at once by several threads together
+    Errors:
+      OSError -- if a command can't be executed at all
+      DeadlineExceeded -- if "timeout" passes first
+    """
+
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(
+            asyncio.wait_for(_run_commands(commands, max(1, limit), slots, env), timeout)
+        )
+    except asyncio.TimeoutError:
+        raise DeadlineExceeded("Commands timed out after %s seconds." % timeout)
+    finally:
+        loop.close()
@@ -0,0 +1,65 @@
+# SPDX-FileCopyrightText: 2023 swjmj1 <swjmj1@tuta.io>
+# SPDX-License-Identifier: BSD-2-Clause
+
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+
+OUTPUT_FORMATS = ('list', 'columnar')
+
+
+def to_columnar(all_package_details, fields=None):
+    """Turn a list of package details into parallel arrays.
+
+    Return a dict with the following keys:
+      fields -- list of the keys of the package details, "name" first
+      columns -- list of lists, one per field (in the same order), each
+                 holding that field's value for every package in turn
+      count -- number of packages
+
+    Any package missing a field has None as its value in that column.
+
+    Arguments:
+      all_package_details -- list of dicts, each with at least "name"
+      fields -- sequence of the fields to include, in order (besides
+                "name"); by default, every key found in any of the
+                dicts, sorted
+    """
+
+    if fields is None:
+        keys = set()
+        for package_details in all_package_details:
+            keys.update(package_details)
+        fields = sorted(keys)
+    fields = ['name'] + [field for field in fields if field != 'name']
+
+    return {
+        'fields': fields,
+        'columns': [
+            [package_details.get(field) for package_details in all_package_details]
+            for field in fields
+        ],
+        'count': len(all_package_details),
+    }
+
+
+def from_columnar(table):
+    """Turn the output of "to_columnar" back into a list of dicts.
+
+    Errors:
+      ValueError -- if "table" isn't shaped like the output of
+                    "to_columnar"
+    """
+
+    try:
+        fields = table['fields']
+        columns = table['columns']
+    except (KeyError, TypeError):
+        raise ValueError('Expected a dict with keys "fields" and "columns"')
+    if len(fields) != len(columns):
+        raise ValueError('Expected as many columns as fields')
+    if len(set(len(column) for column in columns)) > 1:
+        raise ValueError('Expected columns of equal length')
+
+    return [dict(zip(fields, row)) for row in zip(*columns)]
@@ -0,0 +1,463 @@
+# SPDX-FileCopyrightText: 2023 swjmj1 <swjmj1@tuta.io>
+# SPDX-License-Identifier: BSD-2-Clause
+
+
+# A resident helper process keeping package managers' indexes warm.
+#
+# Each package_db_facts or package_owner_facts run otherwise parses the
+# package databases anew. With this, the first run hands its package
+# manager, indexes and all, over to a daemon forked off in the
+# background, which answers later runs' queries over a Unix domain
+# socket until it has been idle for a while. The daemon rebuilds a package manager's indexes whenever its
+# package databases change, and a daemon running other code than the
+# caller's is never used, since the socket's name depends on the code.
+
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import errno
+import hashlib
+import inspect
+import json
+import os
+import shlex
+import socket
+import stat
+import subprocess
+import sys
+import tempfile
+
+from ansible.module_utils.six import binary_type, text_type
+from ansible.module_utils.common.process import get_bin_path
+from ansible.module_utils.common.text.converters import to_bytes, to_text
+
+from ansible_collections.swjmj1.package_utils.plugins.module_utils.facts import \
+    deadline, index, package_facts, packages, version
+from ansible_collections.swjmj1.package_utils.plugins.module_utils.facts.deadline import \
+    Deadline, DeadlineExceeded
+from ansible_collections.swjmj1.package_utils.plugins.module_utils.facts.packages import \
+    command_env, get_all_pkg_managers, paths_fingerprint
+
+
+# Bump whenever requests or responses change shape.
+PROTOCOL_VERSION = 3
+
+DEFAULT_IDLE_TIMEOUT = 300
+
+# how long to wait for a client to send its request
+REQUEST_TIMEOUT = 10
+
+# how much longer than its own timeout to give the daemon to answer, so
+# that partial results come back rather than none
+ANSWER_GRACE = 1
+
+# the daemon's umask, for whatever files the commands it runs create
+DAEMON_UMASK = 0o022
+
+
+class DaemonError(Exception):
+    """Raised when no usable daemon answers a query."""
+
+
+def code_fingerprint():
+    """Return a hex digest of the source code the daemon would run."""
+
+    digest = hashlib.sha1(to_bytes(str(PROTOCOL_VERSION)))
+    for module in (deadline, index, package_facts, packages, version, sys.modules[__name__]):
+        try:
+            digest.update(to_bytes(inspect.getsource(module), errors='surrogate_or_strict'))
+        except (IOError, OSError, TypeError):
+            digest.update(to_bytes(module.__name__))
+    return digest.hexdigest()
+
+
+def socket_path():
+    """Return the path of the current user's daemon socket, or None if
+    there's no directory private enough for it.
+
+    The socket lives in a directory of its own (mode 0700) under
+    $XDG_RUNTIME_DIR, or else the system's temporary directory.
+    """
+
+    directory = os.path.join(
+        os.environ.get('XDG_RUNTIME_DIR') or tempfile.gettempdir(),
+        'swjmj1.package_utils-%d' % os.getuid(),
+    )
+    try:
+        os.mkdir(directory, 0o700)
+    except OSError as e:
+        if e.errno != errno.EEXIST:
+            return None
+    try:
+        st = os.lstat(directory)
+    except OSError:
+        return None
+    if not stat.S_ISDIR(st.st_mode) or st.st_uid != os.getuid() or st.st_mode & 0o077:
+        return None
+    return os.path.join(directory, 'daemon-%s.sock' % code_fingerprint()[:16])
+
+
+def db_fingerprint(pkg_mgr):
+    """Return a digest of the package manager's package databases, both
+    installed and repo, that changes whenever either is rewritten, or
+    None if there's no telling.
+    """
+
+    if not pkg_mgr.DB_PATHS:
+        return None
+    return paths_fingerprint(tuple(pkg_mgr.DB_PATHS) + tuple(pkg_mgr.REPO_PATHS))
+
+
+class DaemonModule(object):
+    """The little of an AnsibleModule that package managers use, for
+    those kept by the daemon, which outlives the run that started it
+    (and that run's module, with its params and temporary directory).
+
+    Commands are run from "/", and there's no one to warn.
+    """
+
+    params = {}
+    check_mode = False
+
+    def __init__(self, run_command_environ_update=None):
+        self.run_command_environ_update = dict(run_command_environ_update or {})
+
+    def warn(self, warning):
+        pass
+
+    def debug(self, msg):
+        pass
+
+    def get_bin_path(self, arg, required=False, opt_dirs=None):
+        try:
+            return get_bin_path(arg, opt_dirs=opt_dirs)
+        except ValueError:
+            if required:
+                raise
+            return None
+
+    def run_command(self, args, environ_update=None, use_unsafe_shell=False, **kwargs):
+        """Run a command as per AnsibleModule.run_command, short of its
+        many options, and return its rc and (text) output and errors.
+        """
+
+        if isinstance(args, (binary_type, text_type)):
+            args = to_text(args, errors='surrogate_or_strict')
+            args = ['/bin/sh', '-c', args] if use_unsafe_shell else shlex.split(args)
+        elif use_unsafe_shell:
+            args = ['/bin/sh', '-c', ' '.join(args)]
+        env = command_env(self.run_command_environ_update, environ_update)
+        try:
+            with open(os.devnull, 'rb') as stdin:
+                proc = subprocess.Popen(
+                    args, stdin=stdin, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                    cwd='/', env=env, close_fds=True,
+                )
+                out, err = proc.communicate()
+        except (IOError, OSError) as e:
+            return 127, u'', to_text(e)
+        return proc.returncode, to_text(out, errors='surrogate_or_strict'), to_text(err, errors='surrogate_or_strict')
+
+
+def _send(sock, message):
+    sock.sendall(to_bytes(json.dumps(message)) + b'\n')
+
+
+def _receive(sock):
+    chunks = []
+    while True:
+        chunk = sock.recv(1 << 16)
+        if not chunk:
+            break
+        chunks.append(chunk)
+        if chunk.endswith(b'\n'):
+            break
+    try:
+        return json.loads(to_text(b''.join(chunks), errors='surrogate_or_strict'))
+    except ValueError:
+        raise DaemonError('Malformed message')
+
+
+def query(path, request, timeout=None):
+    """Send a request to the daemon listening at "path" and return its
+    response: a dict of the "results", plus the list of search terms
+    cut short by the timeout, if any (as "incomplete").
+
+    Arguments:
+      path -- path of the daemon's socket
+      request -- dict with the "op" to perform (either "search" or
+                 "owners"), the "manager" to perform it with, and either
+                 the search "terms" and "options" (as per
+                 "PkgMgr.search_packages") or the "paths" to look up the
+                 owners of (as per "PkgMgr.find_owners")
+      timeout -- seconds to allow the daemon, if given; it returns
+                 partial search results if it runs out of time
+    Errors:
+      DaemonError -- if no daemon is listening at "path", or it failed
+      DeadlineExceeded -- if the daemon doesn't answer in time, or runs
+                          out of time looking up owners
+    """
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.settimeout(None if timeout is None else timeout + ANSWER_GRACE)
+        sock.connect(path)
+        _send(sock, dict(request, protocol=PROTOCOL_VERSION, timeout=timeout))
+        response = _receive(sock)
+    except socket.timeout:
+        raise DeadlineExceeded("The daemon didn't answer in time.")
+    except socket.error as e:
+        raise DaemonError(to_text(e))
+    finally:
+        sock.close()
+    if response.get('timed_out'):
+        raise DeadlineExceeded(response['error'])
+    if 'error' in response:
+        raise DaemonError(response['error'])
+    return response
+
+
+class QueryServer(object):
+    """Answer queries with package managers kept between them.
+
+    Each package manager is kept along with the fingerprint of its
+    package databases (see "db_fingerprint") from before it read them,
+    and replaced with a fresh one as soon as the fingerprint changes.
+    """
+
+    def __init__(self, module, idle_timeout=DEFAULT_IDLE_TIMEOUT):
+        self.module = module
+        self.idle_timeout = idle_timeout
+        self._managers = {}     # name -> (PkgMgr, fingerprint)
+
+    def add(self, name, pkg_mgr, fingerprint):
+        """Keep a package manager which may already have built its
+        indexes, provided that it did so after "fingerprint" was taken.
+        """
+
+        pkg_mgr.timings = None
+        self._managers[name] = (pkg_mgr, fingerprint)
+
+    def _get(self, name):
+        entry = self._managers.get(name)
+        if entry is not None:
+            if db_fingerprint(entry[0]) == entry[1]:
+                return entry
+            del self._managers[name]
+
+        pkg_mgr_class = get_all_pkg_managers().get(name)
+        if pkg_mgr_class is None:
+            raise ValueError('Unknown package manager "%s"' % name)
+        pkg_mgr = pkg_mgr_class(self.module)
+        if not pkg_mgr.is_available():
+            raise ValueError('Package manager "%s" is not available' % name)
+        fingerprint = db_fingerprint(pkg_mgr)
+        if fingerprint is None:
+            raise ValueError('Package manager "%s" has no known databases' % name)
+        self.add(name, pkg_mgr, fingerprint)
+        return self._managers[name]
+
+    def handle(self, request):
+        """Return the response to a request, as described by "query"."""
+
+        if request.get('protocol') != PROTOCOL_VERSION:
+            return {'error': 'Unsupported protocol version'}
+        try:
+            pkg_mgr = self._get(request['manager'])[0]
+            timeout = request.get('timeout')
+            pkg_mgr.deadline = None if timeout is None else Deadline(timeout)
+            if request['op'] == 'search':
+                results = pkg_mgr.search_packages(*request['terms'], **request['options'])
+                response = {'results': results, 'incomplete': sorted(pkg_mgr.incomplete_terms)}
+            elif request['op'] == 'owners':
+                response = {'results': pkg_mgr.find_owners(request['paths'])}
+            else:
+                raise ValueError('Unknown op "%s"' % request['op'])
+        except DeadlineExceeded as e:
+            return {'error': to_text(e), 'timed_out': True}
+        except Exception as e:
+            return {'error': to_text(e)}
+        return response
+
+    def serve(self, listener):
+        """Answer one connection at a time on the listening socket until
+        none comes in for "idle_timeout" seconds.
+
+        The package managers handed over by "add" are switched to this
+        server's module first, dropping whichever they came with.
+        """
+
+        for pkg_mgr, dummy in self._managers.values():
+            pkg_mgr.module = self.module
+        listener.settimeout(self.idle_timeout)
+        while True:
+            try:
+                conn = listener.accept()[0]
+            except socket.timeout:
+                return
+            try:
+                conn.settimeout(REQUEST_TIMEOUT)
+                _send(conn, self.handle(_receive(conn)))
+            except Exception:
+                pass    # The client falls back on its own.
+            finally:
+                conn.close()
+
+
+def _is_listening(path):
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+    except socket.error:
+        return False
+    finally:
+        sock.close()
+    return True
+
+
+def _listen(path):
+    """Return a socket listening at "path", replacing any socket file
+    left over there, or None if another daemon is listening.
+    """
+
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        try:
+            listener.bind(path)
+        except socket.error as e:
+            if e.errno != errno.EADDRINUSE or _is_listening(path):
+                raise
+            os.unlink(path)
+            listener.bind(path)
+        listener.listen(8)
+    except (socket.error, OSError):
+        listener.close()
+        return None
+    return listener
+
+
+def _close_fds(low, keep):
+    """Close every file descriptor from "low" upwards but "keep"."""
+
+    try:
+        high = os.sysconf('SC_OPEN_MAX')
+    except (AttributeError, ValueError):
+        high = 1024
+    os.closerange(low, keep)
+    os.closerange(keep + 1, max(high, keep + 1))
+
+
+def start_daemon(server, path):
+    """Fork a daemon process running the given QueryServer at "path".
+
+    Return True if it was started, or False if another daemon is
+    listening there already, or the socket can't be made.
+
+    The daemon is detached from the calling process (which Ansible waits
+    on, along with its output) by forking twice, moving to "/" (out of
+    the caller's soon-removed temporary directory), setting its own
+    umask and closing every file the caller had open but the socket. It
+    exits without running any of the caller's exit handlers.
+    """
+
+    listener = _listen(path)
+    if listener is None:
+        return False
+    inode = os.stat(path).st_ino
+
+    pid = os.fork()
+    if pid:
+        listener.close()
+        os.waitpid(pid, 0)
+        return True
+
+    try:
+        os.setsid()
+        if os.fork():
+            os._exit(0)
+        os.chdir('/')
+        os.umask(DAEMON_UMASK)
+        devnull = os.open(os.devnull, os.O_RDWR)
+        for fd in (0, 1, 2):
+            os.dup2(devnull, fd)
+        _close_fds(3, listener.fileno())
+        try:
+            server.serve(listener)
+        finally:
+            # Leave any newer daemon's socket alone.
+            try:
+                if os.stat(path).st_ino == inode:
+                    os.unlink(path)
+            except OSError:
+                pass
+    finally:
+        os._exit(0)
+
+
+def _via_daemon(pkg_mgr, request, in_process, idle_timeout):
+    """Return the response to a request for "pkg_mgr" (see "query"),
+    from the current user's daemon if one is running, or else from
+    "in_process", a function returning the same response in-process.
+
+    If no daemon is running, hand the package manager (with whatever
+    indexes "in_process" built) over to a new daemon, which exits after
+    "idle_timeout" seconds without queries.
+    """
+
+    name = pkg_mgr.__class__.__name__.lower()
+    path = socket_path()
+    if path is None:
+        return in_process()
+
+    request = dict(request, manager=name)
+    timeout = None if pkg_mgr.deadline is None else pkg_mgr.deadline.remaining()
+    try:
+        return query(path, request, timeout)
+    except DaemonError:
+        pass
+
+    fingerprint = db_fingerprint(pkg_mgr)
+    response = in_process()
+    if fingerprint is not None \
+            and (pkg_mgr.deadline is None or not pkg_mgr.deadline.expired()):
+        module = DaemonModule(getattr(pkg_mgr.module, 'run_command_environ_update', None))
+        server = QueryServer(module, idle_timeout)
+        server.add(name, pkg_mgr, fingerprint)
+        start_daemon(server, path)
+    return response
+
+
+def search_via_daemon(pkg_mgr, search_terms, options, idle_timeout=DEFAULT_IDLE_TIMEOUT):
+    """Search as per "pkg_mgr.search_packages", via the current user's
+    daemon if one is running, falling back to searching in-process (and
+    then starting a daemon; see "_via_daemon"). Either way, set
+    "pkg_mgr.incomplete_terms" as the search does.
+    """
+
+    def search():
+        results = pkg_mgr.search_packages(*search_terms, **options)
+        return {'results': results, 'incomplete': sorted(pkg_mgr.incomplete_terms)}
+
+    request = {'op': 'search', 'terms': list(search_terms), 'options': options}
+    response = _via_daemon(pkg_mgr, request, search, idle_timeout)
+    pkg_mgr.incomplete_terms = set(response['incomplete'])
+    return response['results']
+
+
+def owners_via_daemon(pkg_mgr, paths, idle_timeout=DEFAULT_IDLE_TIMEOUT):
+    """Look up the owners of the paths as per "pkg_mgr.find_owners",
+    via the current user's daemon if one is running, falling back to
+    looking them up in-process (and then starting a daemon; see
+    "_via_daemon").
+
+    Errors:
+      DeadlineExceeded -- if the deadline passes first
+      NotImplementedError -- if the package manager can't tell
+    """
+
+    def find_owners():
+        return {'results': pkg_mgr.find_owners(paths)}
+
+    request = {'op': 'owners', 'paths': list(paths)}
+    return _via_daemon(pkg_mgr, request, find_owners, idle_timeout)['results']
@@ -0,0 +1,92 @@
+# SPDX-FileCopyrightText: 2023 swjmj1 <swjmj1@tuta.io>
+# SPDX-License-Identifier: BSD-2-Clause
+
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import sys
+import threading
+
+try:
+    from time import monotonic as _clock
+except ImportError:     # Python 2
+    from time import time as _clock
+
+
+class DeadlineExceeded(Exception):
+    """Raised when an operation runs past its deadline."""
+
+
+class Deadline(object):
+    """A point in time by which some work must be done.
+
+    A deadline may have a parent (e.g. a whole module's deadline for
+    each package manager's), in which case it passes whenever either
+    passes.
+    """
+
+    def __init__(self, timeout=None, parent=None):
+        """Set the deadline "timeout" seconds from now, if given; if not,
+        it only passes with its parent, if any.
+        """
+
+        self._end = None if timeout is None else _clock() + timeout
+        self.parent = parent
+
+    def remaining(self):
+        """Return how many seconds are left (at least 0), or None if the
+        deadline is unlimited.
+        """
+
+        remaining = None
+        if self._end is not None:
+            remaining = max(0, self._end - _clock())
+        if self.parent is not None:
+            parent_remaining = self.parent.remaining()
+            if remaining is None or (parent_remaining is not None and parent_remaining < remaining):
+                remaining = parent_remaining
+        return remaining
+
+    def expired(self):
+        return self.remaining() == 0
+
+    def check(self):
+        """Raise DeadlineExceeded if the deadline has passed."""
+
+        if self.expired():
+            raise DeadlineExceeded("The deadline has passed.")
+
+    def call(self, fn, *args, **kwargs):
+        """Return fn(*args, **kwargs), or raise DeadlineExceeded if it
+        doesn't return in time.
+
+        Unless the deadline is unlimited, "fn" runs in a daemon thread,
+        which is abandoned (not killed) if it overruns, so use this only
+        for work that can't be cancelled otherwise, e.g. calls into a
+        package manager's Python library.
+        """
+
+        remaining = self.remaining()
+        if remaining is None:
+            return fn(*args, **kwargs)
+        if remaining == 0:
+            raise DeadlineExceeded("The deadline has passed.")
+
+        outcome = {}
+
+        def run():
+            try:
+                outcome['result'] = fn(*args, **kwargs)
+            except BaseException:
+                outcome['error'] = sys.exc_info()[1]
+
+        thread = threading.Thread(target=run)
+        thread.daemon = True
+        thread.start()
+        thread.join(remaining)
+        if thread.is_alive():
+            raise DeadlineExceeded("The deadline has passed.")
+        if 'error' in outcome:
+            raise outcome['error']
+        return outcome['result']
@@ -0,0 +1,327 @@
+# SPDX-FileCopyrightText: 2023 swjmj1 <swjmj1@tuta.io>
+# SPDX-License-Identifier: BSD-2-Clause
+
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import posixpath
+import re
+from bisect import bisect_left
+from fnmatch import fnmatchcase
+
+
+MATCH_MODES = ('substring', 'exact', 'prefix', 'glob', 'regex', 'fuzzy')
+
+# how similar names must be to fuzzy search terms by default (see
+# "similarity")
+DEFAULT_MIN_SIMILARITY = 0.5
+
+# bracketed character classes (as fnmatch parses them, with any "]"
+# right after the opening "[" or "[!" taken literally) and other
+# characters with special meaning in glob patterns
+GLOB_SPECIAL_RE = re.compile(r"\[!?\]?[^]]*\]|[*?[]")
+
+# a word in a package description
+TOKEN_RE = re.compile(r"\w+", re.U)
+
+
+def trigrams(name):
+    """Return the set of 3-character substrings of "name", padded with
+    spaces so that its start and end count, too.
+    """
+
+    padded = '  ' + name + ' '
+    return set(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+def edit_distance(a, b):
+    """Return the Levenshtein distance between strings "a" and "b"."""
+
+    if len(a) < len(b):
+        a, b = b, a
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (char_a != char_b),
+            ))
+        previous = current
+    return previous[-1]
+
+
+def similarity(a, b):
+    """Return how similar strings "a" and "b" are, from 0 to 1 (equal),
+    as 1 minus their edit distance relative to the longer one's length.
+    """
+
+    longest = max(len(a), len(b))
+    if not longest:
+        return 1.0
+    return 1.0 - edit_distance(a, b) / longest
+
+
+def name_matcher(mode, term, min_similarity=DEFAULT_MIN_SIMILARITY):
+    """Return a function telling whether a package name matches "term".
+
+    Any regex is compiled only once, here.
+
+    Arguments:
+      mode -- one of MATCH_MODES
+      term -- search term to match against package names
+      min_similarity -- for "fuzzy" matching, how similar a name must be
+                        to "term", case-insensitively (see "similarity")
+    Errors:
+      ValueError -- if "mode" is unknown or "term" is an invalid regex
+    """
+
+    if mode == 'substring':
+        return lambda name: term in name
+    elif mode == 'exact':
+        return lambda name: name == term
+    elif mode == 'prefix':
+        return lambda name: name.startswith(term)
+    elif mode == 'glob':
+        return lambda name: fnmatchcase(name, term)
+    elif mode == 'regex':
+        try:
+            return re.compile(term).search
+        except re.error as e:
+            raise ValueError('Invalid regex "%s": %s' % (term, e))
+    elif mode == 'fuzzy':
+        term = term.lower()
+        return lambda name: similarity(term, name.lower()) >= min_similarity
+    raise ValueError('Unknown match mode "%s"' % mode)
+
+
+def literal_substring(mode, term):
+    """Return a substring that any package name matching "term" contains.
+
+    This lets package managers that can only search by substring
+    narrow their searches for the other match modes. For a regex or a
+    fuzzy match, return an empty string (i.e. match everything), since
+    there's no telling.
+    """
+
+    if mode == 'glob':
+        return max(GLOB_SPECIAL_RE.split(term), key=len)
+    elif mode in ('regex', 'fuzzy'):
+        return ''
+    return term
+
+
+class PackageIndex(object):
+    """An index of the packages in a package manager's repos, by name.
+
+    Names are kept both hashed, for exact lookups, and sorted, for
+    prefix lookups by bisection; fuzzy lookups only compare names
+    sharing enough trigrams with the search term, as found via posting
+    lists built on first use; all other lookups scan the sorted names.
+    Every lookup yields names lazily and in sorted order (or, for fuzzy
+    lookups, most similar first), so a caller can stop early.
+    """
+
+    def __init__(self, entries):
+        """Index the given sequence of (name, item) pairs.
+
+        Each "item" is whatever the package manager needs to get the
+        package's details, and several items may share a name (e.g. for
+        different versions of a package).
+        """
+
+        self._items = {}
+        for name, item in entries:
+            self._items.setdefault(name, []).append(item)
+        self.names = sorted(self._items)
+        self._postings = None
+        self._trigram_counts = None
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, name):
+        return name in self._items
+
+    def items(self, name):
+        """Return the list of items for the exact name given."""
+
+        return self._items.get(name, [])
+
+    def exact(self, name):
+        if name in self._items:
+            yield name
+
+    def prefix(self, prefix):
+        names = self.names
+        for i in range(bisect_left(names, prefix), len(names)):
+            if not names[i].startswith(prefix):
+                break
+            yield names[i]
+
+    def substring(self, substr):
+        for name in self.names:
+            if substr in name:
+                yield name
+
+    def glob(self, pattern):
+        # Only names starting with the pattern's literal prefix (if any)
+        # can match, so narrow down the scan to those.
+        literal_prefix = GLOB_SPECIAL_RE.split(pattern, 1)[0]
+        for name in self.prefix(literal_prefix):
+            if fnmatchcase(name, pattern):
+                yield name
+
+    def regex(self, pattern, search=None):
+        if search is None:
+            search = name_matcher('regex', pattern)
+        for name in self.names:
+            if search(name):
+                yield name
+
+    def _build_postings(self):
+        """Map each trigram to the positions in "names" of the names
+        containing it (lowercased), and count each name's trigrams.
+        """
+
+        postings = {}
+        trigram_counts = []
+        for i, name in enumerate(self.names):
+            name_trigrams = trigrams(name.lower())
+            trigram_counts.append(len(name_trigrams))
+            for trigram in name_trigrams:
+                postings.setdefault(trigram, []).append(i)
+        self._postings = postings
+        self._trigram_counts = trigram_counts
+
+    def fuzzy(self, term, min_similarity=DEFAULT_MIN_SIMILARITY):
+        if self._postings is None:
+            self._build_postings()
+        term = term.lower()
+        term_trigrams = trigrams(term)
+
+        shared = {}
+        for trigram in term_trigrams:
+            for i in self._postings.get(trigram, ()):
+                shared[i] = shared.get(i, 0) + 1
+
+        # Only compare names whose trigrams overlap the term's enough:
+        # by at least half of "min_similarity", as per Dice's coefficient.
+        trigram_counts = self._trigram_counts
+        ranked = []
+        for i, count in shared.items():
+            if 4 * count < min_similarity * (len(term_trigrams) + trigram_counts[i]):
+                continue
+            name = self.names[i]
+            score = similarity(term, name.lower())
+            if score >= min_similarity:
+                ranked.append((-score, name))
+        ranked.sort()
+        for score, name in ranked:
+            yield name
+
+    def match(self, mode, term, min_similarity=DEFAULT_MIN_SIMILARITY, matcher=None):
+        """Yield the names matching "term" via the given match mode.
+
+        If the caller already has a "matcher" from "name_matcher" for
+        the same mode and term, a regex is not compiled again.
+        """
+
+        if mode not in MATCH_MODES:
+            raise ValueError('Unknown match mode "%s"' % mode)
+        elif mode == 'fuzzy':
+            return self.fuzzy(term, min_similarity)
+        elif mode == 'regex':
+            return self.regex(term, matcher)
+        return getattr(self, mode)(term)
+
+
+def tokenize(text):
+    """Return the lowercased words in "text" (e.g. a description)."""
+
+    return [token.lower() for token in TOKEN_RE.findall(text or '')]
+
+
+class TokenIndex(object):
+    """An inverted index of the words in packages' descriptions.
+
+    Each word maps to the set of names of the packages whose
+    descriptions contain it (its posting list), so a query is answered
+    by intersecting the posting lists of its words, smallest first.
+    """
+
+    def __init__(self, entries):
+        """Index the given sequence of (name, description) pairs."""
+
+        postings = {}
+        for name, text in entries:
+            for token in set(tokenize(text)):
+                postings.setdefault(token, set()).add(name)
+        self._postings = postings
+
+    def __len__(self):
+        return len(self._postings)
+
+    def search(self, query):
+        """Return the set of names whose descriptions contain every word
+        in "query", in any order and ignoring case.
+        """
+
+        tokens = set(tokenize(query))
+        if not tokens:
+            return set()
+        posting_lists = sorted(
+            (self._postings.get(token, ()) for token in tokens), key=len
+        )
+        names = set(posting_lists[0])
+        for posting_list in posting_lists[1:]:
+            if not names:
+                break
+            names.intersection_update(posting_list)
+        return names
+
+
+def normalize_path(path):
+    """Return "path" as an absolute path, without any redundant parts.
+
+    Package managers list their files with or without a leading "/" and
+    directories with or without a trailing one, so normalize both.
+    """
+
+    return posixpath.normpath('/' + path.lstrip('/'))
+
+
+class PathIndex(object):
+    """An index of the files and directories installed by packages.
+
+    Paths are kept sorted, alongside a parallel list of the package
+    owning each, so that looking up a path is a bisection. The index is
+    built in memory on each run, from the package manager's lists of
+    installed files. A path owned by several packages (e.g. a shared
+    directory) appears once per package.
+    """
+
+    def __init__(self, entries):
+        """Index the given sequence of (path, owner) pairs."""
+
+        entries = sorted((normalize_path(path), owner) for path, owner in entries)
+        self.paths = [path for path, owner in entries]
+        self.owners = [owner for path, owner in entries]
+
+    def __len__(self):
+        return len(self.paths)
+
+    def owners_of(self, path):
+        """Return the list of owners of the given path, without repeats."""
+
+        path = normalize_path(path)
+        paths = self.paths
+        owners = []
+        for i in range(bisect_left(paths, path), len(paths)):
+            if paths[i] != path:
+                break
+            if self.owners[i] not in owners:
+                owners.append(self.owners[i])
+        return owners
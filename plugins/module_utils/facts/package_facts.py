@@ -22,32 +22,71 @@
 from __future__ import absolute_import, division, print_function
 __metaclass__ = type
 
+import glob
+import os
 import re
-from functools import wraps
+import tarfile
+from functools import cmp_to_key, wraps
 
 from ansible.module_utils.common.text.converters import to_native, to_text
 from ansible.module_utils.basic import missing_required_lib
-from ansible.module_utils.common.locale import get_best_parsable_locale
 from ansible.module_utils.common.process import get_bin_path
 from ansible.module_utils.common.respawn import has_respawned, probe_interpreters_for_module, respawn_module
 
-from ansible_collections.swjmj1.package_utils.plugins.module_utils.facts.packages import LibMgr, CLIMgr, get_all_pkg_managers
+from ansible_collections.swjmj1.package_utils.plugins.module_utils.facts.deadline import Deadline, DeadlineExceeded
+from ansible_collections.swjmj1.package_utils.plugins.module_utils.facts.packages import LibMgr, CLIMgr, PkgMgrTimings, get_all_pkg_managers, timed
+from ansible_collections.swjmj1.package_utils.plugins.module_utils.facts.version import \
+    apk_version_key, dpkg_version_key, evr_key, pacman_version_key, pkg_version_string, rpmvercmp_key
 
 
 class RPM(LibMgr):
 
     requires_module = True      # for warning if library isn't found
     LIB = 'rpm'
+    DB_PATHS = ('/var/lib/rpm/*', '/usr/lib/sysimage/rpm/*')
+    VERSION_FIELDS = ('epoch', 'version', 'release')
 
     def list_installed(self):
-        return self._lib.TransactionSet().dbMatch()
+        return self._call(self._lib.TransactionSet().dbMatch)
+
+    # keys of the package details, each named after an RPMTAG_* constant
+    DETAILS = ('name', 'version', 'release', 'epoch', 'arch')
 
     def get_package_details(self, package):
-        return dict(name=package[self._lib.RPMTAG_NAME],
-                    version=package[self._lib.RPMTAG_VERSION],
-                    release=package[self._lib.RPMTAG_RELEASE],
-                    epoch=package[self._lib.RPMTAG_EPOCH],
-                    arch=package[self._lib.RPMTAG_ARCH],)
+        return self.get_package_details_many([package])[0]
+
+    def get_package_details_many(self, packages, fields=None):
+        tags = [
+            (key, getattr(self._lib, 'RPMTAG_' + key.upper()))
+            for key in self.DETAILS
+            if fields is None or key == 'name' or key in fields
+        ]
+        return [dict((key, package[tag]) for key, tag in tags) for package in packages]
+
+    def find_owners(self, paths):
+        # The rpmdb indexes files itself, so just look each path up.
+        def find_all():
+            ts = self._lib.TransactionSet()
+
+            def owners_of(path):
+                return [
+                    to_text(header[self._lib.RPMTAG_NAME])
+                    for header in ts.dbMatch('basenames', path)
+                ]
+
+            return dict(
+                (path, owners_of(path) or owners_of(os.path.realpath(path)))
+                for path in paths
+            )
+
+        return self._call(find_all)
+
+    def version_key(self, package_details):
+        return evr_key(
+            package_details.get('epoch'),
+            package_details.get('version'),
+            package_details.get('release'),
+        )
 
     def is_available(self):
         '''we expect the python bindings installed, but this gives
@@ -83,17 +122,29 @@ class APT(LibMgr):
 
     requires_module = True      # for warning if library isn't found
     LIB = 'apt'
+    DB_PATHS = ('/var/lib/dpkg/status',)
+    REPO_PATHS = ('/var/lib/apt/lists/*_Packages*',)
+    INFO_DIR = '/var/lib/dpkg/info'     # holds a "<name>[:<arch>].list" per package
+
+    # keys of the package details, and how to get each from the installed
+    # version of a package
+    DETAILS = (
+        ('version', lambda ac_pkg: ac_pkg.version),
+        ('arch', lambda ac_pkg: ac_pkg.architecture),
+        ('category', lambda ac_pkg: ac_pkg.section),
+        ('origin', lambda ac_pkg: ac_pkg.origins[0].origin),
+    )
 
     def __init__(self, module=None):
         self._cache = None
-        super(APT, self).__init__()
+        super(APT, self).__init__(module)
 
     @property
     def pkg_cache(self):
         if self._cache is not None:
             return self._cache
 
-        self._cache = self._lib.Cache()
+        self._cache = self._call(self._lib.Cache)
         return self._cache
 
     def is_available(self):
@@ -128,8 +179,43 @@ class APT(LibMgr):
         return [pk for pk in cache.keys() if cache[pk].is_installed]
 
     def get_package_details(self, package):
-        ac_pkg = self.pkg_cache[package].installed
-        return dict(name=package, version=ac_pkg.version, arch=ac_pkg.architecture, category=ac_pkg.section, origin=ac_pkg.origins[0].origin)
+        return self.get_package_details_many([package])[0]
+
+    def get_package_details_many(self, packages, fields=None):
+        cache = self.pkg_cache
+        getters = [
+            (key, getter)
+            for key, getter in self.DETAILS
+            if fields is None or key in fields
+        ]
+        all_package_details = []
+        for package in packages:
+            ac_pkg = cache[package].installed
+            package_details = dict((key, getter(ac_pkg)) for key, getter in getters)
+            package_details['name'] = package
+            all_package_details.append(package_details)
+        return all_package_details
+
+    def version_key(self, package_details):
+        return dpkg_version_key(package_details.get('version'))
+
+    def list_owned_files(self):
+        """Read the path of every file and directory each installed
+        package owns from dpkg's "*.list" files, one path per line.
+        """
+
+        owned_files = []
+        for list_path in glob.glob(os.path.join(self.INFO_DIR, '*.list')):
+            name = os.path.basename(list_path)[:-len('.list')].split(':', 1)[0]
+            with open(list_path, 'rb') as f:
+                data = f.read()
+            self._count('bytes_read', len(data))
+            owned_files.extend(
+                (path, name)
+                for path in to_text(data, errors='surrogate_or_strict').splitlines()
+                if path
+            )
+        return owned_files
 
     def search_pkg_substr(self, substr):
         pass
@@ -138,47 +224,111 @@ class APT(LibMgr):
 class PACMAN(CLIMgr):
 
     CLI = 'pacman'
+    parsable_locale = True
+    LOCAL_DB = '/var/lib/pacman/local'  # holds a "<name>-<pkgver>-<pkgrel>" dir per package
+    DB_PATHS = (LOCAL_DB,)
+    # pacman only searches the repos enabled in its config
+    REPO_PATHS = ('/etc/pacman.conf', '/var/lib/pacman/sync/*.db')
 
     def list_installed(self):
-        locale = get_best_parsable_locale(self.module)
-        rc, out, err = self.module.run_command([self._cli, '-Qi'], environ_update=dict(LC_ALL=locale))
+        rc, out, err = self._run_command([self._cli, '-Qi'])
         if rc != 0 or err:
             raise Exception("Unable to list packages rc=%s : %s" % (rc, err))
         return out.split("\n\n")[:-1]
 
-    def get_package_details(self, package):
-        # parse values of details that might extend over several lines
-        raw_pkg_details = {}
-        last_detail = None
-        for line in package.splitlines():
-            m = re.match(r"([\w ]*[\w]) +: (.*)", line)
-            if m:
-                last_detail = m.group(1)
-                raw_pkg_details[last_detail] = m.group(2)
-            else:
-                # append value to previous detail
-                raw_pkg_details[last_detail] = raw_pkg_details[last_detail] + "  " + line.lstrip()
+    # A "key : value" line of "pacman -Qi"/"pacman -Si" output, plus any
+    # indented lines after it (i.e. the rest of a value extending over
+    # several lines)
+    DETAIL_RE = re.compile(r"^(\w[\w ]*?) +: (.*(?:\n[ \t].*)*)", re.M)
+    CONTINUATION_RE = re.compile(r"\n\s*")
+    NAME_RE = re.compile(r"^Name +: (.*)$", re.M)
 
-        provides = None
-        if raw_pkg_details['Provides'] != 'None':
-            provides = [
-                p.split('=')[0]
-                for p in raw_pkg_details['Provides'].split('  ')
-            ]
+    def _parse_details(self, package, fields=None):
+        # parse values of details that might extend over several lines
+        continuation_sub = self.CONTINUATION_RE.sub
+        raw_pkg_details = dict(
+            (key, continuation_sub("  ", value) if "\n" in value else value)
+            for key, value in self.DETAIL_RE.findall(package)
+        )
 
-        return {
+        pkg = {
             'name': raw_pkg_details['Name'],
             'version': raw_pkg_details['Version'],
             'arch': raw_pkg_details['Architecture'],
-            'provides': provides,
         }
 
+        if fields is None or 'description' in fields:
+            pkg['description'] = raw_pkg_details.get('Description')
+
+        if fields is None or 'provides' in fields:
+            provides = None
+            if raw_pkg_details['Provides'] != 'None':
+                provides = [
+                    p.split('=')[0]
+                    for p in raw_pkg_details['Provides'].split('  ')
+                ]
+            pkg['provides'] = provides
+
+        return pkg
+
+    def get_package_details(self, package):
+        return self._parse_details(package)
+
+    def get_package_details_many(self, packages, fields=None):
+        if fields is not None and set(fields) <= set(['name']):
+            # skip parsing everything else
+            search = self.NAME_RE.search
+            return [{'name': search(package).group(1)} for package in packages]
+
+        parse = self._parse_details
+        return [parse(package, fields) for package in packages]
+
+    def version_key(self, package_details):
+        return pacman_version_key(package_details.get('version'))
+
+    def list_owned_files(self):
+        """Read the paths each installed package owns from the "files"
+        file in its directory in the local database, where they're
+        listed under a "%FILES%" header, relative to "/", until the next
+        blank line.
+        """
+
+        owned_files = []
+        for files_path in glob.glob(os.path.join(self.LOCAL_DB, '*', 'files')):
+            name = os.path.basename(os.path.dirname(files_path)).rsplit('-', 2)[0]
+            with open(files_path, 'rb') as f:
+                data = f.read()
+            self._count('bytes_read', len(data))
+            lines = to_text(data, errors='surrogate_or_strict').splitlines()
+            try:
+                start = lines.index('%FILES%') + 1
+            except ValueError:
+                continue
+            for path in lines[start:]:
+                if not path:
+                    break
+                owned_files.append((path, name))
+        return owned_files
+
+    def list_available(self):
+        """List all packages in the sync databases via `pacman -Si`.
+
+        Given no package names, `pacman -Si` outputs a "key: value"
+        block for every package (see "search_pkg_substr").
+        """
+
+        rc, out, err = self._run_command([self._cli, '-Si'])
+        if rc != 0 or err:
+            raise Exception("Unable to list packages rc=%s : %s" % (rc, err))
+        return out.split("\n\n")[:-1]
+
     def search_pkg_substr(self, substr):
         """Search for substr via pacman -Ss. Return info for each match.
 
         Since options "-s" (search) and "-i" (info) cannot be used
         together, find matching packages via "-s" first, then return
-        info on each match via "-i".
+        info on each match via "-i". (The "-Si" commands are run
+        concurrently, where possible.)
 
         `pacman -Ss` outputs two lines for each matching package, with
         the package's repo, name, and version on the first line, then
@@ -187,11 +337,19 @@ class PACMAN(CLIMgr):
                 Next generation of the python...
             ...
 
+        Since it matches descriptions too, packages whose names don't
+        contain substr are dropped before asking for their info.
+
         `pacman -Si` outputs blocks in a "key: value" format like so:
             Repository      : core
             Name            : python
             ...
 
+        The info is returned as an iterator, which runs the "-Si"
+        commands only as it's consumed (up to "max_concurrent_commands"
+        at a time), so that a caller needing only a few matches doesn't
+        wait on the rest.
+
         Raise an exception if either `pacman -Ss` or `pacman -Si` fails.
         However, note that failure to find a matching package is, in
         this case, an expected possibility for `-Ss`, so no exception is
@@ -202,52 +360,74 @@ class PACMAN(CLIMgr):
         output different from its usual format.
         """
 
-        locale = get_best_parsable_locale(self.module)
-        rc, out, err = self.module.run_command(
-            [self._cli, '-Ss', substr],
-            environ_update=dict(LC_ALL=locale)
-        )
+        rc, out, err = self._run_command([self._cli, '-Ss', substr])
 
         if (out != "" and rc != 0) or err:
             raise Exception("Unable to list packages rc=%s : %s" % (rc, err))
         elif out == "":
-            return []
+            return iter([])
 
         search_results = out.splitlines()
         if len(search_results) % 2 != 0:
             raise Exception('Unexpected output when searching for "%s":\n\n%s'
                     % (substr, out))
 
-        info = []
-        for line in search_results[::2]:
-            repo_and_name = line.split()[0]     # exclude the version number
-            rc, out, err = self.module.run_command(
-                [self._cli, '-Si', repo_and_name],
-                environ_update=dict(LC_ALL=locale)
-            )
-            if rc != 0 or err:
-                raise Exception(
-                    'Unable to get info about package "%s" rc=%s : %s'
-                    % (repo_and_name, rc, err)
+        # exclude the version numbers
+        repos_and_names = [
+            repo_and_name
+            for repo_and_name in (line.split()[0] for line in search_results[::2])
+            if substr in repo_and_name.split('/', 1)[-1]
+        ]
+        return self._package_info(repos_and_names)
+
+    def _package_info(self, repos_and_names):
+        """Yield `pacman -Si` output for each "repo/name" given, running
+        the commands a batch of "max_concurrent_commands" at a time.
+        """
+
+        batch_size = max(1, self.max_concurrent_commands)
+        for start in range(0, len(repos_and_names), batch_size):
+            batch = repos_and_names[start:start + batch_size]
+            with self._phase('search_pkg_substr'):
+                results = self._run_commands(
+                    [self._cli, '-Si', repo_and_name] for repo_and_name in batch
                 )
-            info.append(out)
-        return info
+            for repo_and_name, (rc, out, err) in zip(batch, results):
+                if rc != 0 or err:
+                    raise Exception(
+                        'Unable to get info about package "%s" rc=%s : %s'
+                        % (repo_and_name, rc, err)
+                    )
+                yield out
 
 
 class PKG(CLIMgr):
 
     CLI = 'pkg'
+    DB_PATHS = ('/var/db/pkg/local.sqlite',)
+    REPO_PATHS = ('/var/db/pkg/repo-*.sqlite',)
+    VERSION_FIELDS = ('version', 'revision', 'port_epoch')
     atoms = ['name', 'version', 'origin', 'installed', 'automatic', 'arch', 'category', 'prefix', 'vital']
 
     def list_installed(self):
-        rc, out, err = self.module.run_command([self._cli, 'query', "%%%s" % '\t%'.join(['n', 'v', 'R', 't', 'a', 'q', 'o', 'p', 'V'])])
+        rc, out, err = self._run_command([self._cli, 'query', "%%%s" % '\t%'.join(['n', 'v', 'R', 't', 'a', 'q', 'o', 'p', 'V'])])
         if rc != 0 or err:
             raise Exception("Unable to list packages rc=%s : %s" % (rc, err))
         return out.splitlines()
 
-    def get_package_details(self, package):
+    # the atoms that the "version" atom is split up into
+    version_atoms = set(['version', 'port_epoch', 'revision'])
+
+    def _parse_details(self, values, fields=None):
 
-        pkg = dict(zip(self.atoms, package.split('\t')))
+        pkg = dict(zip(self.atoms, values))
+        if fields is not None:
+            # skip post-processing anything unwanted
+            pkg = dict(
+                (key, value) for key, value in pkg.items()
+                if key == 'name' or key in fields
+                or (key == 'version' and self.version_atoms.intersection(fields))
+            )
 
         if 'arch' in pkg:
             try:
@@ -277,6 +457,45 @@ class PKG(CLIMgr):
 
         return pkg
 
+    def get_package_details(self, package):
+        return self._parse_details(package.split('\t'))
+
+    def get_package_details_many(self, packages, fields=None):
+        parse = self._parse_details
+        return [parse(package.split('\t'), fields) for package in packages]
+
+    def __init__(self, module=None):
+        self._vercmp_results = {}
+        self._version_key = cmp_to_key(self._vercmp)
+        super(PKG, self).__init__(module)
+
+    def _vercmp(self, a, b):
+        """Compare two versions via `pkg version -t`, which outputs "<",
+        "=" or ">", asking about each pair of versions only once.
+
+        pkg's rules (e.g. for letters, "alpha"/"beta"/"pre"/"rc"/"pl"
+        and missing components) are its own, so leave them to it.
+        """
+
+        if a == b:
+            return 0
+        result = self._vercmp_results.get((a, b))
+        if result is None:
+            rc, out, err = self._run_command([self._cli, 'version', '-t', a, b])
+            result = {'<': -1, '=': 0, '>': 1}.get(out.strip())
+            if rc != 0 or err or result is None:
+                raise Exception('Unable to compare versions "%s" and "%s" rc=%s : %s' % (a, b, rc, err))
+            self._vercmp_results[(a, b)] = result
+            self._vercmp_results[(b, a)] = -result
+        return result
+
+    def version_key(self, package_details):
+        return self._version_key(pkg_version_string(
+            package_details.get('version'),
+            package_details.get('revision'),
+            package_details.get('port_epoch'),
+        ))
+
     def search_pkg_substr(self, substr):
         pass
 
@@ -284,10 +503,12 @@ class PKG(CLIMgr):
 class PORTAGE(CLIMgr):
 
     CLI = 'qlist'
+    DB_PATHS = ('/var/db/pkg/*',)   # one directory per category
+    VERSION_FIELDS = ('version', 'ebuild_revision')
     atoms = ['category', 'name', 'version', 'ebuild_revision', 'slots', 'prefixes', 'sufixes']
 
     def list_installed(self):
-        rc, out, err = self.module.run_command(' '.join([self._cli, '-Iv', '|', 'xargs', '-n', '1024', 'qatom']), use_unsafe_shell=True)
+        rc, out, err = self._run_command(' '.join([self._cli, '-Iv', '|', 'xargs', '-n', '1024', 'qatom']), use_unsafe_shell=True)
         if rc != 0:
             raise RuntimeError("Unable to list packages rc=%s : %s" % (rc, to_native(err)))
         return out.splitlines()
@@ -295,6 +516,12 @@ class PORTAGE(CLIMgr):
     def get_package_details(self, package):
         return dict(zip(self.atoms, package.split()))
 
+    def version_key(self, package_details):
+        return (
+            rpmvercmp_key(package_details.get('version')),
+            rpmvercmp_key(package_details.get('ebuild_revision')),
+        )
+
     def search_pkg_substr(self, substr):
         pass
 
@@ -302,27 +529,148 @@ class PORTAGE(CLIMgr):
 class APK(CLIMgr):
 
     CLI = 'apk'
+    INSTALLED_DB = '/lib/apk/db/installed'
+    DB_PATHS = (INSTALLED_DB,)
+    APKINDEX_PATHS = '/var/cache/apk/APKINDEX.*.tar.gz'
+    REPO_PATHS = ('/etc/apk/repositories', APKINDEX_PATHS)
+    VERSION_FIELDS = ('version', 'release')
+
+    def __init__(self, module=None):
+        self._apkindex = None
+        super(APK, self).__init__(module)
 
     def list_installed(self):
-        rc, out, err = self.module.run_command([self._cli, 'info', '-v'])
+        rc, out, err = self._run_command([self._cli, 'info', '-v'])
         if rc != 0 or err:
             raise Exception("Unable to list packages rc=%s : %s" % (rc, err))
         return out.splitlines()
 
     def get_package_details(self, package):
-        raw_pkg_details = {'name': package, 'version': '', 'release': ''}
-        nvr = package.rsplit('-', 2)
-        try:
-            return {
-                'name': nvr[0],
-                'version': nvr[1],
-                'release': nvr[2],
-            }
-        except IndexError:
-            return raw_pkg_details
+        return self.get_package_details_many([package])[0]
+
+    def get_package_details_many(self, packages, fields=None):
+        pkgs = []
+        append = pkgs.append
+        for package in packages:
+            nvr = package.rsplit('-', 2)
+            if len(nvr) == 3:
+                append({'name': nvr[0], 'version': nvr[1], 'release': nvr[2]})
+            else:
+                append({'name': package, 'version': '', 'release': ''})
+        return pkgs
+
+    def version_key(self, package_details):
+        return apk_version_key(package_details.get('version'), package_details.get('release'))
+
+    def list_owned_files(self):
+        """Read the paths each installed package owns from apk's database
+        of installed packages.
+
+        The database holds a block of "key:value" lines per package like
+        an APKINDEX (see "list_provides"), in which each directory owned
+        ("F:", relative to "/") is followed by the files in it ("R:").
+        """
+
+        with open(self.INSTALLED_DB, 'rb') as f:
+            data = f.read()
+        self._count('bytes_read', len(data))
+
+        owned_files = []
+        name = None
+        directory = ''
+        for line in to_text(data, errors='surrogate_or_strict').splitlines():
+            key, sep, value = line.partition(':')
+            if not sep:
+                continue
+            if key == 'P':
+                name = value
+                directory = ''
+            elif key == 'F':
+                directory = value
+                owned_files.append((directory, name))
+            elif key == 'R':
+                owned_files.append((directory + '/' + value, name))
+        return owned_files
+
+    def _read_apkindex(self):
+        """Parse every package's record in the cached APKINDEX files.
+
+        Each APKINDEX holds a block of "key:value" lines per package,
+        including its name ("P:"), version ("V:"), description ("T:")
+        and a space-separated list of the names it provides ("p:"), each
+        optionally followed by "=version", like so:
+            P:libssl3
+            V:3.1.4-r1
+            T:SSL shared libraries
+            p:so:libssl.so.3=3
+            ...
+
+        Return a list of dicts of each record's "key:value" lines that
+        has a name and version, reading the files only once per object;
+        or None if there are no APKINDEX files.
+        """
+
+        if self._apkindex is not None:
+            return self._apkindex
+        paths = sorted(glob.glob(self.APKINDEX_PATHS))
+        if not paths:
+            return None
+
+        apkindex = []
+        for path in paths:
+            with self._phase('list_available'):
+                with tarfile.open(path, 'r:gz') as archive:
+                    data = archive.extractfile('APKINDEX').read()
+            self._count('bytes_read', len(data))
+            with self._phase('get_package_details'):
+                records = to_text(data, errors='surrogate_or_strict').split('\n\n')
+                for record in records:
+                    raw_pkg_details = dict(
+                        line.split(':', 1) for line in record.splitlines()
+                        if line[1:2] == ':'
+                    )
+                    if 'P' in raw_pkg_details and 'V' in raw_pkg_details:
+                        apkindex.append(raw_pkg_details)
+            self._count('records_parsed', len(records))
+        self._apkindex = apkindex
+        return apkindex
+
+    def list_provides(self):
+        """Read what each package provides from the cached APKINDEX files
+        (see "_read_apkindex").
+        """
+
+        apkindex = self._read_apkindex()
+        if apkindex is None:
+            return None
+        return [
+            (provided.split('=', 1)[0], '%s-%s' % (raw_pkg_details['P'], raw_pkg_details['V']))
+            for raw_pkg_details in apkindex
+            for provided in raw_pkg_details.get('p', '').split()
+        ]
+
+    def list_descriptions(self):
+        """Read each package's description from the cached APKINDEX files
+        (see "_read_apkindex").
+        """
+
+        apkindex = self._read_apkindex()
+        if apkindex is None:
+            return None
+        return [
+            (raw_pkg_details['P'], raw_pkg_details.get('T'))
+            for raw_pkg_details in apkindex
+        ]
+
+    def list_available(self):
+        # Given no pattern, `apk search` lists every package.
+        rc, out, err = self._run_command([self._cli, 'search'])
+        if rc != 0 or err:
+            raise Exception("Unable to list packages rc=%s : %s" % (rc, err))
+        return out.splitlines()
 
     def search_pkg_substr(self, substr):
-        rc, out, err = self.module.run_command([
+        rc, out, err = self._run_command([
             self._cli, 'search', substr,
         ])
         if rc != 0 or err:
@@ -333,24 +681,27 @@ class APK(CLIMgr):
 class PKG_INFO(CLIMgr):
 
     CLI = 'pkg_info'
+    DB_PATHS = ('/var/db/pkg',)
 
     def list_installed(self):
-        rc, out, err = self.module.run_command([self._cli, '-a'])
+        rc, out, err = self._run_command([self._cli, '-a'])
         if rc != 0 or err:
             raise Exception("Unable to list packages rc=%s : %s" % (rc, err))
         return out.splitlines()
 
     def get_package_details(self, package):
-        raw_pkg_details = {'name': package, 'version': ''}
-        details = package.split(maxsplit=1)[0].rsplit('-', maxsplit=1)
-
-        try:
-            return {
-                'name': details[0],
-                'version': details[1],
-            }
-        except IndexError:
-            return raw_pkg_details
+        return self.get_package_details_many([package])[0]
+
+    def get_package_details_many(self, packages, fields=None):
+        pkgs = []
+        append = pkgs.append
+        for package in packages:
+            details = package.split(None, 1)[0].rsplit('-', 1)
+            if len(details) == 2:
+                append({'name': details[0], 'version': details[1]})
+            else:
+                append({'name': package, 'version': ''})
+        return pkgs
 
     def search_pkg_substr(self, substr):
         pass
@@ -380,6 +731,22 @@ def for_each_pkg_mgr(fn):
       its dict "params": "manager" and "strategy". For details, see the
       docs for Ansible's built-in "package_facts" module.
 
+      If the module's "params" has a true value for "timings", then
+      each package manager tried gets a PkgMgrTimings object (as its
+      "timings" attribute), and the time spent detecting it, working
+      inside "fn" and so on is returned under the "timings" key of the
+      module's results, next to "ansible_facts".
+
+      If the module's "params" has a "timeout" and/or a
+      "manager_timeout" (in seconds), then all the package managers
+      together, and each one, must finish by then: each gets a Deadline
+      (as its "deadline" attribute) which passes at whichever comes
+      first, and no more package managers are tried once the whole
+      module's time is up. Every package manager which overran, either
+      by raising DeadlineExceeded or by returning after its deadline
+      (e.g. with partial results), is listed under the "timed_out" key
+      of the module's results, and warned about.
+
       "fn" should NOT call the module's "exit_json" method, lest
       execution end prematurely; also, prefer the "warn" method over
       "fail_json".
@@ -427,25 +794,51 @@ def for_each_pkg_mgr(fn):
                     % (', '.join(unsupported))
             module.fail_json(msg=msg)
 
+        collect_timings = module.params.get('timings', False)
+
+        timeout = module.params.get('timeout')
+        manager_timeout = module.params.get('manager_timeout')
+        module_deadline = Deadline(timeout)
+        if timeout is not None or manager_timeout is not None:
+            results['timed_out'] = []
+
         found = 0
         seen = set()
         for pkgmgr in managers:
             if found and strategy == 'first':
                 break
+            if module_deadline.expired():
+                module.warn('The module timed out after %s seconds; not trying'
+                            ' any more package managers.' % timeout)
+                break
 
             # dedupe as per above
             if pkgmgr in seen:
                 continue
             seen.add(pkgmgr)
 
+            timings = PkgMgrTimings() if collect_timings else None
             try:
                 try:
                     # manager throws exception on init (calls self.test)
                     # if not usable.
-                    manager = PKG_MANAGERS[pkgmgr](module)
-                    if manager.is_available():
+                    with timed(timings, 'detection'):
+                        manager = PKG_MANAGERS[pkgmgr](module)
+                        manager.timings = timings
+                        manager.deadline = Deadline(manager_timeout, parent=module_deadline)
+                        available = manager.is_available()
+                    if available:
                         found += 1
-                        fn(module, results, pkg_mgr=manager, **kwargs)
+                        timed_out = False
+                        try:
+                            with timed(timings, 'assembly'):
+                                fn(module, results, pkg_mgr=manager, **kwargs)
+                        except DeadlineExceeded:
+                            timed_out = True
+                        if timed_out or manager.deadline.expired():
+                            results['timed_out'].append(pkgmgr)
+                            module.warn('Package manager %s timed out; its results'
+                                        ' are missing or incomplete.' % pkgmgr)
                 except Exception as e:
                     if pkgmgr in module.params['manager']:
                         module.warn('Requested package manager %s'
@@ -456,7 +849,13 @@ def for_each_pkg_mgr(fn):
                 if pkgmgr in module.params['manager']:
                     module.warn('Function "%s" failed with package manager %s:'
                                 ' %s' % (fn.__name__, pkgmgr, to_text(e)))
+            finally:
+                if timings is not None:
+                    results.setdefault('timings', {})[pkgmgr] = timings.as_dict()
 
+        if found == 0 and module_deadline.expired():
+            module.fail_json(msg='The module timed out after %s seconds'
+                             ' before any package manager was found.' % timeout)
         if found == 0:
             msg = (
                 'Could not detect a supported package manager'
@@ -15,21 +15,217 @@
 from __future__ import absolute_import, division, print_function
 __metaclass__ = type
 
+import glob
+import hashlib
+import os
+import shlex
+import threading
+import time
 from abc import ABCMeta, abstractmethod
+from contextlib import contextmanager
+from functools import partial
+from itertools import islice
+from operator import itemgetter
 
 from ansible.module_utils.six import with_metaclass
+from ansible.module_utils.common.text.converters import to_bytes
+from ansible.module_utils.common.locale import get_best_parsable_locale
 from ansible.module_utils.common.process import get_bin_path
 from ansible.module_utils.common._utils import get_all_subclasses
 
+from ansible_collections.swjmj1.package_utils.plugins.module_utils.facts.deadline import DeadlineExceeded
+from ansible_collections.swjmj1.package_utils.plugins.module_utils.facts.version import rpmvercmp_key
+from ansible_collections.swjmj1.package_utils.plugins.module_utils.facts.index import \
+    DEFAULT_MIN_SIMILARITY, MATCH_MODES, PackageIndex, PathIndex, TokenIndex, literal_substring, \
+    name_matcher, similarity
+
+try:
+    from ansible_collections.swjmj1.package_utils.plugins.module_utils.facts.async_process import run_commands
+    HAS_ASYNC_PROCESS = True
+except (ImportError, SyntaxError):
+    HAS_ASYNC_PROCESS = False
+
+try:
+    from concurrent.futures import ThreadPoolExecutor, wait
+    HAS_FUTURES = True
+except ImportError:     # Python 2 without the "futures" backport
+    HAS_FUTURES = False
+
+try:
+    from time import perf_counter as _clock
+except ImportError:     # Python 2
+    from time import time as _clock
+
+
+SORT_ORDERS = (None, 'name', 'version')
+
+# the MATCH_MODES, plus matching names that packages provide (e.g. virtual
+# packages) exactly
+SEARCH_MODES = MATCH_MODES + ('provides',)
+
+# what search terms may be matched against
+SEARCH_FIELDS = ('name', 'description')
+
+
+def paths_fingerprint(patterns):
+    """Return a hex digest of the paths matching the given glob patterns.
+
+    The digest covers each matching path's name, size and modification
+    time, which is cheap to check (however big the files) yet changes
+    whenever a package manager rewrites its files. Return None if
+    nothing matches.
+    """
+
+    paths = sorted(set(path for pattern in patterns for path in glob.glob(pattern)))
+    if not paths:
+        return None
+
+    digest = hashlib.sha1()
+    for path in paths:
+        try:
+            st = os.stat(path)
+        except (IOError, OSError):
+            continue
+        digest.update(to_bytes(
+            '%s\0%d\0%r\n' % (path, st.st_size, st.st_mtime),
+            errors='surrogate_or_strict',
+        ))
+    return digest.hexdigest()
+
+
+def command_env(*updates):
+    """Return the environment for a command, built the way that
+    AnsibleModule.run_command builds it: this process's environment,
+    updated with each of the given dicts (if any) in turn, minus the
+    Python paths added by AnsiballZ.
+    """
+
+    env = dict(os.environ)
+    for update in updates:
+        env.update(update or {})
+    if 'PYTHONPATH' in env:
+        pypaths = [
+            path for path in env['PYTHONPATH'].split(':')
+            if path and not path.endswith(('/ansible_modlib.zip', '/debug_dir'))
+        ]
+        if pypaths:
+            env['PYTHONPATH'] = ':'.join(pypaths)
+        else:
+            del env['PYTHONPATH']
+    return env
+
 
 def get_all_pkg_managers():
 
     return {obj.__name__.lower(): obj for obj in get_all_subclasses(PkgMgr) if obj not in (CLIMgr, LibMgr)}
 
 
+class _NullPhase(object):
+    """Stand-in for PkgMgrTimings.phase when timings are disabled."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_PHASE = _NullPhase()
+
+
+def timed(timings, phase):
+    """Return a context manager timing "phase" on "timings".
+
+    If "timings" is None (i.e. instrumentation is disabled), the
+    returned context manager does nothing.
+    """
+
+    if timings is None:
+        return _NULL_PHASE
+    return timings.phase(phase)
+
+
+class PkgMgrTimings(object):
+    """Time spent in each phase of a PkgMgr's work, plus counters.
+
+    Phases nest: while a phase is running, any time spent in a phase
+    started inside of it (in the same thread) is charged to the inner
+    phase only, so the per-phase totals never double count within a
+    thread. Phases running in several threads at once are summed, so
+    the totals can then add up to more than the elapsed time.
+    """
+
+    PHASES = ('detection', 'list_installed', 'list_available',
+              'search_pkg_substr', 'get_package_details', 'assembly')
+    COUNTERS = ('subprocess_calls', 'bytes_read', 'records_parsed')
+
+    def __init__(self):
+        self.phases = dict.fromkeys(self.PHASES, 0.0)
+        self.counters = dict.fromkeys(self.COUNTERS, 0)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @property
+    def _stack(self):
+        try:
+            return self._local.stack
+        except AttributeError:
+            self._local.stack = []
+            return self._local.stack
+
+    def _add_time(self, name, seconds):
+        with self._lock:
+            self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    @contextmanager
+    def phase(self, name):
+        stack = self._stack
+        now = _clock()
+        if stack:
+            # pause the enclosing phase
+            outer, started = stack[-1]
+            self._add_time(outer, now - started)
+        stack.append([name, now])
+        try:
+            yield
+        finally:
+            now = _clock()
+            name, started = stack.pop()
+            self._add_time(name, now - started)
+            if stack:
+                # resume the enclosing phase
+                stack[-1][1] = now
+
+    def count(self, counter, n=1):
+        with self._lock:
+            self.counters[counter] = self.counters.get(counter, 0) + n
+
+    def as_dict(self):
+        """Return the phases (in seconds) and counters as a plain dict."""
+
+        return {
+            'phases': dict((k, round(v, 6)) for k, v in self.phases.items()),
+            'counters': dict(self.counters),
+        }
+
+
 class PkgMgr(with_metaclass(ABCMeta, object)):  # type: ignore[misc]
 
     requires_module = False     # override as needed
+    search_workers = 1      # max. search terms to search for at once
+    DB_PATHS = ()   # glob patterns of files making up the installed package DB
+    REPO_PATHS = ()     # glob patterns of the local repo index files
+    VERSION_FIELDS = ('version',)   # package details needed by version_key
+    timings = None  # type: PkgMgrTimings | None
+    deadline = None     # type: Deadline | None
+    incomplete_terms = frozenset()  # terms cut short by the last search_packages
+    _repo_index = None  # type: PackageIndex | None
+    _installed_packages = None  # type: dict | None
+    _provides_index = None  # type: PackageIndex | None
+    _path_index = None  # type: PathIndex | None
+    _description_index = None   # type: TokenIndex | None
+    _available = None   # type: list | None
+    _listed_available = False
 
     def __init__(self, module=None):
         """Store an AnsibleModule object, if given (as "module").
@@ -76,6 +272,24 @@ class PkgMgr(with_metaclass(ABCMeta, object)):  # type: ignore[misc]
         """
         pass
 
+    def get_package_details_many(self, packages, fields=None):
+        """
+        This takes a list of 'package' items and returns a list of
+        dictionaries as "get_package_details" would, in the same order.
+
+        By default, "get_package_details" is called on each item in
+        turn; override this where a package manager's output can be
+        parsed all at once more cheaply.
+
+        If "fields" is given, only those keys of each dictionary (and
+        "name", which is always needed) are wanted, so overrides should
+        skip computing the others wherever that saves work. Any extra
+        keys are dropped by the callers anyway.
+        """
+
+        get_package_details = self.get_package_details
+        return [get_package_details(package) for package in packages]
+
     @abstractmethod
     def search_pkg_substr(self, substr):
         """
@@ -84,17 +298,308 @@ class PkgMgr(with_metaclass(ABCMeta, object)):  # type: ignore[misc]
         """
         pass
 
-    def get_packages(self):
+    def version_key(self, package_details):
+        """
+        Return a key for ordering the given package details by version,
+        oldest first, computed only from its VERSION_FIELDS.
+
+        By default, the "version" is compared the way rpm does, which
+        suits most version schemes; override this where the package
+        manager compares versions differently.
+        """
+
+        return rpmvercmp_key(package_details.get('version'))
+
+    def list_available(self):
+        """
+        This method should return a list of every package in the
+        machine's local repository indices, installed or not, each list
+        item being suitable for get_package_details; or None if the
+        package manager can't list them all at once (the default).
+        """
+
+        return None
+
+    def list_provides(self):
+        """
+        This method should return a list of (name, package) pairs, one
+        for each name (e.g. of a virtual package or a shared library)
+        that each package in the machine's local repository indices
+        provides, each package being suitable for get_package_details;
+        or None if there's no telling.
+
+        By default, the "provides" of every package in "list_available"
+        are parsed, if any.
+        """
+
+        packages = self._list_available_once()
+        if packages is None:
+            return None
+        with self._phase('get_package_details'):
+            all_package_details = self.get_package_details_many(packages, fields=('provides',))
+        self._count('records_parsed', len(all_package_details))
+        return [
+            (provided, package)
+            for package_details, package in zip(all_package_details, packages)
+            for provided in package_details.get('provides') or ()
+        ]
+
+    def list_descriptions(self):
+        """
+        This method should return a list of (name, description) pairs,
+        one for each package in the machine's local repository indices;
+        or None if there's no telling.
+
+        By default, the "description" of every package in
+        "list_available" is parsed, if any.
+        """
+
+        packages = self._list_available_once()
+        if packages is None:
+            return None
+        with self._phase('get_package_details'):
+            all_package_details = self.get_package_details_many(packages, fields=('description',))
+        self._count('records_parsed', len(all_package_details))
+        return [
+            (package_details['name'], package_details.get('description'))
+            for package_details in all_package_details
+        ]
+
+    def list_owned_files(self):
+        """
+        This method should return a list of (path, name) pairs, one for
+        each file or directory that each installed package owns, "name"
+        being the package's name; or None if the package manager can't
+        list them all at once (the default).
+        """
+
+        return None
+
+    def find_owners(self, paths):
+        """Return the names of the installed packages owning each path.
+
+        Return a dict mapping each given path to a list of package names,
+        which is empty if no installed package owns the path. A path not
+        found as given is looked up again with any symlinks resolved
+        (e.g. "/bin/sh" where /bin links to /usr/bin).
+
+        By default, the paths are looked up in "path_index", so that any
+        number of them take one pass over the package manager's file
+        lists; override this where the package manager can look paths
+        up more cheaply by itself.
+
+        Errors:
+          NotImplementedError -- if the package manager can't tell
+        """
+
+        index = self.path_index
+        if index is None:
+            raise NotImplementedError("Looking up the owners of files is not supported.")
+        owners_of = index.owners_of
+        return dict(
+            (path, owners_of(path) or owners_of(os.path.realpath(path)))
+            for path in paths
+        )
+
+    def db_fingerprint(self):
+        """
+        Return a cheap fingerprint of the installed package database,
+        which changes whenever packages are installed, removed or
+        upgraded; or None if there's no telling (i.e. without DB_PATHS).
+        """
+
+        return paths_fingerprint(self.DB_PATHS)
+
+    def repo_fingerprint(self):
+        """
+        Return a cheap fingerprint of the local repo indices, which
+        changes whenever they're updated; or None if there's no telling
+        (i.e. without REPO_PATHS).
+
+        Like "db_fingerprint", it covers only the files' paths, sizes and
+        modification times, which package managers like apt and pacman
+        take from the mirror they download the indices from, so hosts
+        updated from the same mirror get the same fingerprint.
+        """
+
+        return paths_fingerprint(self.REPO_PATHS)
+
+    @property
+    def repo_index(self):
+        """A PackageIndex of "list_available", or None if unsupported.
+
+        The index is built the first time it's needed, then kept.
+        """
+
+        if self._repo_index is None:
+            packages = self._list_available_once()
+            if packages is None:
+                return None
+            with self._phase('get_package_details'):
+                all_package_details = self.get_package_details_many(packages, fields=('name',))
+            self._count('records_parsed', len(all_package_details))
+            self._repo_index = PackageIndex(
+                (package_details['name'], package)
+                for package_details, package in zip(all_package_details, packages)
+            )
+        return self._repo_index
+
+    @property
+    def provides_index(self):
+        """A PackageIndex of "list_provides", or None if unsupported.
+
+        Like "repo_index", this is built the first time it's needed, from
+        the same enumeration of the local repo indices.
+        """
+
+        if self._provides_index is None:
+            entries = self.list_provides()
+            if entries is None:
+                return None
+            self._provides_index = PackageIndex(entries)
+        return self._provides_index
+
+    @property
+    def description_index(self):
+        """A TokenIndex of "list_descriptions", or None if unsupported.
+
+        Like "repo_index", this is built the first time it's needed, from
+        the same enumeration of the local repo indices.
+        """
+
+        if self._description_index is None:
+            entries = self.list_descriptions()
+            if entries is None:
+                return None
+            self._description_index = TokenIndex(entries)
+        return self._description_index
+
+    @property
+    def path_index(self):
+        """A PathIndex of "list_owned_files", or None if unsupported.
+
+        Like "repo_index", this is built the first time it's needed.
+        """
+
+        if self._path_index is None:
+            with self._phase('list_installed'):
+                entries = self.list_owned_files()
+            if entries is None:
+                return None
+            self._count('records_parsed', len(entries))
+            self._path_index = PathIndex(entries)
+        return self._path_index
+
+    def _list_available_once(self):
+        """Return "list_available", calling it only once per object."""
+
+        if not self._listed_available:
+            with self._phase('list_available'):
+                self._available = self.list_available()
+            self._listed_available = True
+        return self._available
+
+    def _index_names(self, index, match, term, min_similarity=DEFAULT_MIN_SIMILARITY,
+                     description_index=None, search_names=True, matcher=None):
+        """Yield the names in "index" matching "term" (if "search_names"
+        is true), then those of any other packages whose descriptions in
+        "description_index" (if given) contain all of the term's words.
+
+        "matcher" is the term's matcher from "name_matcher", if any, for
+        "index" to reuse.
+        """
+
+        seen = set()
+        if search_names:
+            for name in index.match(match, term, min_similarity, matcher):
+                seen.add(name)
+                yield name
+        if description_index is not None:
+            for name in sorted(description_index.search(term)):
+                if name not in seen and name in index:
+                    yield name
+
+    def _providers(self, name):
+        """Return the packages named or providing the given name."""
+
+        providers = list(self.provides_index.items(name))
+        repo_index = self.repo_index
+        if repo_index is not None:
+            named = repo_index.items(name)
+            providers = named + [package for package in providers if package not in named]
+        return providers
+
+    @property
+    def installed_packages(self):
+        """A dict of the names of installed packages and their versions.
+
+        Each name maps to the list of its installed versions, as strings.
+        Like "repo_index", this is built the first time it's needed, so
+        the installed packages are listed at most once per object.
+        """
+
+        if self._installed_packages is None:
+            self._installed_packages = dict(
+                (name, [package_details.get('version') for package_details in versions])
+                for name, versions in self.get_packages(fields=('version',)).items()
+            )
+        return self._installed_packages
+
+    def _phase(self, name):
+        return timed(self.timings, name)
+
+    def _check_deadline(self):
+        if self.deadline is not None:
+            self.deadline.check()
+
+    def _call(self, fn, *args, **kwargs):
+        """Return fn(*args, **kwargs), bounded by "deadline", if any (see
+        Deadline.call).
+        """
+
+        if self.deadline is None:
+            return fn(*args, **kwargs)
+        return self.deadline.call(fn, *args, **kwargs)
+
+    def _count(self, counter, n=1):
+        if self.timings is not None:
+            self.timings.count(counter, n)
+
+    def _finish_details(self, all_package_details, fields=None):
+        """Add "source" to the given package details, then keep only the
+        given fields (plus "name") of each, if any fields are given.
+        """
+
+        source = self.__class__.__name__.lower()
+        for package_details in all_package_details:
+            if 'source' not in package_details:
+                package_details['source'] = source
+        if fields is None:
+            return all_package_details
+
+        fields = set(fields)
+        fields.add('name')
+        return [
+            dict((key, value) for key, value in package_details.items() if key in fields)
+            for package_details in all_package_details
+        ]
+
+    def get_packages(self, fields=None):
         """
         Take all of the above and return a dictionary of lists of
         dictionaries (package = list of installed versions)
+
+        If "fields" is given, each dictionary has only those keys (plus
+        "name"), and package managers skip computing any others.
         """
 
         installed_packages = {}
-        for package in self.list_installed():
-            package_details = self.get_package_details(package)
-            if 'source' not in package_details:
-                package_details['source'] = self.__class__.__name__.lower()
+        with self._phase('list_installed'):
+            packages = self.list_installed()
+        with self._phase('get_package_details'):
+            all_package_details = self.get_package_details_many(packages, fields)
+        self._count('records_parsed', len(all_package_details))
+        for package_details in self._finish_details(all_package_details, fields):
             name = package_details['name']
             if name not in installed_packages:
                 installed_packages[name] = [package_details]
@@ -102,7 +607,7 @@ class PkgMgr(with_metaclass(ABCMeta, object)):  # type: ignore[misc]
                 installed_packages[name].append(package_details)
         return installed_packages
 
-    def search_packages(self, *search_terms):
+    def search_packages(self, *search_terms, **options):
         """Search all local repo indices by the given search terms.
 
         Return a dictionary where each key is a given search term, each
@@ -114,28 +619,342 @@ class PkgMgr(with_metaclass(ABCMeta, object)):  # type: ignore[misc]
         value is an empty list. If no search terms are given, then the
         whole returned dictionary is empty.
 
+        How package names are matched against search terms depends on
+        the "match" option (see below). Except when matching by
+        substring, the "repo_index" is used if the package manager
+        supports one, so that, e.g., exact matches are simply looked up;
+        otherwise "search_pkg_substr" is used to narrow down the search.
+
         Since some package managers can return "matches" whose names do
         not match the given search term -- e.g., apk returns "john" when
         searching for "ansible" -- any spurious results are pruned from
         the return value.
 
+        If "search_workers" is more than 1 and "search_pkg_substr" is
+        used, then up to that many search terms are searched for at
+        once, each in its own thread.
+
+        If the package manager's "deadline" passes, stop searching and
+        return results only for the search terms completed by then.
+        Either way, the search terms that the deadline cut short are
+        then kept in "incomplete_terms".
+
         Arguments:
           *search_terms -- sequence of strings to match against local
                            repo indices (with any duplicate items
                            automatically removed upon processing)
+        Options:
+          match -- how to match package names against search terms:
+                   "substring" (the default), "exact", "prefix", "glob"
+                   (shell-style wildcards, matching the whole name),
+                   "regex" (matching anywhere in the name), "fuzzy"
+                   (matching similar names, most similar first) or
+                   "provides" (matching packages named as or providing
+                   exactly the search term, as per "provides_index"; or
+                   just as "exact" if that's unsupported)
+          search_in -- collection of what to match search terms against:
+                       package "name" (the default) and/or
+                       "description", in which case a package matches if
+                       its description contains every word in a search
+                       term, as per "description_index" (after any
+                       matching names, sorted by name)
+          min_similarity -- for "fuzzy" matching, how similar names must
+                            be to search terms, from 0 to 1 (default
+                            0.5); with an index, only names sharing some
+                            trigrams with a search term are compared
+          sort -- None (the default) to keep matches in whatever order
+                  they're found, "name" to sort them by name, or
+                  "version" to sort them by name and then newest version
+                  first, as per "version_key"
+          latest_only -- if true, return only the newest version of each
+                         matching package (default False)
+          offset -- number of matches to skip for each search term
+                    (default 0)
+          limit -- maximum number of matches to return for each search
+                   term, after any skipped ones (default None, i.e. no
+                   limit); searching and parsing stop as soon as enough
+                   matches are found, unless they must all be found to
+                   be sorted or reduced first (which an index makes
+                   unnecessary)
+          fields -- collection of the keys wanted in each dictionary of
+                    package details (besides "name", which is always
+                    there), or None (the default) for all of them;
+                    package managers skip computing the others
+          annotate_installed -- if true, add to each dictionary whether
+                                the package is "installed" and, if so,
+                                its "installed_version" (the first one
+                                listed, if several are installed), else
+                                None; see "installed_packages" (default
+                                False); if the installed packages can't
+                                be listed before "deadline" passes,
+                                both are None (and every search term
+                                counts as cut short)
+        Errors:
+          ValueError -- for an unknown match mode or sort order, an
+                        invalid regex, a negative offset or limit, a
+                        "min_similarity" outside of 0 to 1, an unknown
+                        or empty "search_in" (or "description" in it
+                        when matching by "provides"), or any unknown
+                        option
+          NotImplementedError -- if "search_in" includes "description"
+                                 but the package manager has no
+                                 "description_index" or "repo_index"
+        """
+
+        match = options.pop('match', 'substring')
+        sort = options.pop('sort', None)
+        offset = options.pop('offset', 0)
+        limit = options.pop('limit', None)
+        fields = options.pop('fields', None)
+        latest_only = options.pop('latest_only', False)
+        annotate_installed = options.pop('annotate_installed', False)
+        min_similarity = options.pop('min_similarity', DEFAULT_MIN_SIMILARITY)
+        search_in = set(options.pop('search_in', ('name',)))
+        if options:
+            raise ValueError('Unknown search options: %s' % ', '.join(options))
+        if match not in SEARCH_MODES:
+            raise ValueError('Unknown match mode "%s"' % match)
+        if sort not in SORT_ORDERS:
+            raise ValueError('Unknown sort order "%s"' % sort)
+        if offset < 0 or (limit is not None and limit < 0):
+            raise ValueError('"offset" and "limit" must not be negative')
+        if not 0 <= min_similarity <= 1:
+            raise ValueError('"min_similarity" must be from 0 to 1')
+        if not search_in or not search_in.issubset(SEARCH_FIELDS):
+            raise ValueError('"search_in" must hold one or more of: %s' % ', '.join(SEARCH_FIELDS))
+        if match == 'provides' and 'description' in search_in:
+            raise ValueError('Descriptions can\'t be searched when matching by "provides"')
+
+        search_terms = list(set(search_terms))
+        search = partial(
+            self._search_term,
+            match=match, offset=offset, limit=limit, sort=sort, fields=fields,
+            latest_only=latest_only, min_similarity=min_similarity,
+        )
+        results = {}
+        try:
+            if match == 'provides' and search_terms and self.provides_index is None:
+                # Every package provides at least its own name.
+                match = 'exact'
+                search = partial(search, match=match)
+
+            index = None
+            if match != 'substring' and search_terms:
+                index = self.repo_index
+
+            if 'description' in search_in and search_terms:
+                # Names found by description must be looked up in an index.
+                index = self.repo_index
+                description_index = self.description_index
+                if index is None or description_index is None:
+                    raise NotImplementedError("Searching descriptions is not supported.")
+                search = partial(
+                    search,
+                    description_index=description_index, search_names='name' in search_in,
+                )
+
+            # Fail fast on invalid regexes, rather than in some thread.
+            matchers = [None] * len(search_terms)
+            if match in MATCH_MODES:
+                matchers = [name_matcher(match, term, min_similarity) for term in search_terms]
+
+            workers = min(self.search_workers, len(search_terms))
+            if match != 'provides' and index is None and HAS_FUTURES and workers > 1:
+                self._search_concurrently(search, search_terms, matchers, workers, results)
+            else:
+                for term, matcher in zip(search_terms, matchers):
+                    self._check_deadline()
+                    results[term] = search(term, matcher, index=index)
+        except DeadlineExceeded:
+            pass
+        self.incomplete_terms = set(term for term in search_terms if term not in results)
+
+        if annotate_installed and results:
+            try:
+                installed_packages = self.installed_packages
+            except DeadlineExceeded:
+                installed_packages = None
+                self.incomplete_terms.update(results)
+            for result_list in results.values():
+                for package_details in result_list:
+                    if installed_packages is None:
+                        # no telling, in the time left
+                        package_details['installed'] = None
+                        package_details['installed_version'] = None
+                        continue
+                    versions = installed_packages.get(package_details['name'])
+                    package_details['installed'] = versions is not None
+                    package_details['installed_version'] = versions[0] if versions else None
+        return results
+
+    def _search_concurrently(self, search, search_terms, matchers, workers, results):
+        """Search for each term in its own thread, "workers" at a time,
+        adding each term's results to "results" as per "search_packages".
+
+        If "deadline" passes, cancel the searches that haven't started,
+        wait for those already running (which are bound by the deadline
+        too, as far as they run commands) and add only the terms whose
+        searches were finished.
+        """
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = dict(
+                (executor.submit(search, term, matcher), term)
+                for term, matcher in zip(search_terms, matchers)
+            )
+            timeout = None if self.deadline is None else self.deadline.remaining()
+            not_done = wait(futures, timeout=timeout).not_done
+            for future in not_done:
+                future.cancel()
+        for future, term in futures.items():
+            if future.cancelled():
+                continue
+            try:
+                results[term] = future.result()
+            except DeadlineExceeded:
+                pass
+        if not_done:
+            raise DeadlineExceeded("The deadline has passed.")
+
+    def _search_term(self, term, matcher=None, index=None, match='substring',
+                     offset=0, limit=None, sort=None, fields=None, latest_only=False,
+                     min_similarity=DEFAULT_MIN_SIMILARITY, description_index=None,
+                     search_names=True):
+        """Return the list of "search_packages" results for one term.
+
+        Look up the term's providers in "provides_index" when matching
+        by "provides", or the term in "index", if given; otherwise,
+        search via "search_pkg_substr" and keep only the packages whose
+        names are accepted by "matcher" (ranking them by similarity to
+        the term for "fuzzy" matching, unless sorting otherwise). With
+        "index", also look up the packages found by description in
+        "description_index", if given.
         """
 
-        search_results = {}
-        for substr in set(search_terms):
+        stop = None if limit is None else offset + limit
+        by_version = latest_only or sort == 'version'
+        parse_fields = fields
+        if by_version and fields is not None:
+            parse_fields = list(fields) + list(self.VERSION_FIELDS)
+
+        if match == 'provides':
+            packages = self._providers(term)
+            matcher = None
+        elif index is not None and by_version:
+            # The index yields each name's versions together, and names in
+            # order, so stop as soon as enough names are done. Fuzzy
+            # matches come ranked, and description matches after name
+            # matches, so sorting those by name means sorting the names
+            # first (which is cheap next to parsing their details).
+            names = self._index_names(
+                index, match, term, min_similarity, description_index, search_names, matcher
+            )
+            if sort is not None and (match == 'fuzzy' or description_index is not None):
+                names = sorted(names)
             result_list = []
-            for package in self.search_pkg_substr(substr):
-                package_details = self.get_package_details(package)
-                if 'source' not in package_details:
-                    package_details['source'] = self.__class__.__name__.lower()
-                if substr in package_details['name']:
-                    result_list.append(package_details)
-            search_results[substr] = result_list
-        return search_results
+            for name in names:
+                versions = self._by_version(
+                    self._parse_matching(index.items(name), fields=parse_fields),
+                    latest_only,
+                )
+                result_list.extend(versions)
+                if stop is not None and len(result_list) >= stop:
+                    break
+            return self._finish_details(result_list[offset:stop], fields)
+        elif index is not None:
+            # The index yields only matches, already sorted by name (or
+            # ranked, for fuzzy matching), unless descriptions add more.
+            packages = (
+                package
+                for name in self._index_names(
+                    index, match, term, min_similarity, description_index, search_names, matcher
+                )
+                for package in index.items(name)
+            )
+            matcher = None
+            if match != 'fuzzy' and description_index is None:
+                sort = None
+        else:
+            with self._phase('search_pkg_substr'):
+                packages = self.search_pkg_substr(literal_substring(match, term))
+
+        # Without an index, fuzzy matches must all be found to be ranked.
+        rank = match == 'fuzzy' and index is None and sort is None
+        if by_version:
+            result_list = self._by_version(
+                self._parse_matching(packages, matcher, fields=parse_fields),
+                latest_only,
+            )
+            if sort is not None:
+                result_list.sort(key=itemgetter('name'))
+        elif sort == 'name' or rank:
+            result_list = self._parse_matching(packages, matcher, fields=fields)
+            if sort == 'name':
+                result_list.sort(key=itemgetter('name'))
+        else:
+            result_list = self._parse_matching(packages, matcher, stop, fields)
+        if rank:
+            lowered_term = term.lower()
+            result_list.sort(
+                key=lambda package_details: -similarity(lowered_term, package_details['name'].lower())
+            )
+        return self._finish_details(result_list[offset:stop], fields)
+
+    def _by_version(self, all_package_details, latest_only=False):
+        """Return the given package details grouped by name, in order of
+        each package's first appearance, newest version first.
+
+        If "latest_only" is true, keep only the newest version of each
+        package instead.
+
+        Only versions of the same package are ever compared, since that
+        can be costly (e.g. pkg compares them via its CLI).
+        """
+
+        version_key = self.version_key
+        names = []
+        versions = {}
+        for package_details in all_package_details:
+            name = package_details['name']
+            if name not in versions:
+                names.append(name)
+                versions[name] = []
+            versions[name].append(package_details)
+        if latest_only:
+            return [max(versions[name], key=version_key) for name in names]
+        return [
+            package_details
+            for name in names
+            for package_details in sorted(versions[name], key=version_key, reverse=True)
+        ]
+
+    def _parse_matching(self, packages, matcher=None, stop=None, fields=None):
+        """Return the details of the given packages whose names match.
+
+        If "stop" is given, parse only as many packages as it takes to
+        find that many matches (in batches of "stop" packages).
+        """
+
+        packages = iter(packages)
+        result_list = []
+        while True:
+            batch = list(islice(packages, stop))
+            if not batch:
+                break
+            with self._phase('get_package_details'):
+                all_package_details = self.get_package_details_many(batch, fields)
+            self._count('records_parsed', len(all_package_details))
+            if matcher is None:
+                result_list.extend(all_package_details)
+            else:
+                result_list.extend(
+                    package_details
+                    for package_details in all_package_details
+                    if matcher(package_details['name'])
+                )
+            if stop is None or len(result_list) >= stop:
+                break
+        return result_list
 
 
 class LibMgr(PkgMgr):
@@ -161,10 +980,16 @@ class CLIMgr(PkgMgr):
 
     requires_module = True      # must have access to method run_command
     CLI = None  # type: str | None
+    parsable_locale = False     # override if the CLI's output is localized
+    max_concurrent_commands = 4     # override as needed (before __init__)
+    search_workers = 4      # each search is a subprocess, so overlap them
 
     def __init__(self, module=None):
 
         self._cli = None
+        self._locale = None
+        # shared by all threads, e.g. each searching for another term
+        self._command_slots = threading.BoundedSemaphore(max(1, self.max_concurrent_commands))
         super(CLIMgr, self).__init__(module)
 
     def is_available(self):
@@ -173,3 +998,133 @@ class CLIMgr(PkgMgr):
         except ValueError:
             return False
         return True
+
+    def _command_environ(self, environ_update=None):
+        """Return the environment variables to set for any command.
+
+        If "parsable_locale" is true, this sets LC_ALL to the best
+        parsable locale, looked up only once per object.
+        """
+
+        environ = {}
+        if self.parsable_locale:
+            if self._locale is None:
+                self._locale = get_best_parsable_locale(self.module)
+            environ['LC_ALL'] = self._locale
+        if environ_update:
+            environ.update(environ_update)
+        return environ
+
+    def _command_env(self, environ_update=None):
+        """Return the whole environment for commands run without the
+        module's "run_command", built as per "command_env" from the
+        module's "run_command_environ_update" and then "_command_environ".
+        """
+
+        return command_env(
+            getattr(self.module, 'run_command_environ_update', None),
+            self._command_environ(environ_update),
+        )
+
+    def _count_output(self, out, err):
+        if self.timings is not None:
+            self.timings.count('subprocess_calls')
+            self.timings.count(
+                'bytes_read',
+                len(to_bytes(out, errors='surrogate_or_strict'))
+                + len(to_bytes(err, errors='surrogate_or_strict'))
+            )
+
+    @contextmanager
+    def _command_slot(self):
+        """Hold one of the "max_concurrent_commands" slots for running
+        commands, which all threads using this object share, while the
+        block runs.
+
+        Wait for a free slot at most until "deadline" passes, raising
+        DeadlineExceeded then.
+        """
+
+        if self.deadline is None or self.deadline.remaining() is None:
+            self._command_slots.acquire()
+        else:
+            while not self._command_slots.acquire(False):
+                self.deadline.check()
+                time.sleep(0.01)
+        try:
+            yield
+        finally:
+            self._command_slots.release()
+
+    def _run_command(self, args, **kwargs):
+        """Run a command via the module's "run_command" method.
+
+        Take the same arguments and return the same (rc, out, err)
+        tuple as "run_command", setting the environment as per
+        "_command_environ" and counting the call and its output if
+        timings are enabled. The command takes up one of the slots of
+        "_command_slot" while it runs.
+
+        If "deadline" is limited, the command is killed when it passes
+        (along with any processes it started, e.g. a shell's pipeline),
+        raising DeadlineExceeded, provided that asyncio subprocesses are
+        usable with this Python and no other "run_command" options are
+        given. The environment is then built as per "_command_env".
+        """
+
+        environ_update = kwargs.pop('environ_update', None)
+        with self._command_slot():
+            remaining = None if self.deadline is None else self.deadline.remaining()
+            if remaining is not None:
+                self.deadline.check()
+            if remaining is not None and HAS_ASYNC_PROCESS \
+                    and set(kwargs) <= set(['use_unsafe_shell']):
+                if not isinstance(args, list):
+                    args = ['/bin/sh', '-c', args] if kwargs.get('use_unsafe_shell') else shlex.split(args)
+                rc, out, err = run_commands(
+                    [args], limit=1, env=self._command_env(environ_update), timeout=remaining,
+                )[0]
+            else:
+                rc, out, err = self.module.run_command(
+                    args, environ_update=self._command_environ(environ_update), **kwargs
+                )
+        self._count_output(out, err)
+        return rc, out, err
+
+    def _run_commands(self, commands, environ_update=None):
+        """Run several commands, overlapping them where possible.
+
+        Return a list of (rc, out, err) tuples, one per command and in
+        the same order, leaving it to the caller to check "rc" and "err"
+        just like with "_run_command". At most "max_concurrent_commands"
+        commands are run at once, counting those run by other threads
+        (see "_command_slot").
+
+        If asyncio subprocesses are unusable with this Python, then run
+        the commands one by one via "_run_command" instead.
+
+        Arguments:
+          commands -- sequence of commands, each a list of arguments
+          environ_update -- dict of extra environment variables to set
+                            for each command
+        """
+
+        commands = list(commands)
+        if not HAS_ASYNC_PROCESS or len(commands) < 2 \
+                or self.max_concurrent_commands < 2:
+            return [
+                self._run_command(args, environ_update=environ_update)
+                for args in commands
+            ]
+
+        self._check_deadline()
+        results = run_commands(
+            commands,
+            limit=self.max_concurrent_commands,
+            env=self._command_env(environ_update),
+            timeout=None if self.deadline is None else self.deadline.remaining(),
+            slots=self._command_slots,
+        )
+        for rc, out, err in results:
+            self._count_output(out, err)
+        return results
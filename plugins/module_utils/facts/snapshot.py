@@ -0,0 +1,188 @@
+# SPDX-FileCopyrightText: 2023 swjmj1 <swjmj1@tuta.io>
+# SPDX-License-Identifier: BSD-2-Clause
+
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import gzip
+import hashlib
+import io
+import json
+import os
+import tempfile
+
+from ansible.module_utils.common.text.converters import to_bytes, to_text
+from ansible.module_utils.six import string_types
+
+
+# The package details kept in a snapshot (besides the name), for whichever
+# package managers have them. Only ever append to these, since entries in
+# snapshots taken before are read as if padded with None.
+SNAPSHOT_FIELDS = (
+    'version', 'release', 'epoch', 'revision', 'port_epoch', 'arch',
+    'ebuild_revision', 'category',
+)
+
+
+def make_snapshot(packages):
+    """Make a compact snapshot of the output of "PkgMgr.get_packages".
+
+    Return a dict mapping each package name to a sorted list of lists,
+    each holding one installed version's SNAPSHOT_FIELDS in order (or
+    None where missing), so that equal package sets give equal
+    snapshots.
+    """
+
+    return dict(
+        (name, sorted(
+            [[package_details.get(field) for field in SNAPSHOT_FIELDS]
+             for package_details in all_package_details],
+            key=json.dumps,
+        ))
+        for name, all_package_details in packages.items()
+    )
+
+
+def expand_entries(name, entries, source=None):
+    """Turn a snapshot's entries for a package into package details."""
+
+    all_package_details = []
+    for entry in entries:
+        package_details = dict(
+            (field, value)
+            for field, value in zip(SNAPSHOT_FIELDS, entry)
+            if value is not None
+        )
+        package_details['name'] = name
+        if source is not None:
+            package_details['source'] = source
+        all_package_details.append(package_details)
+    return all_package_details
+
+
+def snapshot_fingerprint(snapshot):
+    """Return a hex digest identifying the given snapshot's contents."""
+
+    return hashlib.sha1(to_bytes(_dumps(snapshot))).hexdigest()
+
+
+def diff_snapshots(old, new):
+    """Return the differences between two snapshots.
+
+    Return a tuple (added, removed, changed) of sorted lists of package
+    names: those only in "new", those only in "old", and those in both
+    but with different entries.
+    """
+
+    added = sorted(name for name in new if name not in old)
+    removed = sorted(name for name in old if name not in new)
+    changed = sorted(
+        name for name in new
+        if name in old and _padded(old[name]) != _padded(new[name])
+    )
+    return added, removed, changed
+
+
+def _padded(entries):
+    """Return snapshot entries padded to all of SNAPSHOT_FIELDS, sorted."""
+
+    return sorted(
+        (list(entry) + [None] * (len(SNAPSHOT_FIELDS) - len(entry)) for entry in entries),
+        key=json.dumps,
+    )
+
+
+def _dumps(snapshot):
+    return json.dumps(snapshot, sort_keys=True, separators=(',', ':'))
+
+
+class SnapshotStore(object):
+    """Snapshots of installed packages, kept in a directory on disk.
+
+    Each package manager gets a subdirectory, holding each snapshot in a
+    gzipped JSON file named after its fingerprint, plus a "latest.json"
+    recording the fingerprint of the latest snapshot and the package
+    database fingerprint (see "PkgMgr.db_fingerprint") it was taken at.
+    """
+
+    def __init__(self, directory):
+        self.directory = os.path.expanduser(directory)
+
+    def _path(self, manager, name):
+        return os.path.join(self.directory, manager, name)
+
+    def _write(self, path, data):
+        # Write atomically, so that concurrent runs never see half a file.
+        directory = os.path.dirname(path)
+        if not os.path.isdir(directory):
+            os.makedirs(directory, 0o700)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.rename(tmp_path, path)
+        except Exception:
+            os.unlink(tmp_path)
+            raise
+
+    def latest(self, manager):
+        """Return the dict in the manager's "latest.json", or None."""
+
+        try:
+            with open(self._path(manager, 'latest.json'), 'rb') as f:
+                return json.loads(to_text(f.read()))
+        except (IOError, OSError, ValueError):
+            return None
+
+    def load(self, manager, fingerprint):
+        """Return the snapshot with the given fingerprint, or None."""
+
+        if not isinstance(fingerprint, string_types) or not fingerprint or os.sep in fingerprint:
+            return None
+        try:
+            with gzip.open(self._path(manager, fingerprint + '.json.gz'), 'rb') as f:
+                return json.loads(to_text(f.read()))
+        except (IOError, OSError, ValueError):
+            return None
+
+    def save(self, manager, snapshot, db_fingerprint=None):
+        """Store a snapshot as the manager's latest; return its fingerprint."""
+
+        fingerprint = snapshot_fingerprint(snapshot)
+        path = self._path(manager, fingerprint + '.json.gz')
+        if not os.path.exists(path):
+            buf = io.BytesIO()
+            with gzip.GzipFile(fileobj=buf, mode='wb') as f:
+                f.write(to_bytes(_dumps(snapshot)))
+            self._write(path, buf.getvalue())
+        else:
+            # mark it as recently used, for "prune"
+            os.utime(path, None)
+        self._write(
+            self._path(manager, 'latest.json'),
+            to_bytes(json.dumps({
+                'fingerprint': fingerprint,
+                'db_fingerprint': db_fingerprint,
+            })),
+        )
+        return fingerprint
+
+    def prune(self, manager, keep):
+        """Delete all but the "keep" most recently saved snapshots."""
+
+        directory = os.path.join(self.directory, manager)
+        try:
+            paths = [
+                os.path.join(directory, name)
+                for name in os.listdir(directory)
+                if name.endswith('.json.gz')
+            ]
+        except OSError:
+            return
+        paths.sort(key=os.path.getmtime, reverse=True)
+        for path in paths[max(keep, 1):]:
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
@@ -0,0 +1,289 @@
+# SPDX-FileCopyrightText: 2023 swjmj1 <swjmj1@tuta.io>
+# SPDX-License-Identifier: BSD-2-Clause
+
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import re
+import string
+from functools import cmp_to_key, wraps
+
+
+# Ranks of the kinds of version segments for rpmvercmp-style comparison,
+# in increasing order of precedence; "END" stands for the end of the
+# version, so that, e.g., "1.0~rc1" < "1.0" < "1.0^git1" < "1.0a" < "1.0.1"
+# with rpm.
+TILDE, END, CARET, ALPHA, NUMERIC = range(5)
+
+RPM_SEGMENT_RE = re.compile(r"~|\^|[0-9]+|[a-zA-Z]+")
+
+# what pacman's vercmp takes for letters and digits (as in the C locale)
+ASCII_LETTERS = frozenset(string.ascii_letters)
+ASCII_DIGITS = frozenset(string.digits)
+ASCII_ALNUM = ASCII_LETTERS | ASCII_DIGITS
+
+# a run of non-digits followed by a run of digits, as compared by dpkg
+DPKG_CHUNK_RE = re.compile(r"([^0-9]*)([0-9]*)")
+DPKG_EMPTY_CHUNK = ((0,), 0)
+
+APK_VERSION_RE = re.compile(r"([0-9]+(?:\.[0-9]+)*)([a-z]?)((?:_[a-z]+[0-9]*)*)")
+APK_SUFFIX_RE = re.compile(r"_([a-z]+)([0-9]*)")
+# ranks of apk's version suffixes; no suffix at all ranks 0
+APK_SUFFIXES = {
+    'alpha': -4, 'beta': -3, 'pre': -2, 'rc': -1,
+    'cvs': 1, 'svn': 2, 'git': 3, 'hg': 4, 'p': 5,
+}
+
+
+def memoize(maxsize=4096):
+    """Cache the results of a function of hashable arguments.
+
+    Package lists repeat the same version strings over and over (e.g.
+    every package built from one source), so each is turned into a key
+    only once. The cache is simply emptied whenever it holds "maxsize"
+    results, to bound its memory use.
+    """
+
+    def decorator(fn):
+        cache = {}
+
+        @wraps(fn)
+        def wrapper(*args):
+            try:
+                return cache[args]
+            except KeyError:
+                pass
+            if len(cache) >= maxsize:
+                cache.clear()
+            result = cache[args] = fn(*args)
+            return result
+
+        wrapper.cache = cache
+        return wrapper
+    return decorator
+
+
+def _to_int(value):
+    """Return "value" as an int, ignoring any leading "r", else 0."""
+
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        pass
+    try:
+        return int(value.lstrip('r'))
+    except (AttributeError, ValueError):
+        return 0
+
+
+def _split_evr(version):
+    """Split an "[epoch:]version[-release]" string up into its parts."""
+
+    epoch, sep, rest = version.partition(':')
+    if not sep or not epoch.isdigit():
+        epoch, rest = '0', version
+    upstream, sep, release = rest.rpartition('-')
+    if not sep:
+        upstream, release = rest, ''
+    return int(epoch), upstream, release
+
+
+@memoize()
+def rpmvercmp_key(version):
+    """Return a key ordering version strings the way rpm's rpmvercmp does.
+
+    The version is split up into numeric and alphabetic segments (other
+    characters only separate them), which are compared in turn:
+    numbers numerically and newer than letters, letters
+    lexicographically, with "~" older and "^" newer than the end of
+    the version. Any version string is accepted.
+    """
+
+    key = []
+    for segment in RPM_SEGMENT_RE.findall(version or ''):
+        if segment == '~':
+            key.append((TILDE, 0))
+        elif segment == '^':
+            key.append((CARET, 0))
+        elif segment.isdigit():
+            key.append((NUMERIC, int(segment)))
+        else:
+            key.append((ALPHA, segment))
+    key.append((END, 0))
+    return tuple(key)
+
+
+def evr_key(epoch, version, release):
+    """Return a key ordering rpm packages by epoch, version and release."""
+
+    return (_to_int(epoch), rpmvercmp_key(version), rpmvercmp_key(release))
+
+
+def _alpm_rpmvercmp(a, b):
+    """Compare two version strings as libalpm's rpmvercmp does: return
+    -1, 0 or 1 if "a" is older than, as new as or newer than "b".
+
+    Unlike rpm's, it doesn't ignore separators: where both versions go
+    on after separators of different lengths, the longer separator is
+    newer, and where only one goes on, it's newer unless it goes on
+    with a letter, so that "1.0a" < "1.0" < "1.0.a".
+    """
+
+    if a == b:
+        return 0
+    len_a, len_b = len(a), len(b)
+    one = two = ptr1 = ptr2 = 0
+    while one < len_a and two < len_b:
+        while one < len_a and a[one] not in ASCII_ALNUM:
+            one += 1
+        while two < len_b and b[two] not in ASCII_ALNUM:
+            two += 1
+        if one == len_a or two == len_b:
+            break
+        if one - ptr1 != two - ptr2:
+            return -1 if one - ptr1 < two - ptr2 else 1
+        ptr1, ptr2 = one, two
+
+        # Take the next run of digits or letters (whichever "a" has next)
+        # from each.
+        is_number = a[ptr1] in ASCII_DIGITS
+        kind = ASCII_DIGITS if is_number else ASCII_LETTERS
+        while ptr1 < len_a and a[ptr1] in kind:
+            ptr1 += 1
+        while ptr2 < len_b and b[ptr2] in kind:
+            ptr2 += 1
+        segment_a, segment_b = a[one:ptr1], b[two:ptr2]
+        if not segment_b:
+            # Numbers are newer than letters.
+            return 1 if is_number else -1
+        if is_number:
+            segment_a, segment_b = segment_a.lstrip('0'), segment_b.lstrip('0')
+            if len(segment_a) != len(segment_b):
+                return 1 if len(segment_a) > len(segment_b) else -1
+        if segment_a != segment_b:
+            return -1 if segment_a < segment_b else 1
+        one, two = ptr1, ptr2
+
+    if one == len_a and two == len_b:
+        return 0
+    if (one == len_a and b[two] not in ASCII_LETTERS) or (one < len_a and a[one] in ASCII_LETTERS):
+        return -1
+    return 1
+
+
+def _alpm_split_evr(version):
+    """Split an "[epoch:]version[-release]" string up as libalpm does,
+    with a release of None if there's none.
+    """
+
+    digits = len(version) - len(version.lstrip(string.digits))
+    if version[digits:digits + 1] == ':':
+        epoch, rest = version[:digits] or '0', version[digits + 1:]
+    else:
+        epoch, rest = '0', version
+    upstream, sep, release = rest.rpartition('-')
+    if not sep:
+        return epoch, rest, None
+    return epoch, upstream, release
+
+
+def pacman_vercmp(a, b):
+    """Compare two "[epoch:]pkgver[-pkgrel]" strings as pacman's vercmp
+    does: return -1, 0 or 1 if "a" is older than, as new as or newer
+    than "b". The releases are only compared if both versions have one.
+    """
+
+    if a == b:
+        return 0
+    epoch_a, upstream_a, release_a = _alpm_split_evr(a)
+    epoch_b, upstream_b, release_b = _alpm_split_evr(b)
+    result = _alpm_rpmvercmp(epoch_a, epoch_b) or _alpm_rpmvercmp(upstream_a, upstream_b)
+    if not result and release_a is not None and release_b is not None:
+        result = _alpm_rpmvercmp(release_a, release_b)
+    return result
+
+
+_pacman_key = cmp_to_key(pacman_vercmp)
+
+
+def pacman_version_key(version):
+    """Return a key ordering "[epoch:]pkgver[-pkgrel]" strings the way
+    pacman's vercmp does (see "pacman_vercmp").
+    """
+
+    return _pacman_key(version or '')
+
+
+def _dpkg_order(char):
+    if char == '~':
+        return -1
+    elif char.isalpha():
+        return ord(char)
+    return ord(char) + 256
+
+
+@memoize()
+def _dpkg_part_key(part):
+    chunks = [
+        (tuple(_dpkg_order(char) for char in nondigits) + (0,), int(digits or 0))
+        for nondigits, digits in DPKG_CHUNK_RE.findall(part)
+        if nondigits or digits
+    ]
+    # dpkg compares versions as if padded with empty chunks, so trailing
+    # empty chunks make no difference. Only the first chunk can be empty
+    # otherwise, so two empty chunks at the end make sure that a shorter
+    # key's padding is compared against the longer key's next non-empty
+    # chunk.
+    while chunks and chunks[-1] == DPKG_EMPTY_CHUNK:
+        chunks.pop()
+    return tuple(chunks) + (DPKG_EMPTY_CHUNK, DPKG_EMPTY_CHUNK)
+
+
+@memoize()
+def dpkg_version_key(version):
+    """Return a key ordering "[epoch:]upstream[-revision]" strings the
+    way dpkg does, e.g. with "~" sorting before anything, even the end.
+    """
+
+    epoch, upstream, revision = _split_evr(version or '')
+    return (epoch, _dpkg_part_key(upstream), _dpkg_part_key(revision))
+
+
+@memoize()
+def apk_version_key(version, release=''):
+    """Return a key ordering apk's package versions and "rN" releases.
+
+    The version is made of dot-separated numbers, an optional letter and
+    any number of suffixes such as "_rc1" (older than no suffix) or
+    "_p1" (newer). Any trailing garbage is ignored.
+    """
+
+    match = APK_VERSION_RE.match(version or '')
+    if match is None:
+        return ((), '', ((0, 0),), _to_int(release))
+    numbers, letter, suffixes = match.groups()
+    suffix_key = tuple(
+        (APK_SUFFIXES.get(suffix, 0), int(number or 0))
+        for suffix, number in APK_SUFFIX_RE.findall(suffixes)
+    ) + ((0, 0),)
+    return (
+        tuple(int(number) for number in numbers.split('.')),
+        letter,
+        suffix_key,
+        _to_int(release),
+    )
+
+
+def pkg_version_string(version, revision=0, port_epoch=0):
+    """Join FreeBSD pkg's version back up from its parts, as
+    "version[_revision][,port_epoch]", leaving out a revision or port
+    epoch of 0.
+    """
+
+    version = version or ''
+    if _to_int(revision):
+        version += '_%d' % _to_int(revision)
+    if _to_int(port_epoch):
+        version += ',%d' % _to_int(port_epoch)
+    return version
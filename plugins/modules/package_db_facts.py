@@ -15,17 +15,18 @@ DOCUMENTATION = """
 module: package_db_facts
 short_description: Facts about search results for package names
 description:
-    - Given a list of package name substrings as search terms, return
+    - Given a list of package name substrings (or words in package
+      descriptions; see I(search_in)) as search terms, return
       information about each matching package from the system's local
       package database. Here, "package database" refers to wherever the
       system's package manager keeps metadata about its package
       repositories.
     - The returned packages themselves may or may not be installed on
       the system in question; to find out which packages are installed,
-      cross-reference results with the M(ansible.builtin.package_facts)
-      module.
-    - A package matches a given search term if it contains that term as
-      a substring.
+      use the I(annotate_installed) option.
+    - By default, a package matches a given search term if its name
+      contains that term as a substring; see the I(match) option for
+      other ways of matching.
     - Note that no connection to online repositories is made by this
       module, because only the package manager's local database is
       queried. It is up to the invoking role or playbook to ensure the
@@ -42,6 +43,226 @@ options:
         required: true
         type: list
         elements: str
+    match:
+        description:
+            - How package names are matched against the search terms.
+            - C(substring) matches names containing the search term.
+            - C(exact) matches only the name equal to the search term.
+            - C(prefix) matches names starting with the search term.
+            - C(glob) matches names against the search term as a
+              shell-style wildcard pattern, e.g. C(python3-*).
+            - C(regex) matches names containing a match for the search
+              term as a Python regular expression. Use C(^) and C($) to
+              anchor it.
+            - C(fuzzy) matches names similar to the search term (see
+              I(min_similarity)), ignoring case, most similar first
+              unless sorted otherwise, e.g. C(py3-yaml) matches
+              C(python3-yaml) and C(python-yaml). With an index, only
+              names sharing enough three-letter sequences with the
+              search term are compared, which makes this much faster but
+              may miss a few weak matches.
+            - C(provides) matches packages named exactly as the search
+              term, or providing it, e.g. virtual packages like C(sh) or
+              shared libraries like C(so:libssl.so.3) with apk. What
+              packages provide is looked up in an index, built once per
+              run (currently with apk and pacman); with other package
+              managers, this is the same as C(exact).
+            - Where the package manager can list its whole package
+              database at once (currently apk and pacman), all modes but
+              C(substring) look names up in an index of that list, so
+              that, e.g., C(exact) and C(prefix) lookups don't need a
+              full scan.
+        type: str
+        choices: ['substring', 'exact', 'prefix', 'glob', 'regex', 'fuzzy', 'provides']
+        default: substring
+    search_in:
+        description:
+            - What to match the search terms against.
+            - C(name) matches package names as per I(match).
+            - C(description) matches packages whose descriptions contain
+              every word of a search term, in any order and ignoring
+              case, e.g. C(yaml parser). Descriptions are looked up in
+              an index of words, built once per run from the same
+              listing of the package database as the index of names, so
+              this needs a package manager that can list its whole
+              package database at once (currently apk and pacman).
+            - With both, packages found by description come after those
+              found by name, unless sorted otherwise.
+            - C(description) can't be used with I(match=provides).
+        type: list
+        elements: str
+        choices: ['name', 'description']
+        default: ['name']
+    min_similarity:
+        description:
+            - With I(match=fuzzy), how similar a package name must be to
+              a search term to match, from C(0) to C(1) (identical).
+            - Similarity is 1 minus the edit distance between the two,
+              relative to the length of the longer one.
+        type: float
+        default: 0.5
+    limit:
+        description:
+            - The maximum number of matching packages to return for each
+              search term (after skipping any per I(offset)).
+            - Searching stops as soon as enough matches are found, so
+              broad search terms like C(lib) are much cheaper with a
+              limit, unless I(sort) or I(latest_only) without an index
+              forces every match to be found first.
+            - By default, there is no limit.
+        type: int
+    offset:
+        description:
+            - The number of matching packages to skip for each search
+              term, e.g. to page through results together with I(limit).
+            - Use with I(sort), or with a I(match) mode served from
+              an index, for the pages to be consistent from run to run.
+        type: int
+        default: 0
+    sort:
+        description:
+            - The order of the matching packages for each search term.
+            - C(none) keeps whatever order the package manager finds them
+              in.
+            - C(name) sorts them by name, which is free for the
+              I(match) modes served from an index.
+            - C(version) sorts them by name, then the versions of each
+              package from newest to oldest, comparing versions the way
+              the package manager does (e.g. C(1.0~rc1) is older than
+              C(1.0) with apt, and epochs come first).
+        type: str
+        choices: ['none', 'name', 'version']
+        default: none
+    latest_only:
+        description:
+            - If true, return only the newest version of each matching
+              package, comparing versions as with I(sort=version).
+            - This is much cheaper than picking out the newest versions
+              in a template, and returns much less data when the package
+              database holds several versions of many packages.
+            - I(limit) and I(offset) apply to the remaining packages.
+        type: bool
+        default: false
+    fields:
+        description:
+            - The package details to return for each matching package,
+              e.g. C([name, version]).
+            - The package's name is always returned.
+            - Details that aren't asked for aren't computed at all, which
+              can save a lot of work with some package managers (e.g.
+              looking up the origin of each package with apt).
+            - By default, every detail is returned.
+        type: list
+        elements: str
+    annotate_installed:
+        description:
+            - If true, add to each matching package whether it's
+              C(installed) and, if so, its C(installed_version) (else
+              null).
+            - Each package manager lists its installed packages at most
+              once per run, however many search terms are given, and
+              each result is simply looked up by name. This is much
+              cheaper than running M(ansible.builtin.package_facts) as
+              well and joining the results in a template.
+            - If several versions of a package are installed, only the
+              first one listed by the package manager is returned as the
+              C(installed_version).
+            - Results are never cached when annotated, since they depend
+              on each target's installed packages.
+        type: bool
+        default: false
+    output_format:
+        description:
+            - The format of the list of matching packages for each search
+              term.
+            - C(list) returns a list of dicts of package details, one per
+              package.
+            - C(columnar) returns a dict with a list of C(fields) (always
+              starting with C(name)), a list of C(columns) holding each
+              field's values for every package in turn, and the C(count)
+              of packages. This avoids repeating every key for every
+              package, which makes for much smaller results when there
+              are many matches.
+            - Use the P(swjmj1.package_utils.from_columnar#filter) filter
+              to turn C(columnar) results back into lists of dicts.
+        type: str
+        choices: ['list', 'columnar']
+        default: list
+    cache:
+        description:
+            - If true, cache search results on the controller, keyed by
+              fingerprints of the target's local repo indices (along with
+              the package manager and the other options), so that hosts
+              with the same indices (e.g. a group of hosts all updated
+              from the same mirror) only search once between them.
+            - The fingerprints cover only the paths, sizes and
+              modification times of the index files, which package
+              managers like apt and pacman take from the mirror.
+            - To check for a cached result, the module first runs with
+              I(fingerprint_only=true), which is much cheaper than a
+              search. Only if nothing is cached does the search run.
+            - That check costs an extra module run, so this pays off
+              only with several hosts sharing the same indices, or
+              repeated searches.
+            - The cache is kept in the directory named by the
+              E(PACKAGE_UTILS_CACHE_DIR) environment variable on the
+              controller (by default,
+              C(~/.ansible/swjmj1.package_utils/package_db_facts)), and
+              holds at most E(PACKAGE_UTILS_CACHE_MAX_ENTRIES) (by
+              default, 256) results, evicting the least recently used.
+            - Results are not cached if there were any warnings, nor if
+              the package manager has no known index files to
+              fingerprint.
+        type: bool
+        default: false
+    fingerprint_only:
+        description:
+            - If true, don't search; only return fingerprints of the
+              local repo indices, under C(repo_fingerprints).
+        type: bool
+        default: false
+    daemon:
+        description:
+            - If true, search via a helper process on the target which
+              keeps each package manager's parsed databases and indexes
+              in memory between runs, answering over a Unix domain
+              socket, so that only the first run in a while pays for
+              parsing them.
+            - If no such helper is running yet, the module searches by
+              itself as usual, then leaves the helper running in the
+              background, with what it has parsed, for the next runs.
+            - The helper parses the databases anew whenever they
+              change, and exits once it has been idle for
+              I(daemon_idle_timeout) seconds. It runs as the remote
+              user, whose runs alone it serves.
+            - Whenever the helper is missing, fails or runs another
+              version of this collection, the module searches by itself
+              instead.
+            - Package managers without known database files (see
+              C(repo_fingerprints)) are always searched by the module
+              itself.
+        type: bool
+        default: false
+    daemon_idle_timeout:
+        description:
+            - How many seconds the helper process started with
+              I(daemon=true) waits for another search before exiting.
+        type: float
+        default: 300
+    timings:
+        description:
+            - If true, record how long each package manager spent on
+              detection, listing, searching, parsing package details and
+              assembling the results, along with how many subprocesses
+              were run, how many bytes they output and how many package
+              records were parsed.
+            - These are returned under the C(timings) key rather than as
+              facts.
+            - Results are never cached when timings are asked for.
+            - Searches are always made by the module itself, not via
+              I(daemon), when timings are asked for.
+        type: bool
+        default: false
 seealso:
     - module: ansible.builtin.package_facts
       description: >
@@ -62,6 +283,91 @@ EXAMPLES = """
 - name: Print the search results
   ansible.builtin.debug:
     var: ansible_facts.package_search_results
+
+- name: Check whether packages named exactly "python3-yaml" or "py3-yaml" exist
+  swjmj1.package_utils.package_db_facts:
+    search_terms: ["python3-yaml", "py3-yaml"]
+    match: exact
+
+- name: Find the 5 package names most similar to "py3-yaml"
+  swjmj1.package_utils.package_db_facts:
+    search_terms: ["py3-yaml"]
+    match: fuzzy
+    limit: 5
+
+- name: Find YAML parsers by name or description
+  swjmj1.package_utils.package_db_facts:
+    search_terms: ["yaml parser"]
+    search_in: [name, description]
+    fields: [version, description]
+
+- name: Find the packages providing a mail transport agent
+  swjmj1.package_utils.package_db_facts:
+    search_terms: ["mail-transport-agent"]
+    match: provides
+
+- name: Get the first 20 packages by name whose names start with "lib"
+  swjmj1.package_utils.package_db_facts:
+    search_terms: ["lib"]
+    match: prefix
+    sort: name
+    limit: 20
+
+- name: Get the newest available version of each package named "linux*"
+  swjmj1.package_utils.package_db_facts:
+    search_terms: ["linux"]
+    match: prefix
+    latest_only: true
+
+- name: Get only the names and versions of packages matching "python3-*"
+  swjmj1.package_utils.package_db_facts:
+    search_terms: ["python3-*"]
+    match: glob
+    fields: [name, version]
+
+- name: Find out which of the matching packages are installed
+  swjmj1.package_utils.package_db_facts:
+    search_terms: ["nginx"]
+    annotate_installed: true
+
+- name: Print the names of the installed ones
+  ansible.builtin.debug:
+    msg: >-
+      {{ ansible_facts.package_search_results.nginx
+         | selectattr('installed') | map(attribute='name') }}
+
+- name: Search once for all hosts with identical repo indices
+  swjmj1.package_utils.package_db_facts:
+    search_terms: ["nginx"]
+    cache: true
+
+- name: Search for packages, returning compact results
+  swjmj1.package_utils.package_db_facts:
+    search_terms: ["lib"]
+    output_format: columnar
+
+- name: Print how many packages matched, and their names
+  ansible.builtin.debug:
+    msg: >-
+      {{ ansible_facts.package_search_results.lib.count }} matches:
+      {{ ansible_facts.package_search_results.lib.columns[0] | join(', ') }}
+
+- name: Search many times in a play, keeping the parsed databases in memory
+  swjmj1.package_utils.package_db_facts:
+    search_terms: ["{{ item }}"]
+    match: exact
+    daemon: true
+  loop: ["nginx", "postgresql", "redis"]
+
+- name: Find out where the time goes when searching
+  swjmj1.package_utils.package_db_facts:
+    search_terms: ["python"]
+    timings: true
+  register: search
+
+- name: Print the time spent per package manager
+  ansible.builtin.debug:
+    var: search.timings
 """
 
 
@@ -82,6 +388,8 @@ ansible_facts:
         - The fields described below are present for all package
           managers. Depending on the package manager, there might be
           more fields for a package.
+        - With I(output_format=columnar), each list of dicts is instead
+          a dict of parallel lists; see I(output_format).
       returned: >
         when operating system level package manager is specified or auto
         detected manager type: dict
@@ -98,6 +406,23 @@ ansible_facts:
           description: Where information on the package came from.
           returned: always
           type: str
+        description:
+          description: The package's one-line description.
+          returned: with pacman
+          type: str
+        installed:
+          description:
+            - Whether the package is installed.
+            - Null if the installed packages couldn't be listed before
+              I(timeout) or I(manager_timeout) passed, in which case the
+              search term is marked incomplete in
+              C(package_search_status).
+          returned: when I(annotate_installed=true)
+          type: bool
+        installed_version:
+          description: The package's installed version, if any.
+          returned: when I(annotate_installed=true)
+          type: str
     sample: |
       {
         "package_search_results": {
@@ -116,11 +441,79 @@ ansible_facts:
           ]
         }
       }
+    package_search_status:
+      description:
+        - A dict mapping each given search term to a dict whose
+          C(complete) is false if the term wasn't searched for in time
+          by every package manager used (see I(timeout)), in which case
+          its results are missing, or if its results couldn't all be
+          checked for being installed in time (see
+          I(annotate_installed)).
+      returned: always
+      type: dict
+      sample: |
+        {
+          "ansible": {"complete": true},
+          "python": {"complete": false}
+        }
+timed_out:
+  description:
+    - The package managers which ran out of time (see I(timeout) and
+      I(manager_timeout)); their results are missing or incomplete.
+  returned: when I(timeout) or I(manager_timeout) is set
+  type: list
+  elements: str
+  sample: ["apt"]
+repo_fingerprints:
+  description:
+    - A dict mapping each package manager used to a fingerprint of the
+      paths, sizes and modification times of its local repo indices, or
+      to null if it has no known index files.
+  returned: when I(fingerprint_only=true)
+  type: dict
+  sample: {"apk": "7b52009b64fd0a2a49e6d8a939753077792b0554"}
+cached:
+  description: Whether the results came from the cache on the controller.
+  returned: when I(cache=true) and the repo indices could be fingerprinted
+  type: bool
+timings:
+  description:
+    - A dict mapping each package manager that was tried to the time
+      spent in each phase of its work and to some counters.
+    - Time spent in a phase started inside another one is only charged
+      to the inner phase. Search terms are looked up concurrently, though,
+      and the times of all threads are summed, so the phases can add up
+      to more than the time the module took.
+  returned: when I(timings=true)
+  type: dict
+  sample: |
+    {
+      "apk": {
+        "phases": {
+          "detection": 0.000412,
+          "list_installed": 0.0,
+          "search_pkg_substr": 0.052311,
+          "get_package_details": 0.000198,
+          "assembly": 0.000087
+        },
+        "counters": {
+          "subprocess_calls": 2,
+          "bytes_read": 3817,
+          "records_parsed": 41
+        }
+      }
+    }
 """
 
 
+import re
+
 from ansible.module_utils.basic import AnsibleModule
 
+from ansible_collections.swjmj1.package_utils.plugins.module_utils.facts.columnar \
+    import to_columnar
+from ansible_collections.swjmj1.package_utils.plugins.module_utils.facts.daemon \
+    import search_via_daemon
 from ansible_collections.swjmj1.package_utils.plugins.module_utils.facts.packages \
     import PkgMgr, get_all_pkg_managers
 from ansible_collections.swjmj1.package_utils.plugins.module_utils.facts.package_facts \
@@ -134,8 +527,50 @@ def main(module, results, pkg_mgr):
     If search_terms is empty, then no new results are added.
     """
 
-    search_results = pkg_mgr.search_packages(*module.params["search_terms"])
-    results["ansible_facts"]["package_search_results"].update(search_results)
+    if module.params["fingerprint_only"]:
+        results.setdefault("repo_fingerprints", {})[
+            pkg_mgr.__class__.__name__.lower()
+        ] = pkg_mgr.repo_fingerprint()
+        return
+
+    sort = module.params["sort"]
+    search_options = dict(
+        match=module.params["match"],
+        sort=None if sort == "none" else sort,
+        offset=module.params["offset"],
+        limit=module.params["limit"],
+        fields=module.params["fields"],
+        latest_only=module.params["latest_only"],
+        min_similarity=module.params["min_similarity"],
+        search_in=module.params["search_in"],
+        annotate_installed=module.params["annotate_installed"]
+    )
+    if module.params["daemon"] and not module.params["timings"]:
+        search_results = search_via_daemon(
+            pkg_mgr, module.params["search_terms"], search_options,
+            idle_timeout=module.params["daemon_idle_timeout"],
+        )
+    else:
+        search_results = pkg_mgr.search_packages(
+            *module.params["search_terms"], **search_options
+        )
+    columnar = module.params["output_format"] == "columnar"
+    fields = module.params["fields"]
+    if columnar:
+        if fields is not None and module.params["annotate_installed"]:
+            fields = fields + ["installed", "installed_version"]
+        search_results = dict(
+            (term, to_columnar(result_list, fields))
+            for term, result_list in search_results.items()
+        )
+    facts = results["ansible_facts"]
+    facts["package_search_results"].update(search_results)
+    for term in module.params["search_terms"]:
+        facts["package_search_results"].setdefault(
+            term, to_columnar([], fields) if columnar else []
+        )
+        if term in pkg_mgr.incomplete_terms:
+            facts["package_search_status"][term]["complete"] = False
 
 
 if __name__ == "__main__":
@@ -151,15 +586,102 @@ if __name__ == "__main__":
                 'choices': ['first', 'all'],
                 'default': 'first',
             },
+            "timeout": {
+                'type': 'float',
+            },
+            "manager_timeout": {
+                'type': 'float',
+            },
             "search_terms": {
                 'type': 'list',
                 'elements': 'str',
                 'required': True,
             },
+            "match": {
+                'choices': ['substring', 'exact', 'prefix', 'glob', 'regex', 'fuzzy', 'provides'],
+                'default': 'substring',
+            },
+            "search_in": {
+                'type': 'list',
+                'elements': 'str',
+                'choices': ['name', 'description'],
+                'default': ['name'],
+            },
+            "min_similarity": {
+                'type': 'float',
+                'default': 0.5,
+            },
+            "limit": {
+                'type': 'int',
+            },
+            "offset": {
+                'type': 'int',
+                'default': 0,
+            },
+            "sort": {
+                'choices': ['none', 'name', 'version'],
+                'default': 'none',
+            },
+            "latest_only": {
+                'type': 'bool',
+                'default': False,
+            },
+            "fields": {
+                'type': 'list',
+                'elements': 'str',
+            },
+            "annotate_installed": {
+                'type': 'bool',
+                'default': False,
+            },
+            "output_format": {
+                'choices': ['list', 'columnar'],
+                'default': 'list',
+            },
+            "cache": {
+                'type': 'bool',
+                'default': False,
+            },
+            "fingerprint_only": {
+                'type': 'bool',
+                'default': False,
+            },
+            "daemon": {
+                'type': 'bool',
+                'default': False,
+            },
+            "daemon_idle_timeout": {
+                'type': 'float',
+                'default': 300,
+            },
+            "timings": {
+                'type': 'bool',
+                'default': False,
+            },
         },
         supports_check_mode=True
     )
+    for option in ("limit", "offset", "timeout", "manager_timeout"):
+        if (module.params[option] or 0) < 0:
+            module.fail_json(msg='Option "%s" must not be negative' % option)
+    if not 0 <= module.params["min_similarity"] <= 1:
+        module.fail_json(msg='Option "min_similarity" must be from 0 to 1')
+    if not module.params["search_in"]:
+        module.fail_json(msg='Option "search_in" must not be empty')
+    if module.params["match"] == "provides" and "description" in module.params["search_in"]:
+        module.fail_json(msg='Option "search_in" must not include "description" with "match: provides"')
+    if module.params["match"] == "regex":
+        for term in module.params["search_terms"]:
+            try:
+                re.compile(term)
+            except re.error as e:
+                module.fail_json(msg='Invalid regex "%s": %s' % (term, e))
     results = {
-        "ansible_facts": {"package_search_results": {}}
+        "ansible_facts": {
+            "package_search_results": {},
+            "package_search_status": dict(
+                (term, {"complete": True}) for term in module.params["search_terms"]
+            ),
+        }
     }
     main(module, results)
@@ -0,0 +1,272 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# SPDX-FileCopyrightText: 2023 swjmj1 <swjmj1@tuta.io>
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+
+DOCUMENTATION = """
+module: package_delta_facts
+short_description: Facts about changes to installed packages since a baseline
+description:
+    - Return which packages were added, removed or changed (e.g.
+      upgraded) on the system since a given baseline, rather than every
+      installed package.
+    - Every run stores a compact snapshot of the installed packages on
+      the target, identified by a fingerprint of its contents, and
+      returns the fingerprint as a fact. Pass the fingerprints from an
+      earlier run as I(baseline) to get only the changes since then.
+    - Along with each snapshot, a cheap fingerprint of the package
+      database's files is stored. While the package database is
+      unchanged, the installed packages aren't listed at all, and if
+      they match the baseline, nothing is compared either.
+    - If there's no snapshot for a baseline fingerprint (e.g. on the
+      first run), every installed package is returned as added.
+author: swjmj1 @swjmj1
+options:
+    baseline:
+        description:
+            - A dict mapping package managers to the fingerprints of the
+              snapshots to compare against, i.e. the
+              C(installed_packages_fingerprints) fact returned by an
+              earlier run.
+            - Package managers missing from the dict are compared against
+              nothing, so all of their packages are returned as added.
+        type: dict
+        default: {}
+    snapshot_dir:
+        description:
+            - The directory on the target in which to keep snapshots.
+        type: path
+        default: ~/.cache/ansible/swjmj1.package_utils/snapshots
+    keep_snapshots:
+        description:
+            - How many of the most recent snapshots to keep per package
+              manager; older ones are deleted, and can no longer be used
+              as baselines.
+        type: int
+        default: 10
+notes:
+    - In check mode, no snapshots are stored.
+seealso:
+    - module: ansible.builtin.package_facts
+      description: Facts about all installed packages.
+extends_documentation_fragment:
+    - action_common_attributes
+    - action_common_attributes.facts
+    - swjmj1.package_utils.facts_common
+"""
+
+
+EXAMPLES = """
+- name: Get the fingerprints of the installed packages
+  swjmj1.package_utils.package_delta_facts:
+
+- name: Remember them as the baseline
+  ansible.builtin.set_fact:
+    package_baseline: "{{ ansible_facts.installed_packages_fingerprints }}"
+    cacheable: true
+
+# ...later on...
+
+- name: Get the changes to installed packages since the baseline
+  swjmj1.package_utils.package_delta_facts:
+    baseline: "{{ package_baseline }}"
+
+- name: Print the names of any upgraded packages
+  ansible.builtin.debug:
+    msg: "{{ ansible_facts.installed_packages_delta.apk.changed | list }}"
+  when: ansible_facts.installed_packages_delta.apk is defined
+"""
+
+
+RETURN = """
+ansible_facts:
+  description: Facts to add to ansible_facts.
+  returned: always
+  type: complex
+  contains:
+    installed_packages_fingerprints:
+      description:
+        - A dict mapping each package manager to the fingerprint of the
+          snapshot of its installed packages, for use as I(baseline)
+          later on.
+      returned: always
+      type: dict
+      sample: {"apk": "0f6e3c86d5b3ba8a7c3b1fb5cb0e8a8e1b5a2a4d"}
+    installed_packages_delta:
+      description:
+        - A dict mapping each package manager to the changes to its
+          installed packages since the baseline.
+        - In C(added) and C(removed), each package name maps to a list
+          of installed versions, each a dict of package details as with
+          M(ansible.builtin.package_facts).
+        - In C(changed), each package name maps to a dict with the
+          C(old) and C(new) lists of installed versions.
+      returned: always
+      type: dict
+      contains:
+        baseline_found:
+          description:
+            - Whether the baseline snapshot was found. If not, every
+              installed package is returned as added.
+          type: bool
+        added:
+          description: Packages installed since the baseline.
+          type: dict
+        removed:
+          description: Packages removed since the baseline.
+          type: dict
+        changed:
+          description: Packages with different versions installed.
+          type: dict
+      sample: |
+        {
+          "apk": {
+            "baseline_found": true,
+            "added": {},
+            "removed": {},
+            "changed": {
+              "curl": {
+                "old": [{"name": "curl", "version": "8.1.1", "release": "r0", "source": "apk"}],
+                "new": [{"name": "curl", "version": "8.1.2", "release": "r0", "source": "apk"}]
+              }
+            }
+          }
+        }
+timed_out:
+  description:
+    - The package managers which ran out of time (see I(timeout) and
+      I(manager_timeout)); their results are missing or incomplete.
+  returned: when I(timeout) or I(manager_timeout) is set
+  type: list
+  elements: str
+  sample: ["apt"]
+"""
+
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.six import string_types
+
+from ansible_collections.swjmj1.package_utils.plugins.module_utils.facts.packages \
+    import get_all_pkg_managers
+from ansible_collections.swjmj1.package_utils.plugins.module_utils.facts.package_facts \
+    import for_each_pkg_mgr
+from ansible_collections.swjmj1.package_utils.plugins.module_utils.facts.snapshot \
+    import SNAPSHOT_FIELDS, SnapshotStore, diff_snapshots, expand_entries, make_snapshot, \
+    snapshot_fingerprint
+
+
+@for_each_pkg_mgr
+def main(module, results, pkg_mgr):
+    """Snapshot the given package manager's installed packages, then
+    compare the snapshot against the baseline, if any.
+    """
+
+    manager = pkg_mgr.__class__.__name__.lower()
+    facts = results["ansible_facts"]
+    store = SnapshotStore(module.params["snapshot_dir"])
+    baseline = module.params["baseline"].get(manager)
+
+    # Skip listing the installed packages if the package database hasn't
+    # changed since the latest snapshot.
+    snapshot = None
+    fingerprint = None
+    db_fingerprint = pkg_mgr.db_fingerprint()
+    latest = store.latest(manager)
+    if db_fingerprint is not None and latest \
+            and latest.get("db_fingerprint") == db_fingerprint:
+        fingerprint = latest.get("fingerprint")
+        if fingerprint != baseline:
+            snapshot = store.load(manager, fingerprint)
+            if snapshot is None:
+                fingerprint = None  # deleted, so take another
+
+    # Load the baseline before pruning can delete it.
+    old_snapshot = None
+    if baseline and baseline != fingerprint:
+        old_snapshot = store.load(manager, baseline)
+
+    if fingerprint is None:
+        snapshot = make_snapshot(pkg_mgr.get_packages(fields=SNAPSHOT_FIELDS))
+        if module.check_mode:
+            fingerprint = snapshot_fingerprint(snapshot)
+        else:
+            fingerprint = store.save(manager, snapshot, db_fingerprint)
+            store.prune(manager, module.params["keep_snapshots"])
+
+    facts["installed_packages_fingerprints"][manager] = fingerprint
+    delta = {"baseline_found": True, "added": {}, "removed": {}, "changed": {}}
+    facts["installed_packages_delta"][manager] = delta
+    if fingerprint == baseline:
+        return
+
+    if old_snapshot is None:
+        delta["baseline_found"] = False
+        old_snapshot = {}
+
+    added, removed, changed = diff_snapshots(old_snapshot, snapshot)
+    for name in added:
+        delta["added"][name] = expand_entries(name, snapshot[name], manager)
+    for name in removed:
+        delta["removed"][name] = expand_entries(name, old_snapshot[name], manager)
+    for name in changed:
+        delta["changed"][name] = {
+            "old": expand_entries(name, old_snapshot[name], manager),
+            "new": expand_entries(name, snapshot[name], manager),
+        }
+
+
+if __name__ == "__main__":
+    module = AnsibleModule(
+        argument_spec={
+            "manager": {
+                'type': 'list',
+                'elements': 'str',
+                'choices': ['auto'] + list(get_all_pkg_managers().keys()),
+                'default': ['auto'],
+            },
+            "strategy": {
+                'choices': ['first', 'all'],
+                'default': 'first',
+            },
+            "timeout": {
+                'type': 'float',
+            },
+            "manager_timeout": {
+                'type': 'float',
+            },
+            "baseline": {
+                'type': 'dict',
+                'default': {},
+            },
+            "snapshot_dir": {
+                'type': 'path',
+                'default': '~/.cache/ansible/swjmj1.package_utils/snapshots',
+            },
+            "keep_snapshots": {
+                'type': 'int',
+                'default': 10,
+            },
+        },
+        supports_check_mode=True
+    )
+    for manager, fingerprint in module.params["baseline"].items():
+        if fingerprint is not None and not isinstance(fingerprint, string_types):
+            module.fail_json(
+                msg='Option "baseline" must map package managers to fingerprints (strings),'
+                    ' but "%s" maps to a %s' % (manager, type(fingerprint).__name__)
+            )
+    results = {
+        "ansible_facts": {
+            "installed_packages_fingerprints": {},
+            "installed_packages_delta": {},
+        }
+    }
+    main(module, results)
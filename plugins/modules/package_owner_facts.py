@@ -0,0 +1,192 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# SPDX-FileCopyrightText: 2023 swjmj1 <swjmj1@tuta.io>
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+
+DOCUMENTATION = """
+module: package_owner_facts
+short_description: Facts about which installed packages own given paths
+description:
+    - Given a list of paths, return the installed packages owning each,
+      like C(pacman -Qo), C(dpkg -S), C(apk info --who-owns) or
+      C(rpm -qf) would, but for all the paths in one go.
+    - Except with rpm, whose database looks up paths by itself, the
+      package manager's lists of installed files are read once, into a
+      sorted index of paths, in which each given path is then looked
+      up. So thousands of paths take hardly longer than one.
+    - A path that isn't found as given is looked up again with any
+      symlinks resolved, e.g. C(/bin/sh) on systems where C(/bin) links
+      to C(/usr/bin).
+    - Currently, apk, APT, pacman and rpm are supported.
+author: swjmj1 @swjmj1
+options:
+    paths:
+        description:
+            - The absolute paths of the files or directories to look up.
+        required: true
+        type: list
+        elements: path
+    daemon:
+        description:
+            - If true, look the paths up via the helper process on the
+              target which keeps each package manager's index of paths
+              in memory between runs, so that only the first run in a
+              while pays for reading the lists of installed files.
+            - This is the same helper that
+              M(swjmj1.package_utils.package_db_facts) searches via with
+              I(daemon=true); see there for how it is started, kept up
+              to date and stopped.
+            - Package managers without known database files, like rpm,
+              are always looked up by the module itself.
+        type: bool
+        default: false
+    daemon_idle_timeout:
+        description:
+            - How many seconds the helper process started with
+              I(daemon=true) waits for another query before exiting.
+        type: float
+        default: 300
+seealso:
+    - module: swjmj1.package_utils.package_db_facts
+      description: Search for packages in the local package database.
+extends_documentation_fragment:
+    - action_common_attributes
+    - action_common_attributes.facts
+    - swjmj1.package_utils.facts_common
+"""
+
+
+EXAMPLES = """
+- name: Find out which packages own some files
+  swjmj1.package_utils.package_owner_facts:
+    paths:
+      - /usr/bin/python3
+      - /etc/ssl/openssl.cnf
+      - /usr/local/bin/some-script
+
+- name: Look up owners repeatedly, keeping the index of paths warm
+  swjmj1.package_utils.package_owner_facts:
+    paths: ["{{ item }}"]
+    daemon: true
+  loop: ["/usr/bin/python3", "/usr/bin/perl", "/usr/bin/ruby"]
+
+- name: Print the owners of python3
+  ansible.builtin.debug:
+    msg: >-
+      {{ ansible_facts.package_owners['/usr/bin/python3']
+         | map(attribute='name') | join(', ') }}
+"""
+
+
+RETURN = """
+ansible_facts:
+  description: Facts to add to ansible_facts.
+  returned: always
+  type: complex
+  contains:
+    package_owners:
+      description:
+        - A dict mapping each given path to a list of the installed
+          packages owning it, each a dict with the package's C(name)
+          and the package manager it came from (C(source)).
+        - The list is empty if no installed package owns the path (or
+          it doesn't exist).
+        - A directory may be owned by several packages.
+      returned: always
+      type: dict
+      sample: |
+        {
+          "/usr/bin/python3": [{"name": "python3", "source": "apk"}],
+          "/usr/local/bin/some-script": []
+        }
+timed_out:
+  description:
+    - The package managers which ran out of time (see I(timeout) and
+      I(manager_timeout)); their results are missing or incomplete.
+  returned: when I(timeout) or I(manager_timeout) is set
+  type: list
+  elements: str
+  sample: ["apt"]
+"""
+
+
+from ansible.module_utils.basic import AnsibleModule
+
+from ansible_collections.swjmj1.package_utils.plugins.module_utils.facts.daemon \
+    import owners_via_daemon
+from ansible_collections.swjmj1.package_utils.plugins.module_utils.facts.packages \
+    import get_all_pkg_managers
+from ansible_collections.swjmj1.package_utils.plugins.module_utils.facts.package_facts \
+    import for_each_pkg_mgr
+
+
+@for_each_pkg_mgr
+def main(module, results, pkg_mgr):
+    """Look up the owners of the given paths with the given package
+    manager, adding them to those found by any others.
+    """
+
+    source = pkg_mgr.__class__.__name__.lower()
+    package_owners = results["ansible_facts"]["package_owners"]
+    if module.params["daemon"]:
+        owners = owners_via_daemon(
+            pkg_mgr, module.params["paths"],
+            idle_timeout=module.params["daemon_idle_timeout"],
+        )
+    else:
+        owners = pkg_mgr.find_owners(module.params["paths"])
+    for path, names in owners.items():
+        package_owners.setdefault(path, []).extend(
+            {"name": name, "source": source} for name in names
+        )
+
+
+if __name__ == "__main__":
+    module = AnsibleModule(
+        argument_spec={
+            "manager": {
+                'type': 'list',
+                'elements': 'str',
+                'choices': ['auto'] + list(get_all_pkg_managers().keys()),
+                'default': ['auto'],
+            },
+            "strategy": {
+                'choices': ['first', 'all'],
+                'default': 'first',
+            },
+            "timeout": {
+                'type': 'float',
+            },
+            "manager_timeout": {
+                'type': 'float',
+            },
+            "paths": {
+                'type': 'list',
+                'elements': 'path',
+                'required': True,
+            },
+            "daemon": {
+                'type': 'bool',
+                'default': False,
+            },
+            "daemon_idle_timeout": {
+                'type': 'float',
+                'default': 300,
+            },
+        },
+        supports_check_mode=True
+    )
+    results = {
+        "ansible_facts": {
+            "package_owners": dict((path, []) for path in module.params["paths"]),
+        }
+    }
+    main(module, results)
@@ -0,0 +1,105 @@
+# SPDX-FileCopyrightText: 2023 swjmj1 <swjmj1@tuta.io>
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import hashlib
+import json
+import os
+import tempfile
+
+from ansible.module_utils.common.text.converters import to_bytes, to_text
+
+
+def cache_key(*parts):
+    """Return a hex digest identifying the given JSON-serializable parts."""
+
+    return hashlib.sha1(to_bytes(
+        json.dumps(parts, sort_keys=True, separators=(',', ':'))
+    )).hexdigest()
+
+
+class ResultCache(object):
+    """A size-bounded cache of module results on the controller.
+
+    Each entry is a JSON file in one directory, so that the cache is
+    shared by all worker processes (i.e. by all hosts). Entries are
+    evicted least recently used first -- reading an entry bumps its
+    modification time -- once there are more than "max_entries" of them
+    or they take up more than "max_bytes" in total.
+    """
+
+    def __init__(self, directory, max_entries=256, max_bytes=64 * 1024 * 1024):
+        self.directory = os.path.expanduser(directory)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + '.json')
+
+    def get(self, key):
+        """Return the value stored under "key", or None."""
+
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                value = json.loads(to_text(f.read()))
+            os.utime(path, None)
+        except (IOError, OSError, ValueError):
+            return None
+        return value
+
+    def put(self, key, value):
+        """Store "value" under "key", then evict entries as needed.
+
+        Caching is best-effort: return False, storing nothing, if the
+        entry can't be written (e.g. the directory is unwritable or the
+        disk is full), else True.
+        """
+
+        try:
+            try:
+                os.makedirs(self.directory, 0o700)
+            except OSError:
+                # fine if it exists already (e.g. made by another worker)
+                if not os.path.isdir(self.directory):
+                    raise
+
+            # Write atomically, since other workers may read it at any time.
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix='.tmp')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(to_bytes(json.dumps(value, separators=(',', ':'))))
+                os.rename(tmp_path, self._path(key))
+            except Exception:
+                os.unlink(tmp_path)
+                raise
+            self.evict()
+        except (IOError, OSError):
+            return False
+        return True
+
+    def evict(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith('.json'):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                st = os.stat(path)
+            except OSError:     # evicted by another worker
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+
+        # newest first
+        entries.sort(reverse=True)
+        total_bytes = 0
+        for i, (mtime, size, path) in enumerate(entries):
+            total_bytes += size
+            if i >= self.max_entries or total_bytes > self.max_bytes:
+                try:
+                    os.unlink(path)
+                except OSError:
+                    pass
@@ -0,0 +1,38 @@
+# SPDX-FileCopyrightText: 2023 swjmj1 <swjmj1@tuta.io>
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import pytest
+
+from ansible.errors import AnsibleFilterError
+
+from ansible_collections.swjmj1.package_utils.plugins.filter.from_columnar import from_columnar
+
+
+TABLE = {
+    "fields": ["name", "version"],
+    "columns": [["curl", "curl-dev"], ["8.1.2-r0", "8.1.2-r0"]],
+    "count": 2,
+}
+EXPANDED = [
+    {"name": "curl", "version": "8.1.2-r0"},
+    {"name": "curl-dev", "version": "8.1.2-r0"},
+]
+
+
+class TestFromColumnar():
+    def test_table(self):
+        assert from_columnar(TABLE) == EXPANDED
+
+    def test_dict_of_tables(self):
+        assert from_columnar({"curl": TABLE, "nothing": {"fields": ["name"], "columns": [[]]}}) == {
+            "curl": EXPANDED,
+            "nothing": [],
+        }
+
+    def test_malformed(self):
+        with pytest.raises(AnsibleFilterError):
+            from_columnar({"curl": {"fields": ["name"]}})
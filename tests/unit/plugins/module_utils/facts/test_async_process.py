@@ -0,0 +1,73 @@
+# SPDX-FileCopyrightText: 2023 swjmj1 <swjmj1@tuta.io>
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import os
+import sys
+import time
+
+import pytest
+
+from ansible_collections.swjmj1.package_utils.plugins.module_utils.facts.deadline import DeadlineExceeded
+from ansible_collections.swjmj1.package_utils.plugins.module_utils.facts.packages import HAS_ASYNC_PROCESS
+
+if HAS_ASYNC_PROCESS:
+    from ansible_collections.swjmj1.package_utils.plugins.module_utils.facts.async_process import run_commands
+
+
+pytestmark = pytest.mark.skipif(not HAS_ASYNC_PROCESS, reason="needs Python 3.8 or later")
+
+
+def python_command(code):
+    return [sys.executable, "-c", code]
+
+
+class TestRunCommands():
+    def test_results_in_order(self):
+        """Return results in the order given, not in order of finishing."""
+
+        results = run_commands([
+            python_command("import time; time.sleep(0.2); print('slow')"),
+            python_command("print('fast')"),
+        ], limit=2)
+        assert results == [(0, "slow\n", ""), (0, "fast\n", "")]
+
+    def test_rc_and_stderr(self):
+        """Leave checking rc and stderr to the caller."""
+
+        results = run_commands([
+            python_command("import sys; sys.stderr.write('oops'); sys.exit(3)"),
+        ])
+        assert results == [(3, "", "oops")]
+
+    def test_env(self):
+        results = run_commands(
+            [python_command("import os; print(os.environ['LC_ALL'])")],
+            env=dict(os.environ, LC_ALL="C"),
+        )
+        assert results == [(0, "C\n", "")]
+
+    def test_timeout_kills(self, tmp_path):
+        """Kill commands still running when the timeout passes."""
+
+        marker = tmp_path / "finished"
+        with pytest.raises(DeadlineExceeded):
+            run_commands([
+                python_command("import time; time.sleep(1); open(%r, 'w')" % str(marker)),
+            ], timeout=0.1)
+        time.sleep(1.5)
+        assert not marker.exists()
+
+    def test_timeout_kills_process_group(self, tmp_path):
+        """Kill whatever the commands started, too."""
+
+        marker = tmp_path / "finished"
+        with pytest.raises(DeadlineExceeded):
+            run_commands([
+                ["/bin/sh", "-c", "(sleep 1; touch '%s') & wait" % marker],
+            ], timeout=0.1)
+        time.sleep(1.5)
+        assert not marker.exists()
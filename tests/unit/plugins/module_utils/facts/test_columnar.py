@@ -0,0 +1,49 @@
+# SPDX-FileCopyrightText: 2023 swjmj1 <swjmj1@tuta.io>
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import pytest
+
+from ansible_collections.swjmj1.package_utils.plugins.module_utils.facts.columnar import from_columnar, to_columnar
+
+
+PACKAGES = [
+    {"name": "python3", "version": "3.11.4-r0", "source": "apk"},
+    {"name": "python3-dev", "version": "3.11.4-r0", "source": "apk"},
+]
+
+
+class TestColumnar():
+    def test_to_columnar(self):
+        assert to_columnar(PACKAGES) == {
+            "fields": ["name", "source", "version"],
+            "columns": [
+                ["python3", "python3-dev"],
+                ["apk", "apk"],
+                ["3.11.4-r0", "3.11.4-r0"],
+            ],
+            "count": 2,
+        }
+
+    def test_round_trip(self):
+        assert from_columnar(to_columnar(PACKAGES)) == PACKAGES
+
+    def test_given_fields(self):
+        table = to_columnar(PACKAGES, ["version"])
+        assert table["fields"] == ["name", "version"]
+        assert from_columnar(table) == [
+            {"name": "python3", "version": "3.11.4-r0"},
+            {"name": "python3-dev", "version": "3.11.4-r0"},
+        ]
+
+    def test_empty(self):
+        assert from_columnar(to_columnar([])) == []
+
+    def test_malformed(self):
+        with pytest.raises(ValueError):
+            from_columnar({"fields": ["name"]})
+        with pytest.raises(ValueError):
+            from_columnar({"fields": ["name", "version"], "columns": [["a"], []]})
@@ -0,0 +1,252 @@
+# SPDX-FileCopyrightText: 2023 swjmj1 <swjmj1@tuta.io>
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import socket
+import threading
+
+import pytest
+
+from ansible_collections.swjmj1.package_utils.plugins.module_utils.facts import daemon
+from ansible_collections.swjmj1.package_utils.plugins.module_utils.facts.daemon import \
+    PROTOCOL_VERSION, DaemonError, DaemonModule, QueryServer, db_fingerprint, owners_via_daemon, query, \
+    search_via_daemon
+from ansible_collections.swjmj1.package_utils.plugins.module_utils.facts.deadline import \
+    Deadline, DeadlineExceeded
+from ansible_collections.swjmj1.package_utils.plugins.module_utils.facts.packages import PkgMgr
+
+
+class DaemonPkgMgrExample(PkgMgr):
+    """Mock a package manager with a pretend database file."""
+
+    DB_PATHS = ()
+    instances = 0
+    owned_files_listed = 0
+
+    def __init__(self, module=None):
+        super(DaemonPkgMgrExample, self).__init__(module)
+        DaemonPkgMgrExample.instances += 1
+
+    def is_available(self):
+        return True
+
+    def list_installed(self):
+        return ["pkg1-1"]
+
+    def list_available(self):
+        return ["pkg1-1", "pkg1-2", "pkg2-1"]
+
+    def get_package_details(self, package):
+        return {"name": package, "version": "1.0"}
+
+    def search_pkg_substr(self, substr):
+        return [pkg for pkg in self.list_available() if substr in pkg]
+
+    def list_owned_files(self):
+        self._check_deadline()
+        DaemonPkgMgrExample.owned_files_listed += 1
+        return [("/usr/bin/pkg1", "pkg1")]
+
+
+@pytest.fixture
+def db_path(tmp_path, monkeypatch):
+    db_path = tmp_path / "db"
+    db_path.write_text(u"1")
+    monkeypatch.setattr(DaemonPkgMgrExample, "DB_PATHS", (str(db_path),))
+    monkeypatch.setattr(DaemonPkgMgrExample, "instances", 0)
+    monkeypatch.setattr(DaemonPkgMgrExample, "owned_files_listed", 0)
+    return db_path
+
+
+class TaskModule(object):
+    """Stand in for the module of the run that starts the daemon."""
+
+    params = {"paths": ["/tmp/ansible-tmp-gone"]}
+    run_command_environ_update = {"LANGUAGE": "C"}
+
+
+def search_request(*terms, **options):
+    return {
+        "protocol": PROTOCOL_VERSION, "op": "search", "manager": "daemonpkgmgrexample",
+        "terms": list(terms), "options": options,
+    }
+
+
+class TestQueryServer():
+    def test_search(self, db_path):
+        response = QueryServer(None).handle(search_request("pkg1", match="prefix"))
+        assert response == {
+            "results": DaemonPkgMgrExample().search_packages("pkg1", match="prefix"),
+            "incomplete": [],
+        }
+
+    def test_owners(self, db_path):
+        request = {
+            "protocol": PROTOCOL_VERSION, "op": "owners", "manager": "daemonpkgmgrexample",
+            "paths": ["/usr/bin/pkg1", "/usr/bin/pkg2"],
+        }
+        server = QueryServer(None)
+        response = server.handle(request)
+        assert response == {"results": {"/usr/bin/pkg1": ["pkg1"], "/usr/bin/pkg2": []}}
+
+        # The index of paths is kept too.
+        assert server.handle(request) == response
+        assert DaemonPkgMgrExample.owned_files_listed == 1
+
+    def test_keeps_package_manager_until_db_changes(self, db_path):
+        server = QueryServer(None)
+        server.handle(search_request("pkg1"))
+        server.handle(search_request("pkg2"))
+        assert DaemonPkgMgrExample.instances == 1
+
+        db_path.write_text(u"12")
+        server.handle(search_request("pkg1"))
+        assert DaemonPkgMgrExample.instances == 2
+
+    def test_keeps_added_package_manager(self, db_path):
+        pkg_mgr = DaemonPkgMgrExample()
+        server = QueryServer(None)
+        server.add("daemonpkgmgrexample", pkg_mgr, db_fingerprint(pkg_mgr))
+        server.handle(search_request("pkg1"))
+        assert DaemonPkgMgrExample.instances == 1
+
+    @pytest.mark.parametrize("request_update", [
+        {"protocol": PROTOCOL_VERSION - 1},
+        {"manager": "nonexistent"},
+        {"op": "nonsense"},
+        {"options": {"match": "nonsense"}},
+    ])
+    def test_errors(self, db_path, request_update):
+        request = dict(search_request("pkg1"), **request_update)
+        assert "error" in QueryServer(None).handle(request)
+
+    def test_no_known_db(self):
+        assert "error" in QueryServer(None).handle(search_request("pkg1"))
+
+
+def test_query(db_path, tmp_path):
+    path = str(tmp_path / "daemon.sock")
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(path)
+    listener.listen(1)
+    thread = threading.Thread(target=QueryServer(None, idle_timeout=0.5).serve, args=(listener,))
+    thread.start()
+    try:
+        response = query(path, search_request("pkg2"), timeout=5)
+    finally:
+        thread.join()
+        listener.close()
+    assert response == {
+        "results": {"pkg2": [{"name": "pkg2-1", "version": "1.0", "source": "daemonpkgmgrexample"}]},
+        "incomplete": [],
+    }
+
+    with pytest.raises(DaemonError):
+        query(path, search_request("pkg2"))
+
+
+def test_serve_switches_modules(db_path, tmp_path):
+    pkg_mgr = DaemonPkgMgrExample(TaskModule())
+    module = DaemonModule()
+    server = QueryServer(module, idle_timeout=0.01)
+    server.add("daemonpkgmgrexample", pkg_mgr, db_fingerprint(pkg_mgr))
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(str(tmp_path / "daemon.sock"))
+    listener.listen(1)
+    try:
+        server.serve(listener)
+    finally:
+        listener.close()
+    assert pkg_mgr.module is module
+
+
+class TestDaemonModule():
+    def test_run_command(self, monkeypatch, tmp_path):
+        monkeypatch.chdir(tmp_path)
+        monkeypatch.setenv("PYTHONPATH", "/tmp/x/ansible_modlib.zip")
+        module = DaemonModule({"FOO": "foo"})
+        rc, out, err = module.run_command(
+            ["/bin/sh", "-c", 'pwd; echo "$FOO $BAR ${PYTHONPATH-unset}"'],
+            environ_update={"BAR": "bar"},
+        )
+        assert (rc, out, err) == (0, u"/\nfoo bar unset\n", u"")
+
+    def test_run_command_shell(self):
+        rc, out, err = DaemonModule().run_command("echo a | tr a b; exit 3", use_unsafe_shell=True)
+        assert (rc, out) == (3, u"b\n")
+
+    def test_run_command_missing(self):
+        rc, out, err = DaemonModule().run_command(["/nonexistent/command"])
+        assert rc != 0 and err
+
+    def test_get_bin_path(self):
+        assert DaemonModule().get_bin_path("sh")
+        assert DaemonModule().get_bin_path("nonexistent-command") is None
+        with pytest.raises(ValueError):
+            DaemonModule().get_bin_path("nonexistent-command", required=True)
+
+
+def test_search_via_daemon_falls_back(db_path, tmp_path, monkeypatch):
+    """Search in-process without a daemon, then start one."""
+
+    started = []
+    monkeypatch.setattr(daemon, "socket_path", lambda: str(tmp_path / "daemon.sock"))
+    monkeypatch.setattr(daemon, "start_daemon", lambda server, path: started.append(server))
+
+    task_module = TaskModule()
+    pkg_mgr = DaemonPkgMgrExample(task_module)
+    results = search_via_daemon(pkg_mgr, ["pkg1"], {"match": "prefix"})
+    assert results == pkg_mgr.search_packages("pkg1", match="prefix")
+    assert len(started) == 1
+
+    # It gets a module of its own rather than the run's.
+    assert isinstance(started[0].module, DaemonModule)
+    assert started[0].module.run_command_environ_update == {"LANGUAGE": "C"}
+    assert pkg_mgr.module is task_module
+
+    # The new daemon keeps the package manager it was handed.
+    started[0].handle(search_request("pkg1"))
+    assert DaemonPkgMgrExample.instances == 1
+
+
+def test_owners_via_daemon_falls_back(db_path, tmp_path, monkeypatch):
+    started = []
+    monkeypatch.setattr(daemon, "socket_path", lambda: str(tmp_path / "daemon.sock"))
+    monkeypatch.setattr(daemon, "start_daemon", lambda server, path: started.append(server))
+
+    pkg_mgr = DaemonPkgMgrExample(TaskModule())
+    assert owners_via_daemon(pkg_mgr, ["/usr/bin/pkg1"]) == {"/usr/bin/pkg1": ["pkg1"]}
+    assert len(started) == 1
+
+    # The new daemon keeps the index of paths it was handed.
+    request = {
+        "protocol": PROTOCOL_VERSION, "op": "owners", "manager": "daemonpkgmgrexample",
+        "paths": ["/usr/bin/pkg1"],
+    }
+    assert started[0].handle(request) == {"results": {"/usr/bin/pkg1": ["pkg1"]}}
+    assert DaemonPkgMgrExample.owned_files_listed == 1
+
+
+def test_owners_timed_out(db_path, tmp_path, monkeypatch):
+    """A daemon running out of time is no reason to look up in-process."""
+
+    monkeypatch.setattr(daemon, "socket_path", lambda: str(tmp_path / "daemon.sock"))
+
+    def timed_out(path, request, timeout=None):
+        response = QueryServer(None).handle(dict(request, protocol=PROTOCOL_VERSION, timeout=0))
+        assert response["timed_out"]
+        raise DeadlineExceeded(response["error"])
+
+    monkeypatch.setattr(daemon, "query", timed_out)
+    pkg_mgr = DaemonPkgMgrExample()
+    pkg_mgr.deadline = Deadline(10)
+    with pytest.raises(DeadlineExceeded):
+        owners_via_daemon(pkg_mgr, ["/usr/bin/pkg1"])
+    assert DaemonPkgMgrExample.owned_files_listed == 0
+
+
+def test_code_fingerprint_is_stable():
+    assert daemon.code_fingerprint() == daemon.code_fingerprint()
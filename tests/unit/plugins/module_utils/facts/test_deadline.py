@@ -0,0 +1,48 @@
+# SPDX-FileCopyrightText: 2023 swjmj1 <swjmj1@tuta.io>
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import time
+
+import pytest
+
+from ansible_collections.swjmj1.package_utils.plugins.module_utils.facts.deadline import \
+    Deadline, DeadlineExceeded
+
+
+def test_unlimited():
+    deadline = Deadline()
+    assert deadline.remaining() is None
+    assert not deadline.expired()
+    deadline.check()
+
+
+def test_expired():
+    deadline = Deadline(0)
+    assert deadline.remaining() == 0
+    with pytest.raises(DeadlineExceeded):
+        deadline.check()
+
+
+@pytest.mark.parametrize("timeout, parent_timeout", [(60, 1), (1, 60), (None, 1)])
+def test_parent_passes_first_or_last(timeout, parent_timeout):
+    deadline = Deadline(timeout, parent=Deadline(parent_timeout))
+    assert 0 < deadline.remaining() <= 1
+
+
+class TestCall():
+    def test_returns(self):
+        assert Deadline(60).call(sorted, [2, 1], reverse=True) == [2, 1]
+
+    def test_reraises(self):
+        with pytest.raises(KeyError):
+            Deadline(60).call({}.__getitem__, "missing")
+
+    def test_times_out(self):
+        start = time.time()
+        with pytest.raises(DeadlineExceeded):
+            Deadline(0.1).call(time.sleep, 5)
+        assert time.time() - start < 1
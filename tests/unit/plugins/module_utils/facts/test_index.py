@@ -0,0 +1,119 @@
+# SPDX-FileCopyrightText: 2023 swjmj1 <swjmj1@tuta.io>
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import pytest
+
+from ansible_collections.swjmj1.package_utils.plugins.module_utils.facts.index import PackageIndex, PathIndex, TokenIndex, literal_substring, \
+    name_matcher, similarity
+
+
+NAMES = [
+    "py3-yaml", "python3", "python3-dev", "python3-yaml", "python-yaml",
+    "yaml", "yaml-cpp",
+]
+
+
+class TestPackageIndex():
+    index = PackageIndex(
+        [(name, name + "-1.0") for name in NAMES] + [("yaml", "yaml-0.9")]
+    )
+
+    def test_items(self):
+        assert self.index.items("yaml") == ["yaml-1.0", "yaml-0.9"]
+        assert self.index.items("nonexistent") == []
+
+    @pytest.mark.parametrize("mode, term, expected", [
+        ("exact", "python3", ["python3"]),
+        ("exact", "python", []),
+        ("prefix", "python3", ["python3", "python3-dev", "python3-yaml"]),
+        ("prefix", "zzz", []),
+        ("substring", "yaml", ["py3-yaml", "python3-yaml", "python-yaml", "yaml", "yaml-cpp"]),
+        ("glob", "py*-yaml", ["py3-yaml", "python-yaml", "python3-yaml"]),
+        ("glob", "*yaml", ["py3-yaml", "python3-yaml", "python-yaml", "yaml"]),
+        ("regex", "^py(thon)?3-", ["py3-yaml", "python3-dev", "python3-yaml"]),
+    ])
+    def test_match(self, mode, term, expected):
+        assert sorted(self.index.match(mode, term)) == sorted(expected)
+        # The index must agree with matching names one by one.
+        matcher = name_matcher(mode, term)
+        assert sorted(self.index.match(mode, term)) == [
+            name for name in sorted(NAMES) if matcher(name)
+        ]
+
+    def test_fuzzy(self):
+        assert list(self.index.fuzzy("python3-yml")) == [
+            "python3-yaml", "python-yaml", "python3-dev", "python3", "py3-yaml",
+        ]
+        assert list(self.index.fuzzy("PY3-YAML", min_similarity=0.6)) == [
+            "py3-yaml", "python3-yaml", "python-yaml",
+        ]
+        # The index must agree with matching names one by one.
+        matcher = name_matcher("fuzzy", "py3-yaml", 0.3)
+        assert sorted(self.index.match("fuzzy", "py3-yaml", 0.3)) == [
+            name for name in sorted(NAMES) if matcher(name)
+        ]
+
+    def test_names_in_order(self):
+        assert list(self.index.substring("")) == sorted(NAMES)
+
+    def test_bad_mode(self):
+        with pytest.raises(ValueError):
+            self.index.match("nonsense", "yaml")
+
+
+def test_literal_substring():
+    assert literal_substring("exact", "python3") == "python3"
+    assert literal_substring("glob", "py*-yaml") == "-yaml"
+    assert literal_substring("glob", "python[23]-yaml") == "python"
+    assert literal_substring("regex", "^py") == ""
+
+
+def test_similarity():
+    assert similarity("yaml", "yaml") == 1.0
+    assert similarity("", "") == 1.0
+    assert similarity("py3-yaml", "python3-yaml") == 1 - 4 / 12
+    assert similarity("abc", "xyz") == 0.0
+
+
+def test_bad_regex():
+    with pytest.raises(ValueError):
+        name_matcher("regex", "(")
+
+
+class TestPathIndex():
+    index = PathIndex([
+        ("usr/", "filesystem"), ("usr/bin/", "filesystem"), ("usr/bin/", "bash"),
+        ("usr/bin/bash", "bash"), ("/usr/bin/sh", "bash"), ("/usr/bin/", "bash"),
+        ("usr/lib/", "glibc"),
+    ])
+
+    @pytest.mark.parametrize("path, expected", [
+        ("/usr/bin/bash", ["bash"]),
+        ("/usr/bin/", ["bash", "filesystem"]),
+        ("/usr/bin", ["bash", "filesystem"]),
+        ("/usr//lib/.", ["glibc"]),
+        ("/usr/bin/ba", []),
+        ("/zzz", []),
+    ])
+    def test_owners_of(self, path, expected):
+        assert self.index.owners_of(path) == expected
+
+    def test_paths_in_order(self):
+        assert self.index.paths == sorted(self.index.paths)
+
+
+def test_token_index():
+    index = TokenIndex([
+        ("python3-yaml", "YAML parser and emitter for Python 3"),
+        ("libyaml", "YAML 1.1 parser and emitter written in C"),
+        ("jq", "Command-line JSON processor"),
+        ("nodesc", None),
+    ])
+    assert index.search("yaml parser") == set(["python3-yaml", "libyaml"])
+    assert index.search("Parser, PYTHON!") == set(["python3-yaml"])
+    assert index.search("yaml json") == set()
+    assert index.search("") == set()
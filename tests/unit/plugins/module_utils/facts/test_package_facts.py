@@ -5,8 +5,33 @@
 from __future__ import (absolute_import, division, print_function)
 __metaclass__ = type
 
-from ansible_collections.swjmj1.package_utils.plugins.module_utils.facts.packages import PkgMgr
-from ansible_collections.swjmj1.package_utils.plugins.module_utils.facts.package_facts import for_each_pkg_mgr
+import io
+import tarfile
+
+from ansible_collections.swjmj1.package_utils.plugins.module_utils.facts import packages
+from ansible_collections.swjmj1.package_utils.plugins.module_utils.facts.packages import PkgMgr, PkgMgrTimings
+from ansible_collections.swjmj1.package_utils.plugins.module_utils.facts.package_facts import APK, APT, PACMAN, PKG, PKG_INFO, for_each_pkg_mgr
+
+
+PACMAN_QI_OUTPUT = """\
+Name            : acl
+Version         : 2.3.1-3
+Description     : Access control list utilities, libraries and headers
+Architecture    : x86_64
+Provides        : xfsacl  libacl.so=1-64
+Depends On      : glibc
+
+Name            : python
+Version         : 3.11.3-1
+Description     : Next generation of the python high-level scripting language
+Architecture    : x86_64
+Provides        : python3  libpython3.11.so=1.0-64  python-externally-managed
+                  python-setuptools
+Optional Deps   : python-setuptools
+                  tk: for tkinter [installed]
+Depends On      : bzip2  expat
+
+"""
 
 
 class PkgMgrDummy(PkgMgr):
@@ -50,11 +75,12 @@ class MockAnsibleModule():
     what they do besides keep track of the arguments given to them.
     """
 
-    def __init__(self, strategy, *managers):
+    def __init__(self, strategy, *managers, **params):
         self.params = {
             "strategy": strategy,
             "manager": managers,
         }
+        self.params.update(params)
         self.warnings = []
         self.fail_msg = None
         self.results = {}
@@ -149,3 +175,334 @@ class TestModuleWrapper():
             assert False
         except ValueError as e:
             assert "pkg_mgr" in str(e)
+
+    def test_timings(self):
+        """Return timings for every package manager tried, if asked."""
+
+        module = MockAnsibleModule(
+            "all", "UnavailablePkgMgr", "PkgMgrDummy", timings=True,
+        )
+        module_fn(module, {"pkg_mgr_list": []})
+        timings = module.results["timings"]
+        assert sorted(timings) == ["pkgmgrdummy", "unavailablepkgmgr"]
+        assert set(timings["pkgmgrdummy"]["phases"]) >= {
+            "detection", "list_installed", "search_pkg_substr",
+            "get_package_details", "assembly",
+        }
+        assert timings["pkgmgrdummy"]["counters"]["subprocess_calls"] == 0
+
+    def test_no_timings_by_default(self):
+        module = MockAnsibleModule("first", "PkgMgrDummy")
+        module_fn(module, {"pkg_mgr_list": []})
+        assert "timings" not in module.results
+
+
+class TestPackageDetailsMany():
+    """Ensure parsing details in bulk agrees with parsing one by one."""
+
+    def check(self, pkg_mgr, packages):
+        assert pkg_mgr.get_package_details_many(packages) == [
+            pkg_mgr.get_package_details(package) for package in packages
+        ]
+
+    def test_pacman(self):
+        pkg_mgr = PACMAN(MockAnsibleModule("first"))
+        packages = PACMAN_QI_OUTPUT.split("\n\n")[:-1]
+        self.check(pkg_mgr, packages)
+        python = pkg_mgr.get_package_details(packages[1])
+        assert python["version"] == "3.11.3-1"
+        assert python["provides"] == [
+            "python3", "libpython3.11.so", "python-externally-managed",
+            "python-setuptools",
+        ]
+
+    def test_pkg(self):
+        self.check(PKG(MockAnsibleModule("first")), [
+            "curl\t8.1.2_1,1\tFreeBSD\t1686009352\t0"
+            "\tFreeBSD:13:amd64\tftp/curl\t/usr/local\t0",
+            "git\t2.41.0\tFreeBSD\t1686009352\t1"
+            "\tFreeBSD:13:*\tdevel/git\t/usr/local\t0",
+        ])
+
+    def test_apk(self):
+        self.check(APK(MockAnsibleModule("first")), [
+            "ansible-core-2.13.6-r0", "musl-1.2.4-r0", "oddity",
+        ])
+
+    def test_pkg_info(self):
+        self.check(PKG_INFO(MockAnsibleModule("first")), [
+            "curl-8.1.2          transfer files with FTP, HTTP, HTTPS, etc.",
+            "quirks-6.122 exceptions to pkg_add rules and cache",
+        ])
+
+
+class FakeAptVersion():
+    version = "1.0-1"
+    architecture = "amd64"
+    section = "utils"
+
+    @property
+    def origins(self):
+        raise AssertionError("The origin should not have been looked up.")
+
+
+class FakeAptPackage():
+    installed = FakeAptVersion()
+
+
+class TestFields():
+    """Ensure package managers return (at least) the fields asked for."""
+
+    def test_apt_skips_origin(self):
+        pkg_mgr = APT(MockAnsibleModule("first"))
+        pkg_mgr._cache = {"foo": FakeAptPackage()}
+        assert pkg_mgr.get_package_details_many(["foo"], ["version"]) == [
+            {"name": "foo", "version": "1.0-1"},
+        ]
+
+    def test_pacman(self):
+        pkg_mgr = PACMAN(MockAnsibleModule("first"))
+        packages = PACMAN_QI_OUTPUT.split("\n\n")[:-1]
+        assert pkg_mgr.get_package_details_many(packages, ["name"]) == [
+            {"name": "acl"}, {"name": "python"},
+        ]
+        assert "provides" not in pkg_mgr.get_package_details_many(packages, ["version"])[0]
+
+    def test_pkg(self):
+        pkg_mgr = PKG(MockAnsibleModule("first"))
+        package = (
+            "curl\t8.1.2_1,1\tFreeBSD\t1686009352\t0"
+            "\tFreeBSD:13:amd64\tftp/curl\t/usr/local\t0"
+        )
+        details = pkg_mgr.get_package_details_many([package], ["revision"])[0]
+        assert details["name"] == "curl"
+        assert details["revision"] == "1"
+        assert "category" not in details
+
+
+APKINDEX = b"""\
+C:Q1dJ7z1ynn0YWEOvH5JoMwQ8Bz5rY=
+P:libssl3
+V:3.1.4-r1
+T:SSL shared libraries
+p:so:libssl.so.3=3
+
+C:Q1jnxtkNSiSVnKm4qVDAzkoXDZMIo=
+P:busybox-binsh
+V:1.36.1-r15
+T:busybox ash /bin/sh
+p:/bin/sh cmd:sh=1.36.1-r15
+
+C:Q1Q2wCE8n3VmhQYJcd/ToAAtDNDoM=
+P:dash-binsh
+V:0.5.12-r3
+T:dash /bin/sh
+p:/bin/sh cmd:sh=0.5.12-r3
+
+"""
+
+
+def apk_with_apkindex(tmp_path):
+    """Return an APK object reading APKINDEX from under "tmp_path"."""
+
+    index_path = tmp_path / "APKINDEX.0123abcd.tar.gz"
+    with tarfile.open(str(index_path), "w:gz") as archive:
+        info = tarfile.TarInfo("APKINDEX")
+        info.size = len(APKINDEX)
+        archive.addfile(info, io.BytesIO(APKINDEX))
+
+    pkg_mgr = APK(MockAnsibleModule("first"))
+    pkg_mgr.APKINDEX_PATHS = str(tmp_path / "APKINDEX.*.tar.gz")
+    pkg_mgr.list_available = lambda: [
+        "libssl3-3.1.4-r1", "busybox-binsh-1.36.1-r15", "dash-binsh-0.5.12-r3",
+    ]
+    return pkg_mgr
+
+
+class TestProvides():
+    """Ensure packages are found by the names they provide."""
+
+    def test_pacman(self):
+        pkg_mgr = PACMAN(MockAnsibleModule("first"))
+        pkg_mgr.list_available = lambda: PACMAN_QI_OUTPUT.split("\n\n")[:-1]
+        search_results = pkg_mgr.search_packages(
+            "libacl.so", "python", "nonexistent", match="provides", fields=["version"],
+        )
+        assert search_results == {
+            "libacl.so": [{"name": "acl", "version": "2.3.1-3"}],
+            "python": [{"name": "python", "version": "3.11.3-1"}],
+            "nonexistent": [],
+        }
+
+    def test_apk(self, tmp_path):
+        pkg_mgr = apk_with_apkindex(tmp_path)
+        search_results = pkg_mgr.search_packages(
+            "so:libssl.so.3", "cmd:sh", "dash-binsh", match="provides", sort="name", fields=[],
+        )
+        assert search_results == {
+            "so:libssl.so.3": [{"name": "libssl3"}],
+            "cmd:sh": [{"name": "busybox-binsh"}, {"name": "dash-binsh"}],
+            "dash-binsh": [{"name": "dash-binsh"}],
+        }
+
+    def test_no_apkindex(self, tmp_path):
+        pkg_mgr = APK(MockAnsibleModule("first"))
+        pkg_mgr.APKINDEX_PATHS = str(tmp_path / "APKINDEX.*.tar.gz")
+        assert pkg_mgr.list_provides() is None
+
+
+class PacmanSearchModule(MockAnsibleModule):
+    """Mock AnsibleModule answering "pacman -Ss" and "pacman -Si" for
+    twenty packages named "pkg0" to "pkg19", plus one mentioning "pkg"
+    only in its description.
+    """
+
+    def run_command(self, args, **kwargs):
+        if args[1] == "-Ss":
+            out = "".join(
+                "extra/%s 1.0-1\n    Package %s\n" % (name, name)
+                for name in ["pkg%d" % i for i in range(20)] + ["other"]
+            )
+        else:
+            out = (
+                "Repository      : extra\nName            : %s\n"
+                "Version         : 1.0-1\nDescription     : A package\n"
+                "Architecture    : any\nProvides        : None\n\n"
+            ) % args[2].split("/")[1]
+        return 0, out, ""
+
+
+class TestPacmanSearch():
+    def test_limit_stops_info_commands(self, monkeypatch):
+        monkeypatch.setattr(packages, "HAS_ASYNC_PROCESS", False)
+        pkg_mgr = PACMAN(PacmanSearchModule("first"))
+        pkg_mgr._locale = "C"
+        pkg_mgr.timings = PkgMgrTimings()
+        search_results = pkg_mgr.search_packages("pkg", limit=2, fields=[])
+        assert len(search_results["pkg"]) == 2
+        # one "-Ss", then one batch of "-Si"
+        assert pkg_mgr.timings.counters["subprocess_calls"] == 1 + pkg_mgr.max_concurrent_commands
+
+    def test_drops_description_matches(self, monkeypatch):
+        monkeypatch.setattr(packages, "HAS_ASYNC_PROCESS", False)
+        pkg_mgr = PACMAN(PacmanSearchModule("first"))
+        pkg_mgr._locale = "C"
+        pkg_mgr.timings = PkgMgrTimings()
+        assert len(pkg_mgr.search_packages("pkg", fields=[])["pkg"]) == 20
+        assert pkg_mgr.timings.counters["subprocess_calls"] == 21
+
+
+class PkgVersionModule(MockAnsibleModule):
+    """Mock AnsibleModule answering "pkg version -t" (for versions of
+    dot-separated numbers only), keeping track of the versions compared.
+    """
+
+    def __init__(self, *args, **kwargs):
+        MockAnsibleModule.__init__(self, *args, **kwargs)
+        self.compared = []
+
+    def run_command(self, args, **kwargs):
+        assert args[1:3] == ["version", "-t"]
+        self.compared.append(tuple(args[3:]))
+        a, b = [[int(n) for n in v.replace("_", ".").split(".")] for v in args[3:]]
+        return 0, "<" if a < b else ">" if a > b else "=", ""
+
+
+class TestPkgVersions():
+    def test_compared_by_pkg(self):
+        module = PkgVersionModule("first")
+        pkg_mgr = PKG(module)
+        pkg_mgr._locale = "C"
+        all_package_details = [
+            {"name": "curl", "version": "8.1", "revision": "0", "port_epoch": 0},
+            {"name": "git", "version": "2.41", "revision": "0", "port_epoch": 0},
+            {"name": "curl", "version": "8.1", "revision": "1", "port_epoch": 0},
+            {"name": "curl", "version": "8.10", "revision": "0", "port_epoch": 0},
+        ]
+        assert [
+            (pkg["name"], pkg["version"], pkg["revision"])
+            for pkg in pkg_mgr._by_version(all_package_details)
+        ] == [("curl", "8.10", "0"), ("curl", "8.1", "1"), ("curl", "8.1", "0"), ("git", "2.41", "0")]
+        # Only versions of the same package are compared, each pair once.
+        assert all("2.41" not in pair for pair in module.compared)
+        assert len(set(frozenset(pair) for pair in module.compared)) == len(module.compared)
+
+        latest = pkg_mgr._by_version(all_package_details, latest_only=True)
+        assert [pkg["version"] for pkg in latest] == ["8.10", "2.41"]
+
+
+class TestOwnedFiles():
+    """Ensure the owners of files are read from each file database."""
+
+    def test_pacman(self, tmp_path):
+        for dirname, files in (
+            ("bash-5.2.015-1", "usr/\nusr/bin/\nusr/bin/bash\nusr/bin/sh\n"),
+            ("filesystem-2023.01.31-1", "usr/\nusr/bin/\n"),
+        ):
+            (tmp_path / dirname).mkdir()
+            (tmp_path / dirname / "files").write_text(
+                u"%FILES%\n" + files + u"\n%BACKUP%\netc/bash.bashrc\tabc\n\n"
+            )
+        pkg_mgr = PACMAN(MockAnsibleModule("first"))
+        pkg_mgr.LOCAL_DB = str(tmp_path)
+        assert pkg_mgr.find_owners(["/usr/bin/sh", "/usr/bin", "/etc/bash.bashrc"]) == {
+            "/usr/bin/sh": ["bash"],
+            "/usr/bin": ["bash", "filesystem"],
+            "/etc/bash.bashrc": [],
+        }
+
+    def test_apt(self, tmp_path):
+        (tmp_path / "bash.list").write_text(u"/.\n/bin\n/bin/bash\n")
+        (tmp_path / "libc6:amd64.list").write_text(u"/.\n/lib\n/lib/x86_64-linux-gnu/libc.so.6\n")
+        (tmp_path / "bash.md5sums").write_text(u"abc  bin/bash\n")
+        pkg_mgr = APT(MockAnsibleModule("first"))
+        pkg_mgr.INFO_DIR = str(tmp_path)
+        owners = pkg_mgr.find_owners(["/bin/bash", "/lib/x86_64-linux-gnu/libc.so.6", "/"])
+        assert owners["/bin/bash"] == ["bash"]
+        assert owners["/lib/x86_64-linux-gnu/libc.so.6"] == ["libc6"]
+        assert sorted(owners["/"]) == ["bash", "libc6"]
+
+    def test_apk(self, tmp_path):
+        installed = tmp_path / "installed"
+        installed.write_text(
+            u"C:Q1abc=\nP:busybox\nV:1.36.1-r15\nF:bin\nR:busybox\nR:sh\nF:etc\nR:passwd\n\n"
+            u"C:Q1def=\nP:musl\nV:1.2.4-r2\nF:lib\nR:ld-musl-x86_64.so.1\n\n"
+        )
+        pkg_mgr = APK(MockAnsibleModule("first"))
+        pkg_mgr.INSTALLED_DB = str(installed)
+        assert pkg_mgr.find_owners(["/bin/sh", "/lib", "/lib/libc.so"]) == {
+            "/bin/sh": ["busybox"],
+            "/lib": ["musl"],
+            "/lib/libc.so": [],
+        }
+
+
+class TestDescriptions():
+    """Ensure packages are found by the words in their descriptions."""
+
+    def test_pacman(self):
+        pkg_mgr = PACMAN(MockAnsibleModule("first"))
+        pkg_mgr.list_available = lambda: PACMAN_QI_OUTPUT.split("\n\n")[:-1]
+        search_results = pkg_mgr.search_packages(
+            "Scripting PYTHON", "acl", "utilities",
+            search_in=["name", "description"], fields=["description"],
+        )
+        assert [pkg["name"] for pkg in search_results["Scripting PYTHON"]] == ["python"]
+        assert [pkg["name"] for pkg in search_results["acl"]] == ["acl"]
+        assert search_results["utilities"] == [{
+            "name": "acl",
+            "description": "Access control list utilities, libraries and headers",
+        }]
+
+    def test_apk(self, tmp_path):
+        pkg_mgr = apk_with_apkindex(tmp_path)
+        search_results = pkg_mgr.search_packages(
+            "dash", "/bin/sh", match="prefix", search_in=["name", "description"], fields=[],
+        )
+        assert search_results == {
+            "dash": [{"name": "dash-binsh"}],
+            # name matches first, then those found by description
+            "/bin/sh": [{"name": "busybox-binsh"}, {"name": "dash-binsh"}],
+        }
+        search_results = pkg_mgr.search_packages("dash", search_in=["description"], fields=[])
+        assert search_results == {"dash": [{"name": "dash-binsh"}]}
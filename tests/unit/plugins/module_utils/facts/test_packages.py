@@ -5,7 +5,18 @@
 from __future__ import (absolute_import, division, print_function)
 __metaclass__ = type
 
-from ansible_collections.swjmj1.package_utils.plugins.module_utils.facts.packages import PkgMgr
+import os
+import re
+import sys
+import threading
+import time
+
+import pytest
+
+from ansible_collections.swjmj1.package_utils.plugins.module_utils.facts import packages
+from ansible_collections.swjmj1.package_utils.plugins.module_utils.facts.deadline import Deadline
+from ansible_collections.swjmj1.package_utils.plugins.module_utils.facts.packages import \
+    HAS_ASYNC_PROCESS, CLIMgr, PkgMgr, PkgMgrTimings, paths_fingerprint
 
 
 class PkgMgrExample(PkgMgr):
@@ -33,6 +44,55 @@ class PkgMgrExample(PkgMgr):
         return [pkg for pkg in self._repo if substr in pkg]
 
 
+class IndexedPkgMgrExample(PkgMgrExample):
+    """Mock a package manager that can list its whole repo at once."""
+
+    def list_available(self):
+        return self._repo
+
+    def search_pkg_substr(self, substr):
+        raise AssertionError("The index should have been used instead.")
+
+
+class VersionedPkgMgrExample(PkgMgrExample):
+    """Mock a package manager whose repo items are "name version"."""
+
+    def __init__(self, pkgs_in_repo):
+        super(VersionedPkgMgrExample, self).__init__(pkgs_in_repo, [])
+
+    def get_package_details(self, package):
+        name, version = package.split()
+        return {"name": name, "version": version}
+
+
+class IndexedVersionedPkgMgrExample(VersionedPkgMgrExample, IndexedPkgMgrExample):
+    pass
+
+
+class DescribedPkgMgrExample(IndexedVersionedPkgMgrExample):
+    """Mock a package manager that can list its packages' descriptions."""
+
+    def __init__(self, pkgs_in_repo, descriptions):
+        super(DescribedPkgMgrExample, self).__init__(pkgs_in_repo)
+        self._descriptions = descriptions
+
+    def list_descriptions(self):
+        return list(self._descriptions.items())
+
+
+class SlowPkgMgrExample(PkgMgrExample):
+    """Mock a package manager taking a while over "slow" searches."""
+
+    def search_pkg_substr(self, substr):
+        if substr.startswith("slow"):
+            time.sleep(0.3)
+        return super(SlowPkgMgrExample, self).search_pkg_substr(substr)
+
+    def list_installed(self):
+        self._check_deadline()  # as running a command would
+        return super(SlowPkgMgrExample, self).list_installed()
+
+
 class TestPkgMgr():
     pkg_mgr = PkgMgrExample(
         [
@@ -74,3 +134,318 @@ class TestPkgMgr():
         for pkg in ("pkg1", "pkg2"):
             for expected_result, received_result in zip(expected.get(pkg), search_results.get(pkg)):
                 assert expected_result.items() <= received_result.items()
+
+    def test_search_packages_concurrently(self):
+        """Return the same results whether searching serially or not.
+
+        That includes empty lists for search terms without matches.
+        """
+
+        search_terms = ("pkg1", "pkg2", "pkg3", "nonexistent", "pkg1")
+        serial_results = self.pkg_mgr.search_packages(*search_terms)
+
+        concurrent_pkg_mgr = PkgMgrExample(self.pkg_mgr._repo, [])
+        concurrent_pkg_mgr.search_workers = 3
+        concurrent_results = concurrent_pkg_mgr.search_packages(*search_terms)
+
+        assert concurrent_results == serial_results
+        assert concurrent_results["nonexistent"] == []
+
+    @pytest.mark.parametrize("match, expected", [
+        ("substring", {"pkg1": ["pkg1-1", "pkg1-2", "pkg1-3"], "-3": ["pkg1-3", "pkg2-3", "pkg3-3"]}),
+        ("exact", {"pkg1-2": ["pkg1-2"], "pkg1": []}),
+        ("prefix", {"pkg2": ["pkg2-1", "pkg2-2", "pkg2-3"], "kg2": []}),
+        ("glob", {"pkg?-3": ["pkg1-3", "pkg2-3", "pkg3-3"], "*-1": ["pkg1-1", "pkg2-1", "pkg3-1"]}),
+        ("glob", {"pkg[23]-1": ["pkg2-1", "pkg3-1"], "pkg[!1]-[!1]": ["pkg2-2", "pkg2-3", "pkg3-2", "pkg3-3"]}),
+        ("regex", {"[12]-1$": ["pkg1-1", "pkg2-1"]}),
+    ])
+    def test_match_modes(self, match, expected):
+        """Match the same names with or without an index."""
+
+        pkg_mgrs = [self.pkg_mgr]
+        if match != "substring":
+            pkg_mgrs.append(IndexedPkgMgrExample(self.pkg_mgr._repo, []))
+        for pkg_mgr in pkg_mgrs:
+            search_results = pkg_mgr.search_packages(*expected, match=match)
+            assert dict(
+                (term, sorted(pkg["name"] for pkg in results))
+                for term, results in search_results.items()
+            ) == expected
+
+    @pytest.mark.parametrize("offset, limit, expected", [
+        (0, None, ["pkg1-1", "pkg1-2", "pkg1-3"]),
+        (0, 2, ["pkg1-1", "pkg1-2"]),
+        (1, 1, ["pkg1-2"]),
+        (2, 5, ["pkg1-3"]),
+        (0, 0, []),
+    ])
+    def test_offset_and_limit(self, offset, limit, expected):
+        for pkg_mgr, match in (
+            (self.pkg_mgr, "substring"),
+            (IndexedPkgMgrExample(self.pkg_mgr._repo, []), "prefix"),
+        ):
+            search_results = pkg_mgr.search_packages(
+                "pkg1", match=match, sort="name", offset=offset, limit=limit,
+            )
+            assert [pkg["name"] for pkg in search_results["pkg1"]] == expected
+
+    def test_regex_compiled_once(self, monkeypatch):
+        compiled = []
+        real_compile = re.compile
+        monkeypatch.setattr(re, "compile", lambda *args: compiled.append(args) or real_compile(*args))
+        pkg_mgr = IndexedPkgMgrExample(self.pkg_mgr._repo, [])
+        search_results = pkg_mgr.search_packages("^pkg[12]-1$", match="regex")
+        assert len(search_results["^pkg[12]-1$"]) == 2
+        assert compiled == [("^pkg[12]-1$",)]
+
+    def test_limit_stops_parsing_early(self):
+        pkg_mgr = IndexedPkgMgrExample(self.pkg_mgr._repo, [])
+        pkg_mgr.repo_index      # build the index first
+        pkg_mgr.timings = PkgMgrTimings()
+        pkg_mgr.search_packages("pkg", match="prefix", limit=2)
+        assert pkg_mgr.timings.counters["records_parsed"] == 2
+
+    def test_sort_by_name(self):
+        pkg_mgr = PkgMgrExample(list(reversed(self.pkg_mgr._repo)), [])
+        search_results = pkg_mgr.search_packages("-1", sort="name")
+        assert [pkg["name"] for pkg in search_results["-1"]] == [
+            "pkg1-1", "pkg2-1", "pkg3-1",
+        ]
+
+    def test_fields(self):
+        search_results = self.pkg_mgr.search_packages("pkg1-1", fields=["version"])
+        assert search_results == {
+            "pkg1-1": [{"name": "pkg1-1", "version": "1.0.0"}],
+        }
+        search_results = self.pkg_mgr.search_packages("pkg1-1", fields=["source"])
+        assert search_results["pkg1-1"][0]["source"] == "pkgmgrexample"
+
+    def test_sort_by_version(self):
+        pkg_mgr = VersionedPkgMgrExample(["a 1.9", "b 1.0", "a 1.10", "a 1.0~rc1"])
+        search_results = pkg_mgr.search_packages("", sort="version", fields=["version"])
+        assert search_results[""] == [
+            {"name": "a", "version": "1.10"}, {"name": "a", "version": "1.9"},
+            {"name": "a", "version": "1.0~rc1"}, {"name": "b", "version": "1.0"},
+        ]
+
+    def test_sort_by_version_fuzzy(self):
+        """Sort by name even though the index yields names ranked."""
+
+        pkg_mgr = IndexedVersionedPkgMgrExample(
+            ["python3-yaml 1", "py3-yaml 1", "pyyaml 1", "py-yaml 1"],
+        )
+        search_results = pkg_mgr.search_packages(
+            "py3-yaml", match="fuzzy", sort="version", min_similarity=0.4,
+        )
+        names = [pkg["name"] for pkg in search_results["py3-yaml"]]
+        assert names == sorted(names) and len(names) == 4
+
+    def test_sort_by_version_described(self):
+        """Sort matches by description among matches by name."""
+
+        pkg_mgr = DescribedPkgMgrExample(["zzz 1", "aaa 1", "aaa 2"], {"aaa": "works with zzz"})
+        search_results = pkg_mgr.search_packages(
+            "zzz", sort="version", search_in=["name", "description"],
+        )
+        assert [(pkg["name"], pkg["version"]) for pkg in search_results["zzz"]] == [
+            ("aaa", "2"), ("aaa", "1"), ("zzz", "1"),
+        ]
+
+    @pytest.mark.parametrize("pkg_mgr_class, expected", [
+        # in order of first appearance, unless the index sorts by name
+        (VersionedPkgMgrExample, [("b", "1.0^1"), ("a", "1.10")]),
+        (IndexedVersionedPkgMgrExample, [("a", "1.10"), ("b", "1.0^1")]),
+    ])
+    def test_latest_only(self, pkg_mgr_class, expected):
+        pkg_mgr = pkg_mgr_class(["b 1.0", "a 1.9", "c 2", "a 1.10", "b 1.0^1"])
+        search_results = pkg_mgr.search_packages("", match="prefix", latest_only=True, limit=2)
+        assert [(pkg["name"], pkg["version"]) for pkg in search_results[""]] == expected
+
+    def test_annotate_installed(self):
+        pkg_mgr = PkgMgrExample(self.pkg_mgr._repo, ["pkg1-2", "pkg2-1"])
+        search_results = pkg_mgr.search_packages(
+            "pkg1", "-1", fields=["version"], annotate_installed=True
+        )
+        assert search_results["pkg1"] == [
+            {"name": "pkg1-1", "version": "1.0.0", "installed": False, "installed_version": None},
+            {"name": "pkg1-2", "version": "1.0.0", "installed": True, "installed_version": "1.0.0"},
+            {"name": "pkg1-3", "version": "1.0.0", "installed": False, "installed_version": None},
+        ]
+        assert [pkg["installed"] for pkg in search_results["-1"]] == [False, True, False]
+
+    def test_installed_packages_listed_once(self):
+        pkg_mgr = PkgMgrExample(self.pkg_mgr._repo, ["pkg1-2"])
+        pkg_mgr.timings = PkgMgrTimings()
+        pkg_mgr.search_packages("pkg1", annotate_installed=True)
+        pkg_mgr.search_packages("pkg2", annotate_installed=True)
+        # 3 + 3 matches, plus the one installed package only once
+        assert pkg_mgr.timings.counters["records_parsed"] == 7
+
+    def test_provides_falls_back_to_exact(self):
+        search_results = self.pkg_mgr.search_packages("pkg1-2", "pkg1", match="provides")
+        assert [pkg["name"] for pkg in search_results["pkg1-2"]] == ["pkg1-2"]
+        assert search_results["pkg1"] == []
+
+    def test_find_owners_unsupported(self):
+        with pytest.raises(NotImplementedError):
+            self.pkg_mgr.find_owners(["/usr/bin/pkg1"])
+
+    def test_fuzzy(self):
+        """Rank the same names the same with or without an index."""
+
+        repo = ["python3-yaml", "py3-yaml", "python-yaml", "yaml", "perl-yaml-libyaml"]
+        for pkg_mgr in (PkgMgrExample(repo, []), IndexedPkgMgrExample(repo, [])):
+            search_results = pkg_mgr.search_packages("py3-yaml", match="fuzzy", limit=3)
+            assert [pkg["name"] for pkg in search_results["py3-yaml"]] == [
+                "py3-yaml", "python3-yaml", "python-yaml",
+            ]
+        with pytest.raises(ValueError):
+            pkg_mgr.search_packages("yaml", match="fuzzy", min_similarity=2)
+
+    def test_search_in_description_unsupported(self):
+        with pytest.raises(NotImplementedError):
+            self.pkg_mgr.search_packages("pkg1", search_in=["description"])
+
+    def test_deadline_returns_completed_terms(self):
+        pkg_mgr = SlowPkgMgrExample(self.pkg_mgr._repo, [])
+        pkg_mgr.deadline = Deadline(0.1)
+        search_results = pkg_mgr.search_packages("slow1", "slow2")
+        assert len(search_results) == 1
+        assert pkg_mgr.incomplete_terms == {"slow1", "slow2"} - set(search_results)
+
+        pkg_mgr.deadline = None
+        pkg_mgr.search_packages("slow1")
+        assert pkg_mgr.incomplete_terms == set()
+
+    def test_deadline_leaves_completed_terms_unannotated(self):
+        pkg_mgr = SlowPkgMgrExample(["slow-1", "slow-2"], ["slow-1"])
+        pkg_mgr.deadline = Deadline(0.1)
+        search_results = pkg_mgr.search_packages("slow", annotate_installed=True)
+        assert [pkg["name"] for pkg in search_results["slow"]] == ["slow-1", "slow-2"]
+        for package_details in search_results["slow"]:
+            assert package_details["installed"] is None
+            assert package_details["installed_version"] is None
+        assert pkg_mgr.incomplete_terms == {"slow"}
+
+    def test_deadline_cancels_pending_searches(self):
+        pkg_mgr = SlowPkgMgrExample(self.pkg_mgr._repo, [])
+        pkg_mgr.search_workers = 2
+        pkg_mgr.deadline = Deadline(0.1)
+        search_results = pkg_mgr.search_packages("slow1", "slow2", "slow3")
+        assert len(search_results) == 2
+
+    def test_bad_option(self):
+        with pytest.raises(ValueError):
+            self.pkg_mgr.search_packages("pkg1", match="nonsense")
+        with pytest.raises(ValueError):
+            self.pkg_mgr.search_packages("pkg1", nonsense=True)
+        with pytest.raises(ValueError):
+            self.pkg_mgr.search_packages("pkg1", search_in=[])
+
+
+class CLIMgrExample(CLIMgr):
+    max_concurrent_commands = 2
+
+    def list_installed(self):
+        return []
+
+    def get_package_details(self, package):
+        return {"name": package}
+
+    def search_pkg_substr(self, substr):
+        return []
+
+
+class TestCLIMgr():
+    @pytest.mark.skipif(not HAS_ASYNC_PROCESS, reason="needs Python 3.8 or later")
+    def test_commands_share_one_limit(self, tmp_path):
+        """Bound the commands run at once across threads, too."""
+
+        # Each command reports how many are running, itself included.
+        command = [sys.executable, "-c", (
+            "import os, time\n"
+            "path = os.path.join(%r, str(os.getpid()))\n"
+            "open(path, 'w').close()\n"
+            "time.sleep(0.2)\n"
+            "print(len(os.listdir(%r)))\n"
+            "os.unlink(path)\n"
+        ) % (str(tmp_path), str(tmp_path))]
+        pkg_mgr = CLIMgrExample(module=object())  # never used here
+        outputs = []
+
+        def run():
+            outputs.extend(out for rc, out, err in pkg_mgr._run_commands([command] * 3))
+
+        threads = [threading.Thread(target=run) for i in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert len(outputs) == 9
+        assert max(int(out) for out in outputs) <= 2
+
+    def test_command_env_like_run_command(self, monkeypatch):
+        """Build the environment the way AnsibleModule.run_command does."""
+
+        class Module():
+            run_command_environ_update = {"LANG": "C", "LC_ALL": "C"}
+
+        monkeypatch.setenv("PYTHONPATH", "/tmp/ansible_x/ansible_modlib.zip:/opt/lib")
+        pkg_mgr = CLIMgrExample(module=Module())
+        env = pkg_mgr._command_env({"LC_ALL": "C.UTF-8"})
+        assert env["LANG"] == "C"
+        assert env["LC_ALL"] == "C.UTF-8"
+        assert env["PYTHONPATH"] == "/opt/lib"
+
+
+class TestPkgMgrTimings():
+    def test_records_parsed(self):
+        pkg_mgr = PkgMgrExample(["pkg1-1", "pkg1-2", "pkg2-1"], [])
+        pkg_mgr.timings = PkgMgrTimings()
+        pkg_mgr.search_packages("pkg1")
+        assert pkg_mgr.timings.counters["records_parsed"] == 2
+
+    def test_nested_phases_do_not_double_count(self, monkeypatch):
+        """Charge time spent in an inner phase to the inner phase only.
+
+        The clock advances one "second" every time it's read.
+        """
+
+        ticks = iter(range(100))
+        monkeypatch.setattr(packages, "_clock", lambda: next(ticks))
+        timings = PkgMgrTimings()
+        with timings.phase("assembly"):             # 0
+            with timings.phase("list_installed"):   # 1
+                pass                                # 2
+        # 3
+        phases = timings.as_dict()["phases"]
+        assert phases["assembly"] == 2
+        assert phases["list_installed"] == 1
+
+
+class TestPathsFingerprint():
+    def test_changes_with_files(self, tmp_path):
+        db = tmp_path / "installed"
+        db.write_text(u"P:curl\nV:8.1.2-r0\n")
+        pattern = str(tmp_path / "*")
+        fingerprint = paths_fingerprint([pattern])
+        assert fingerprint == paths_fingerprint([pattern])
+
+        db.write_text(u"P:curl\nV:8.2.10-r0\n")
+        assert paths_fingerprint([pattern]) != fingerprint
+
+    def test_no_files(self, tmp_path):
+        assert paths_fingerprint([str(tmp_path / "nonexistent")]) is None
+
+    def test_contents_not_read(self, tmp_path):
+        """Only stat the files, however big they are."""
+
+        index = tmp_path / "Packages"
+        index.write_text(u"Package: curl\n")
+        st = index.stat()
+        pattern = str(tmp_path / "*")
+        fingerprint = paths_fingerprint([pattern])
+
+        index.write_text(u"Package: wget\n")
+        os.utime(str(index), (st.st_atime, st.st_mtime))
+        assert paths_fingerprint([pattern]) == fingerprint
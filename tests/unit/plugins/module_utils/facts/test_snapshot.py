@@ -0,0 +1,98 @@
+# SPDX-FileCopyrightText: 2023 swjmj1 <swjmj1@tuta.io>
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import os
+import time
+
+from ansible_collections.swjmj1.package_utils.plugins.module_utils.facts.snapshot import (
+    SnapshotStore, diff_snapshots, expand_entries, make_snapshot, snapshot_fingerprint,
+)
+
+
+PACKAGES = {
+    "curl": [{"name": "curl", "version": "8.1.2", "release": "r0", "source": "apk"}],
+    "musl": [{"name": "musl", "version": "1.2.4", "release": "r0", "source": "apk"}],
+}
+
+
+class TestSnapshot():
+    def test_fingerprint_ignores_order(self):
+        packages = {
+            "linux": [
+                {"name": "linux", "version": "6.3"},
+                {"name": "linux", "version": "6.4"},
+            ],
+        }
+        reordered = {"linux": list(reversed(packages["linux"]))}
+        assert snapshot_fingerprint(make_snapshot(packages)) \
+            == snapshot_fingerprint(make_snapshot(reordered))
+
+    def test_expand_entries(self):
+        snapshot = make_snapshot(PACKAGES)
+        assert expand_entries("curl", snapshot["curl"], "apk") == PACKAGES["curl"]
+
+    def test_diff(self):
+        old = make_snapshot(PACKAGES)
+        new = make_snapshot({
+            "curl": [{"name": "curl", "version": "8.2.0", "release": "r0"}],
+            "zlib": [{"name": "zlib", "version": "1.2.13", "release": "r0"}],
+        })
+        assert diff_snapshots(old, new) == (["zlib"], ["musl"], ["curl"])
+        assert diff_snapshots(new, new) == ([], [], [])
+
+    def test_diff_portage(self):
+        """Tell ebuild revisions and categories apart."""
+
+        old = make_snapshot({"foo": [
+            {"name": "foo", "category": "dev-libs", "version": "1.0", "ebuild_revision": "r1"},
+            {"name": "foo", "category": "net-misc", "version": "2.0"},
+        ]})
+        new = make_snapshot({"foo": [
+            {"name": "foo", "category": "dev-libs", "version": "1.0", "ebuild_revision": "r2"},
+            {"name": "foo", "category": "net-misc", "version": "2.0"},
+        ]})
+        assert diff_snapshots(old, new) == ([], [], ["foo"])
+        assert len(expand_entries("foo", new["foo"])) == 2
+
+    def test_diff_older_snapshot(self):
+        """Read entries from before fields were added as if padded."""
+
+        new = make_snapshot(PACKAGES)
+        old = dict(
+            (name, [entry[:6] for entry in entries]) for name, entries in new.items()
+        )
+        assert diff_snapshots(old, new) == ([], [], [])
+
+
+class TestSnapshotStore():
+    def test_save_and_load(self, tmp_path):
+        store = SnapshotStore(str(tmp_path))
+        snapshot = make_snapshot(PACKAGES)
+        fingerprint = store.save("apk", snapshot, "db1")
+        assert fingerprint == snapshot_fingerprint(snapshot)
+        assert store.latest("apk") == {"fingerprint": fingerprint, "db_fingerprint": "db1"}
+        assert store.load("apk", fingerprint) == snapshot
+
+    def test_missing(self, tmp_path):
+        store = SnapshotStore(str(tmp_path))
+        assert store.latest("apk") is None
+        assert store.load("apk", "0123") is None
+        assert store.load("apk", "../../etc/passwd") is None
+        assert store.load("apk", {"fingerprint": "0123"}) is None
+
+    def test_prune(self, tmp_path):
+        store = SnapshotStore(str(tmp_path))
+        fingerprints = []
+        for version in ("1", "2", "3"):
+            fingerprints.append(store.save("apk", {"curl": [[version]]}))
+            # make sure modification times differ
+            path = os.path.join(str(tmp_path), "apk", fingerprints[-1] + ".json.gz")
+            os.utime(path, (time.time() + len(fingerprints), time.time() + len(fingerprints)))
+        store.prune("apk", 2)
+        assert store.load("apk", fingerprints[0]) is None
+        assert store.load("apk", fingerprints[1]) is not None
+        assert store.load("apk", fingerprints[2]) is not None
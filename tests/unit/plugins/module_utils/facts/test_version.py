@@ -0,0 +1,86 @@
+# SPDX-FileCopyrightText: 2023 swjmj1 <swjmj1@tuta.io>
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import pytest
+
+from ansible_collections.swjmj1.package_utils.plugins.module_utils.facts.version import \
+    apk_version_key, dpkg_version_key, evr_key, memoize, pacman_vercmp, pacman_version_key, \
+    pkg_version_string, rpmvercmp_key
+
+
+# each list is in increasing order of version
+@pytest.mark.parametrize("key, versions", [
+    (rpmvercmp_key, ["1.0~rc1", "1.0", "1.0^git1", "1.0a", "1.0.1", "1.1", "1.10", "2"]),
+    (pacman_version_key, [
+        "1.0a-1", "1.0-1", "1.0-2", "1.0.a-1", "1.0.1-1", "1.10-1", "1:0.1-1",
+    ]),
+    (dpkg_version_key, [
+        "1.0~rc1", "1.0", "1.0-0ubuntu1", "1.0-1", "1.0+dfsg-1", "1.0.1", "1:0.9",
+    ]),
+])
+def test_version_order(key, versions):
+    assert sorted(reversed(versions), key=key) == versions
+
+
+@pytest.mark.parametrize("key, a, b", [
+    (rpmvercmp_key, "1.0", "1_0"),
+    (rpmvercmp_key, "1.01", "1.1"),
+    (dpkg_version_key, "1.0", "0:1.0"),
+    (dpkg_version_key, "1.0", "1.0-0"),
+    (pacman_version_key, "1.0-1", "0:1.0-1"),
+    (pacman_version_key, "1.01-1", "1.1-1"),
+])
+def test_equal_versions(key, a, b):
+    assert key(a) == key(b)
+
+
+def test_evr_key():
+    assert evr_key(None, "2.0", "1") < evr_key(1, "1.0", "1")
+    assert evr_key(0, "1.0", "2.el9") > evr_key(0, "1.0", "1.el9")
+
+
+def test_apk_version_key():
+    versions = [
+        ("1.2", "r0"), ("1.2", "r1"), ("1.2.1_rc1", "r0"), ("1.2.1", "r0"),
+        ("1.2.1_p1", "r0"), ("1.2.10", "r0"),
+    ]
+    assert sorted(reversed(versions), key=lambda v: apk_version_key(*v)) == versions
+    # unparsable versions still compare
+    assert apk_version_key("", "") < apk_version_key("0.1", "r0")
+
+
+# as compared by pacman's vercmp
+@pytest.mark.parametrize("a, b, result", [
+    ("1.0.a", "1.0", 1),        # separators count, unlike with rpm
+    ("1.0a", "1.0", -1),
+    ("1.0..1", "1.0.1", 1),     # a longer separator is newer
+    ("1.0.", "1.0", 1),
+    ("1.0", "1.0-2", 0),        # releases only count if both have one
+    ("1:1.0", "2.0", 1),
+])
+def test_pacman_vercmp(a, b, result):
+    assert pacman_vercmp(a, b) == result
+    assert pacman_vercmp(b, a) == -result
+
+
+def test_pkg_version_string():
+    assert pkg_version_string("1.0", "1", "2") == "1.0_1,2"
+    assert pkg_version_string("1.0", "0", 0) == "1.0"
+
+
+def test_memoize():
+    calls = []
+
+    @memoize(maxsize=2)
+    def double(x):
+        calls.append(x)
+        return 2 * x
+
+    assert [double(1), double(1), double(2)] == [2, 2, 4]
+    assert calls == [1, 2]
+    double(3)   # clears the cache, which holds 2 results at most
+    assert len(double.cache) == 1
@@ -0,0 +1,52 @@
+# SPDX-FileCopyrightText: 2023 swjmj1 <swjmj1@tuta.io>
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import os
+import time
+
+from ansible_collections.swjmj1.package_utils.plugins.plugin_utils.result_cache import ResultCache, cache_key
+
+
+class TestResultCache():
+    def test_get_and_put(self, tmp_path):
+        cache = ResultCache(str(tmp_path / "cache"))
+        key = cache_key("apk", "abc123", ["curl"])
+        assert cache.get(key) is None
+        cache.put(key, {"ansible_facts": {"package_search_results": {"curl": []}}})
+        assert cache.get(key) == {"ansible_facts": {"package_search_results": {"curl": []}}}
+
+    def test_key_ignores_dict_order(self):
+        assert cache_key({"a": 1, "b": 2}) == cache_key({"b": 2, "a": 1})
+        assert cache_key({"a": 1}) != cache_key({"a": 2})
+
+    def test_evicts_least_recently_used(self, tmp_path):
+        cache = ResultCache(str(tmp_path), max_entries=3)
+        for i, key in enumerate(("first", "second", "third")):
+            cache.put(key, i)
+            then = time.time() - 100 + i
+            os.utime(str(tmp_path / (key + ".json")), (then, then))
+        assert cache.get("first") == 0     # now the most recently used
+
+        cache.max_entries = 2
+        cache.evict()
+        assert cache.get("second") is None
+        assert cache.get("first") == 0
+        assert cache.get("third") == 2
+
+    def test_evicts_by_size(self, tmp_path):
+        cache = ResultCache(str(tmp_path), max_bytes=30)
+        cache.put("first", "x" * 20)
+        os.utime(str(tmp_path / "first.json"), (time.time() - 100, time.time() - 100))
+        cache.put("second", "y" * 20)
+        assert cache.get("first") is None
+        assert cache.get("second") == "y" * 20
+
+    def test_put_is_best_effort(self, tmp_path):
+        (tmp_path / "file").write_text(u"")
+        cache = ResultCache(str(tmp_path / "file" / "cache"))
+        assert cache.put("key", 1) is False
+        assert cache.get("key") is None